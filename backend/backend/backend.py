@@ -1,5 +1,6 @@
 import reflex as rx
 from .pages.validator import validator_page
+from .pages.data_profiler import profile_scheduler
 
 # Состояние приложения
 class State(rx.State):
@@ -77,4 +78,7 @@ def index() -> rx.Component:
 # Создаем приложение
 app = rx.App()
 app.add_page(index, route="/", title="DataGate Analytics Hub")
-app.add_page(validator_page, route="/validator", title="Валидатор данных - DataGate")
\ No newline at end of file
+app.add_page(validator_page, route="/validator", title="Валидатор данных - DataGate")
+
+# Фоновое профилирование по расписанию (расписания проверяет один процесс)
+profile_scheduler.start()
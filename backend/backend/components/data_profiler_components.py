@@ -79,6 +79,7 @@ def profile_overview() -> rx.Component:
     from ..pages.data_profiler import DataProfilerState
 
     general_stats = DataProfilerState.profile_results.get('general_stats', {})
+    sampling = DataProfilerState.profile_results.get('sampling', {})
 
     return rx.box(
         rx.heading("Общая информация", size="5", margin_bottom="15px", color="white"),
@@ -141,6 +142,34 @@ def profile_overview() -> rx.Component:
                 border_radius="8px"
             ),
 
+            # Выборка и точность оценок
+            rx.box(
+                rx.vstack(
+                    rx.icon("filter", size=24, color="teal.400"),
+                    rx.text("Выборка", color="gray.400", font_size="sm"),
+                    rx.text(
+                        format_number(sampling.get('sample_rows', 0)),
+                        font_size="2xl",
+                        font_weight="bold",
+                        color="white"
+                    ),
+                    rx.cond(
+                        sampling.get('method', 'full') == 'full',
+                        rx.text("Все строки таблицы", color="gray.500", font_size="xs"),
+                        rx.text(
+                            f"NULL % ± {sampling.get('max_null_margin', 0)} п.п. (95% ДИ)",
+                            color="gray.500",
+                            font_size="xs"
+                        )
+                    ),
+                    spacing="1",
+                    align="center"
+                ),
+                padding="15px",
+                background_color="gray.700",
+                border_radius="8px"
+            ),
+
             # Время профилирования
             rx.box(
                 rx.vstack(
@@ -159,11 +188,38 @@ def profile_overview() -> rx.Component:
                 border_radius="8px"
             ),
 
-            columns=4,
+            columns=5,
             spacing=3,
             width="100%"
         ),
 
+        # Выбранные партиции (строки по system.parts)
+        rx.cond(
+            general_stats.get('partition_filter', '') != '',
+            rx.vstack(
+                rx.text(
+                    f"Фильтр: {general_stats.get('partition_filter', '')}",
+                    color="gray.400",
+                    font_size="sm"
+                ),
+                rx.flex(
+                    rx.foreach(
+                        general_stats.get('partitions', []),
+                        lambda part: rx.badge(
+                            f"{part['partition']}: {part['rows']} строк, {part['size_readable']}",
+                            color_scheme="gray",
+                            margin_right="5px",
+                            margin_bottom="5px"
+                        )
+                    ),
+                    wrap="wrap"
+                ),
+                margin_top="15px",
+                align_items="start",
+                width="100%"
+            )
+        ),
+
         background_color="gray.800",
         padding="20px",
         border_radius="10px",
@@ -431,6 +487,50 @@ def top_values_table() -> rx.Component:
     )
 
 
+def drift_table() -> rx.Component:
+    """Таблица дрейфа колонок относительно базового снимка"""
+    from ..pages.data_profiler import DataProfilerState
+
+    return rx.cond(
+        DataProfilerState.drift_results.length() > 0,
+        rx.scroll_area(
+            rx.table.root(
+                rx.table.header(
+                    rx.table.row(
+                        rx.table.column_header_cell("Колонка", color="gray.300"),
+                        rx.table.column_header_cell("PSI", color="gray.300"),
+                        rx.table.column_header_cell("KS", color="gray.300"),
+                        rx.table.column_header_cell("Δ NULL, п.п.", color="gray.300"),
+                        rx.table.column_header_cell("Снимки", color="gray.300"),
+                        rx.table.column_header_cell("Статус", color="gray.300"),
+                    )
+                ),
+                rx.table.body(
+                    rx.foreach(
+                        DataProfilerState.drift_results,
+                        lambda row: rx.table.row(
+                            rx.table.cell(rx.text(row['column_name'], color="white")),
+                            rx.table.cell(rx.text(row['psi'], color="gray.300")),
+                            rx.table.cell(rx.text(row['ks'], color="gray.300")),
+                            rx.table.cell(rx.text(row['null_delta'], color="gray.300")),
+                            rx.table.cell(
+                                rx.text(row['baseline_at'] + " → " + row['current_at'], color="gray.400", font_size="sm")
+                            ),
+                            rx.table.cell(rx.badge(row['status'], color_scheme=row['color'])),
+                            _hover={"background_color": "gray.700"}
+                        )
+                    )
+                ),
+                width="100%",
+                variant="surface"
+            ),
+            height="300px",
+            width="100%"
+        ),
+        rx.text("Нет снимков для сравнения", color="gray.400")
+    )
+
+
 # Вспомогательные функции
 def format_number(num: Any) -> str:
     """Форматирование чисел с разделителями тысяч"""
@@ -1,18 +1,36 @@
 # backend/backend/pages/data_profiler.py
 import reflex as rx
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from ..services.data_profiler_service import DataProfilerService
+from ..services.profile_scheduler import ProfileScheduler, PRIORITY_HIGH
+from ..services.local_profiler import LOCAL_DATABASE
+from ..services.drift_detector import drift_detector
 from ..components.data_profiler_components import (
     table_selector,
     profile_overview,
     column_statistics,
     distribution_chart,
-    top_values_table
+    top_values_table,
+    drift_table
 )
 
 # Инициализация сервиса
 profiler_service = DataProfilerService()
 
+# Фоновое профилирование: все таблицы datagate каждую ночь
+# (потоки запускает приложение при старте, см. backend.py)
+profile_scheduler = ProfileScheduler(profiler_service)
+profile_scheduler.schedule('datagate')
+
+
+async def _fetch_distribution(request: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Посчитать распределение колонки в потоке: (распределение, сообщение об ошибке)"""
+    try:
+        return await asyncio.to_thread(profiler_service.get_column_distribution, **request), ""
+    except Exception as e:
+        return {}, f"Ошибка построения распределения: {str(e)}"
+
 
 class DataProfilerState(rx.State):
     """Состояние страницы Data Profiler"""
@@ -26,13 +44,27 @@ class DataProfilerState(rx.State):
     profile_results: Dict[str, Any] = {}
     is_loading: bool = False
     error_message: str = ""
+    info_message: str = ""
 
     # Выбранная колонка для детального анализа
     selected_column: str = ""
     column_distribution: Dict[str, Any] = {}
+    distribution_scale: str = "linear"
+
+    # Дрейф колонок относительно базового снимка
+    drift_results: List[Dict[str, str]] = []
+    drift_baseline: str = "previous"
+    is_checking_drift: bool = False
 
     # Параметры профилирования
     sample_size: int = 10000
+    exact_mode: bool = False
+    incremental_mode: bool = False
+    # Партиции через запятую (partition_id, например 202507) или интервал дат
+    # по колонке ключа партиционирования; пусто - вся таблица
+    partitions_input: str = ""
+    time_range_start: str = ""
+    time_range_end: str = ""
 
     def load_tables(self):
         """Загрузить список доступных таблиц"""
@@ -43,54 +75,229 @@ class DataProfilerState(rx.State):
             self.selected_database = first_table['database']
             self.selected_table = first_table['table_name']
 
-    def select_table(self, database: str, table_name: str):
-        """Выбрать таблицу для профилирования"""
+    async def select_table(self, database: str, table_name: str):
+        """Выбрать таблицу и показать ее последний сохраненный профиль"""
         self.selected_database = database
         self.selected_table = table_name
         self.profile_results = {}
         self.selected_column = ""
         self.column_distribution = {}
+        self.info_message = ""
+        self.drift_results = []
 
-    def run_profiling(self):
-        """Запустить профилирование выбранной таблицы"""
+        if database == LOCAL_DATABASE:
+            return
+        snapshot = await asyncio.to_thread(profile_scheduler.latest_profile, database, table_name)
+        if snapshot:
+            request = self._finish_profiling(snapshot)
+            self.info_message = f"Показан сохраненный профиль от {snapshot['snapshot_at']}"
+            if request:
+                self._apply_distribution(request, *await _fetch_distribution(request))
+
+    def schedule_profiling(self):
+        """Поставить профилирование выбранной таблицы в фоновую очередь"""
         if not self.selected_database or not self.selected_table:
-            self.error_message = "Пожалуйста, выберите таблицу для анализа"
             return
-
-        self.is_loading = True
-        self.error_message = ""
-
+        queued = profile_scheduler.submit(
+            self.selected_database, self.selected_table, PRIORITY_HIGH,
+            sample_size=self.sample_size, mode='exact' if self.exact_mode else 'fast',
+            **self._partition_params()
+        )
+        self.info_message = ("Профилирование поставлено в очередь, результат появится в истории"
+                             if queued else "Таблица уже профилируется в фоне")
+
+    async def check_drift(self):
+        """Сравнить последний снимок выбранной таблицы с базовым"""
+        if not self.selected_database or not self.selected_table:
+            return
+        self.is_checking_drift = True
+        yield
         try:
-            self.profile_results = profiler_service.profile_table(
-                self.selected_database,
-                self.selected_table,
-                self.sample_size
+            results = await asyncio.to_thread(
+                drift_detector.detect, self.selected_database, self.selected_table, self.drift_baseline
             )
-
-            if 'error' in self.profile_results:
-                self.error_message = f"Ошибка профилирования: {self.profile_results['error']}"
-            else:
-                # Автоматически выбираем первую колонку для визуализации
-                if self.profile_results.get('column_stats'):
-                    first_column = self.profile_results['column_stats'][0]['column_name']
-                    self.select_column(first_column)
+            self.drift_results = [
+                {
+                    'column_name': row['column_name'],
+                    'psi': '—' if row['psi'] is None else str(row['psi']),
+                    'ks': '—' if row['ks'] is None else str(row['ks']),
+                    'null_delta': f"{row['null_delta']:+}",
+                    'baseline_at': row['baseline_at'],
+                    'current_at': row['current_at'],
+                    'status': 'Дрейф' if row['drifted'] else 'Стабильно',
+                    'color': 'red' if row['drifted'] else 'green'
+                }
+                for row in results
+            ]
+        except Exception as e:
+            self.error_message = f"Ошибка поиска дрейфа: {str(e)}"
+        finally:
+            self.is_checking_drift = False
+
+    def set_drift_baseline(self, baseline: str):
+        """Сменить базовый снимок для сравнения"""
+        self.drift_baseline = baseline
+
+    @rx.background
+    async def run_profiling(self):
+        """Запустить профилирование выбранной таблицы
+
+        Выполняется в фоне: статистика по колонкам появляется в таблице
+        по мере готовности, интерфейс при этом не блокируется.
+        """
+        async with self:
+            if not self.selected_database or not self.selected_table:
+                self.error_message = "Пожалуйста, выберите таблицу для анализа"
+                return
+
+            self.is_loading = True
+            self.error_message = ""
+            self.info_message = ""
+            self.profile_results = {}
+            database, table_name = self.selected_database, self.selected_table
+            sample_size, incremental_mode = self.sample_size, self.incremental_mode
+            mode = 'exact' if self.exact_mode else 'fast'
+            partition_params = self._partition_params()
+
+        distribution_request = None
+        try:
+            if incremental_mode:
+                result = await asyncio.to_thread(profiler_service.profile_table_incremental, database, table_name)
+                async with self:
+                    distribution_request = self._finish_profiling(result)
+                await self._load_distribution(distribution_request)
+                return
+
+            async for event in profiler_service.profile_table_stream(database, table_name, sample_size, mode=mode,
+                                                                     **partition_params):
+                async with self:
+                    if event['stage'] == 'table':
+                        self.profile_results = {
+                            'table_info': event['table_info'],
+                            'general_stats': event['general_stats'],
+                            'sampling': event['sampling'],
+                            'column_stats': []
+                        }
+                    elif event['stage'] == 'column':
+                        self._add_column_stats(event['stats'])
+                    elif event['stage'] == 'done':
+                        distribution_request = self._finish_profiling(event['result'])
+                    else:
+                        self._finish_profiling({'error': event['error']})
+                if event['stage'] == 'done' and database != LOCAL_DATABASE and not event['result'].get('from_cache'):
+                    await asyncio.to_thread(profile_scheduler.save_snapshot, database, table_name, event['result'])
+            await self._load_distribution(distribution_request)
         except Exception as e:
-            self.error_message = f"Ошибка: {str(e)}"
+            async with self:
+                self.error_message = f"Ошибка: {str(e)}"
         finally:
-            self.is_loading = False
+            async with self:
+                self.is_loading = False
 
-    def select_column(self, column_name: str):
-        """Выбрать колонку для детального анализа"""
+    async def _load_distribution(self, request: Optional[Dict[str, Any]]):
+        """Загрузить распределение из фоновой задачи: расчет вне блокировки, запись под ней"""
+        if not request:
+            return
+        distribution, error = await _fetch_distribution(request)
+        async with self:
+            self._apply_distribution(request, distribution, error)
+
+    def _add_column_stats(self, stats: Dict[str, Any]):
+        """Добавить статистику колонки, сохраняя порядок колонок таблицы"""
+        order = {
+            column['name']: i
+            for i, column in enumerate(self.profile_results.get('table_info', {}).get('columns', []))
+        }
+        column_stats = sorted(
+            self.profile_results.get('column_stats', []) + [stats],
+            key=lambda col: order.get(col['column_name'], len(order))
+        )
+        self.profile_results = {**self.profile_results, 'column_stats': column_stats}
+
+    def _finish_profiling(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Сохранить итоговый результат профилирования
+
+        Возвращает запрос распределения первой колонки, если его нет среди
+        посчитанных при профилировании (см. _select_column).
+        """
+        self.profile_results = result
+
+        if 'error' in self.profile_results:
+            self.error_message = f"Ошибка профилирования: {self.profile_results['error']}"
+            return None
+        # Автоматически выбираем первую колонку для визуализации
+        if self.profile_results.get('column_stats'):
+            first_column = self.profile_results['column_stats'][0]['column_name']
+            return self._select_column(first_column)
+        return None
+
+    def _select_column(self, column_name: str) -> Optional[Dict[str, Any]]:
+        """Выбрать колонку; вернуть параметры get_column_distribution, если распределение нужно загрузить
+
+        Запрос выполняется вызывающим вне блокировки состояния (_fetch_distribution),
+        чтобы долгий расчет не держал состояние страницы.
+        """
         self.selected_column = column_name
 
-        # Загружаем распределение для выбранной колонки
-        if self.selected_database and self.selected_table:
-            self.column_distribution = profiler_service.get_column_distribution(
-                self.selected_database,
-                self.selected_table,
-                column_name,
-                bins=20
-            )
+        # Распределение по умолчанию уже посчитано при профилировании
+        precomputed = self.profile_results.get('distributions', {}).get(column_name)
+        if precomputed is not None and self.distribution_scale == 'linear':
+            self.column_distribution = precomputed
+            return None
+
+        self.column_distribution = {}
+        if not self.selected_database or not self.selected_table:
+            return None
+        return {
+            'database': self.selected_database,
+            'table_name': self.selected_table,
+            'column_name': column_name,
+            'bins': 20,
+            'sample_size': self.sample_size,
+            'scale': self.distribution_scale,
+            **self._partition_params()
+        }
+
+    def _apply_distribution(self, request: Dict[str, Any], distribution: Dict[str, Any], error: str):
+        """Показать загруженное распределение, если колонка и шкала еще выбраны"""
+        if self.selected_column != request['column_name'] or self.distribution_scale != request['scale']:
+            return
+        self.column_distribution = distribution
+        if error:
+            self.error_message = error
+
+    async def select_column(self, column_name: str):
+        """Выбрать колонку для детального анализа"""
+        request = self._select_column(column_name)
+        if request:
+            self._apply_distribution(request, *await _fetch_distribution(request))
+
+    async def set_distribution_scale(self, scale: str):
+        """Сменить шкалу гистограммы и перестроить распределение выбранной колонки"""
+        self.distribution_scale = scale
+        if self.selected_column:
+            await self.select_column(self.selected_column)
+
+    def _partition_params(self) -> Dict[str, Any]:
+        """Фильтр профилирования: партиции из поля ввода или интервал дат [начало, конец)"""
+        partitions = [part.strip() for part in self.partitions_input.split(',') if part.strip()]
+        if partitions:
+            return {'partitions': partitions}
+        if self.time_range_start and self.time_range_end:
+            return {'time_range': (self.time_range_start, self.time_range_end)}
+        return {}
+
+    def set_partitions_input(self, value: str):
+        """Обновить фильтр партиций"""
+        self.partitions_input = value
+
+    def set_time_range_start(self, value: str):
+        """Обновить начало интервала дат"""
+        self.time_range_start = value
+
+    def set_time_range_end(self, value: str):
+        """Обновить конец интервала дат (не включая)"""
+        self.time_range_end = value
 
     def update_sample_size(self, value: str):
         """Обновить размер выборки"""
@@ -99,6 +306,14 @@ class DataProfilerState(rx.State):
         except:
             self.sample_size = 10000
 
+    def set_exact_mode(self, value: bool):
+        """Переключить точный режим профилирования"""
+        self.exact_mode = value
+
+    def set_incremental_mode(self, value: bool):
+        """Переключить инкрементальное профилирование"""
+        self.incremental_mode = value
+
     def export_profile(self):
         """Экспорт результатов профилирования"""
         # TODO: Реализовать экспорт в Excel/JSON
@@ -138,6 +353,20 @@ def data_profiler_page() -> rx.Component:
             )
         ),
 
+        rx.cond(
+            DataProfilerState.info_message != "",
+            rx.box(
+                rx.hstack(
+                    rx.icon("history", color="blue.400"),
+                    rx.text(DataProfilerState.info_message, color="blue.400"),
+                    spacing="2"
+                ),
+                padding="15px",
+                border_radius="8px",
+                margin_bottom="20px"
+            )
+        ),
+
         # Основной контент
         rx.vstack(
             # Селектор таблицы
@@ -158,6 +387,13 @@ def data_profiler_page() -> rx.Component:
                     width="200px"
                 ),
 
+                rx.button(
+                    "В фоне",
+                    on_click=DataProfilerState.schedule_profiling,
+                    variant="outline",
+                    is_disabled=DataProfilerState.selected_database == LOCAL_DATABASE,
+                ),
+
                 rx.hstack(
                     rx.text("Размер выборки:", color="gray.400"),
                     rx.number_input(
@@ -171,6 +407,53 @@ def data_profiler_page() -> rx.Component:
                     spacing="2"
                 ),
 
+                rx.hstack(
+                    rx.switch(
+                        is_checked=DataProfilerState.exact_mode,
+                        on_change=DataProfilerState.set_exact_mode
+                    ),
+                    rx.text("Точный режим (медленнее)", color="gray.400"),
+                    spacing="2"
+                ),
+
+                rx.hstack(
+                    rx.text("Партиции:", color="gray.400"),
+                    rx.input(
+                        value=DataProfilerState.partitions_input,
+                        on_change=DataProfilerState.set_partitions_input,
+                        placeholder="202507, 202508",
+                        width="160px"
+                    ),
+                    spacing="2"
+                ),
+
+                rx.hstack(
+                    rx.text("Даты:", color="gray.400"),
+                    rx.input(
+                        type="date",
+                        value=DataProfilerState.time_range_start,
+                        on_change=DataProfilerState.set_time_range_start,
+                        width="150px"
+                    ),
+                    rx.text("—", color="gray.400"),
+                    rx.input(
+                        type="date",
+                        value=DataProfilerState.time_range_end,
+                        on_change=DataProfilerState.set_time_range_end,
+                        width="150px"
+                    ),
+                    spacing="2"
+                ),
+
+                rx.hstack(
+                    rx.switch(
+                        is_checked=DataProfilerState.incremental_mode,
+                        on_change=DataProfilerState.set_incremental_mode
+                    ),
+                    rx.text("Только новые данные", color="gray.400"),
+                    spacing="2"
+                ),
+
                 spacing="4",
                 align="center"
             ),
@@ -198,10 +481,20 @@ def data_profiler_page() -> rx.Component:
                         rx.hstack(
                             # График распределения
                             rx.box(
-                                rx.heading(
-                                    rx.text.span("Распределение: ", color="white"),
-                                    rx.text.span(DataProfilerState.selected_column, color="blue.400"),
-                                    size="5",
+                                rx.hstack(
+                                    rx.heading(
+                                        rx.text.span("Распределение: ", color="white"),
+                                        rx.text.span(DataProfilerState.selected_column, color="blue.400"),
+                                        size="5"
+                                    ),
+                                    rx.spacer(),
+                                    rx.select(
+                                        ["linear", "log", "quantile"],
+                                        value=DataProfilerState.distribution_scale,
+                                        on_change=DataProfilerState.set_distribution_scale,
+                                        size="1"
+                                    ),
+                                    width="100%",
                                     margin_bottom="15px"
                                 ),
                                 distribution_chart(),
@@ -231,6 +524,40 @@ def data_profiler_page() -> rx.Component:
                 )
             ),
 
+            # Дрейф по сохраненным снимкам
+            rx.cond(
+                DataProfilerState.selected_database != LOCAL_DATABASE,
+                rx.box(
+                    rx.hstack(
+                        rx.heading("Дрейф данных", size="5", color="white"),
+                        rx.spacer(),
+                        rx.select(
+                            ["previous", "first"],
+                            value=DataProfilerState.drift_baseline,
+                            on_change=DataProfilerState.set_drift_baseline,
+                            size="1"
+                        ),
+                        rx.button(
+                            rx.cond(
+                                DataProfilerState.is_checking_drift,
+                                rx.spinner(size="sm", color="white"),
+                                rx.text("Проверить дрейф")
+                            ),
+                            on_click=DataProfilerState.check_drift,
+                            variant="outline",
+                            is_disabled=DataProfilerState.is_checking_drift
+                        ),
+                        width="100%",
+                        margin_bottom="15px"
+                    ),
+                    drift_table(),
+                    background_color="gray.800",
+                    padding="20px",
+                    border_radius="10px",
+                    width="100%"
+                )
+            ),
+
             spacing="4",
             width="100%"
         ),
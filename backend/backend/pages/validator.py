@@ -1,11 +1,22 @@
 import reflex as rx
 from ..components.navbar import navbar
 from ..services.clickhouse_service import clickhouse_service
+from ..services.streaming_validator import StreamingValidator
+from ..services.validation_worker import get_executor, create_progress_queue, validate_file
+from ..services.table_validator import table_validator
+from ..services.dataset_ingestion import dataset_ingestor
 import pandas as pd
 from typing import List, Dict, Any
 from datetime import datetime
+import asyncio
+import queue
 import os
-import io
+
+# Размер блока при сохранении загружаемого файла на диск
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Интервал (в секундах) опроса прогресса валидации
+PROGRESS_POLL_INTERVAL = 0.3
 
 
 class ValidatorState(rx.State):
@@ -17,6 +28,12 @@ class ValidatorState(rx.State):
     error_message: str = ""
     success_message: str = ""
 
+    is_ingesting: bool = False
+
+    # Проверка таблиц ClickHouse на месте
+    tables: List[str] = []
+    selected_table: str = ""
+
     # Статистика
     total_checks: int = 0
     failed_checks: int = 0
@@ -37,38 +54,50 @@ class ValidatorState(rx.State):
             self.error_message = ""
             self.success_message = ""
 
-            try:
-                # Читаем содержимое файла
-                upload_data = await file.read()
+            if not filename.endswith(('.csv', '.xlsx', '.xls')):
+                self.error_message = "Поддерживаются только CSV и Excel файлы"
+                return
 
+            try:
                 # Начинаем валидацию
                 self.is_validating = True
+                self.upload_progress = 0
                 yield
 
-                # Читаем данные в зависимости от типа файла
-                if filename.endswith('.csv'):
-                    df = pd.read_csv(io.BytesIO(upload_data))
-                elif filename.endswith(('.xlsx', '.xls')):
-                    df = pd.read_excel(io.BytesIO(upload_data))
-                else:
-                    self.error_message = "Поддерживаются только CSV и Excel файлы"
-                    self.is_validating = False
-                    return
-
-                # Сохраняем файл для истории
+                # Сохраняем файл для истории, копируя его порциями
                 file_path = f"data/uploads/{filename}"
                 with open(file_path, "wb") as f:
-                    f.write(upload_data)
+                    while True:
+                        block = await file.read(UPLOAD_BLOCK_SIZE)
+                        if not block:
+                            break
+                        f.write(block)
 
-                # Выполняем проверки
-                results = self.validate_dataframe(df, filename)
-                self.validation_results = results
+                # Разбор и проверки выполняются в отдельном процессе,
+                # чтобы не блокировать цикл событий для других сессий
+                rules = await asyncio.to_thread(clickhouse_service.get_validation_rules)
+                progress_queue = create_progress_queue()
+                future = asyncio.get_running_loop().run_in_executor(
+                    get_executor(), validate_file, file_path, filename, progress_queue, rules
+                )
+                while not future.done():
+                    await asyncio.wait({future}, timeout=PROGRESS_POLL_INTERVAL)
+                    progress = self._drain_progress(progress_queue)
+                    if progress is not None and progress != self.upload_progress:
+                        self.upload_progress = progress
+                        yield
+                validation = await future
+                self.upload_progress = 100
 
-                # Обновляем статистику
-                self.total_checks = len(results)
-                self.failed_checks = len([r for r in results if r['check_status'] == 'FAILED'])
-                self.success_rate = ((
-                                                 self.total_checks - self.failed_checks) / self.total_checks * 100) if self.total_checks > 0 else 0
+                # Запись в ClickHouse блокирующая, выполняем ее в потоке
+                if validation['staged_path']:
+                    await asyncio.to_thread(
+                        clickhouse_service.record_uploaded_dataset,
+                        filename, validation['staged_path'], validation['columns'],
+                        validation['row_count'], validation['file_size']
+                    )
+                results = await asyncio.to_thread(self.store_results, validation['results'])
+                self._set_results(results)
 
                 self.success_message = f"Валидация завершена! Выполнено {self.total_checks} проверок."
 
@@ -79,79 +108,96 @@ class ValidatorState(rx.State):
                 self.is_validating = False
                 yield
 
+    async def ingest_file(self):
+        """Загрузить выбранный файл в таблицу ClickHouse."""
+        if not self.selected_file:
+            return
+
+        self.error_message = ""
+        self.success_message = ""
+        self.is_ingesting = True
+        yield
+
+        try:
+            result = await asyncio.to_thread(dataset_ingestor.ingest, f"data/uploads/{self.selected_file}")
+            self.success_message = (
+                f"Файл загружен в {result['table']}: {result['row_count']} строк за {result['seconds']} с"
+            )
+            self.tables = await asyncio.to_thread(table_validator.get_tables)
+        except Exception as e:
+            self.error_message = f"Ошибка загрузки в ClickHouse: {str(e)}"
+            print(f"Ingestion error: {str(e)}")
+        finally:
+            self.is_ingesting = False
+            yield
+
+    async def load_tables(self):
+        """Загрузить список таблиц ClickHouse."""
+        try:
+            self.tables = await asyncio.to_thread(table_validator.get_tables)
+        except Exception as e:
+            print(f"Ошибка загрузки таблиц: {e}")
+            self.tables = []
+
+    def set_selected_table(self, table_name: str):
+        self.selected_table = table_name
+
+    async def validate_table(self):
+        """Проверить таблицу ClickHouse без выгрузки данных."""
+        if not self.selected_table:
+            return
+
+        self.error_message = ""
+        self.success_message = ""
+        self.is_validating = True
+        self.upload_progress = 0
+        yield
+
+        try:
+            results = await asyncio.to_thread(table_validator.validate, 'datagate', self.selected_table)
+            results = await asyncio.to_thread(self.store_results, results)
+            self._set_results(results)
+            self.success_message = f"Проверка таблицы {self.selected_table} завершена! Выполнено {self.total_checks} проверок."
+        except Exception as e:
+            self.error_message = f"Ошибка при проверке таблицы: {str(e)}"
+            print(f"Table validation error: {str(e)}")
+        finally:
+            self.is_validating = False
+            yield
+
+    def _set_results(self, results: List[Dict[str, Any]]):
+        """Показать результаты и обновить статистику."""
+        self.validation_results = results
+        self.total_checks = len(results)
+        self.failed_checks = len([r for r in results if r['check_status'] == 'FAILED'])
+        self.success_rate = ((self.total_checks - self.failed_checks) / self.total_checks * 100) if self.total_checks > 0 else 0
+
+    @staticmethod
+    def _drain_progress(progress_queue) -> Any:
+        """Последнее значение прогресса из очереди (None, если новых нет)."""
+        progress = None
+        while True:
+            try:
+                progress = progress_queue.get_nowait()
+            except queue.Empty:
+                return progress
+
     def validate_dataframe(self, df: pd.DataFrame, filename: str) -> List[Dict[str, Any]]:
         """Выполнить валидацию DataFrame."""
-        results = []
-
-        # Проверка на пустые значения
-        for column in df.columns:
-            null_count = df[column].isnull().sum()
-            total_count = len(df)
-            null_percentage = (null_count / total_count * 100) if total_count > 0 else 0
-
-            check_data = {
-                'dataset_name': filename,
-                'table_name': 'uploaded_data',
-                'column_name': str(column),
-                'check_type': 'NULL_CHECK',
-                'check_status': 'PASSED' if null_percentage < 10 else 'FAILED',
-                'error_count': int(null_count),
-                'total_count': total_count,
-                'error_percentage': float(null_percentage),
-                'details': f'{null_count} null values found ({null_percentage:.2f}%)'
-            }
-
-            results.append(check_data)
-            try:
-                clickhouse_service.insert_quality_check(check_data)
-            except Exception as e:
-                print(f"Error inserting to ClickHouse: {e}")
-
-        # Проверка на дубликаты
-        duplicate_count = df.duplicated().sum()
-        duplicate_percentage = (duplicate_count / len(df) * 100) if len(df) > 0 else 0
-
-        check_data = {
-            'dataset_name': filename,
-            'table_name': 'uploaded_data',
-            'column_name': 'ALL_COLUMNS',
-            'check_type': 'DUPLICATE_CHECK',
-            'check_status': 'PASSED' if duplicate_percentage < 5 else 'FAILED',
-            'error_count': int(duplicate_count),
-            'total_count': len(df),
-            'error_percentage': float(duplicate_percentage),
-            'details': f'{duplicate_count} duplicate rows found ({duplicate_percentage:.2f}%)'
-        }
-
-        results.append(check_data)
+        validator = StreamingValidator(filename, rules=clickhouse_service.get_validation_rules())
+        validator.update(df)
+        return self.store_results(validator.results())
+
+    def store_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Сохранить результаты проверок в ClickHouse."""
+        # Предупреждения о смешанных типах в историю не пишутся
+        persisted = [r for r in results if r['check_type'] != 'DATA_TYPE_CHECK']
         try:
-            clickhouse_service.insert_quality_check(check_data)
+            clickhouse_service.insert_quality_checks(persisted)
+            clickhouse_service.flush_quality_checks()
         except Exception as e:
             print(f"Error inserting to ClickHouse: {e}")
 
-        # Проверка типов данных
-        for column in df.columns:
-            if df[column].dtype == 'object':
-                # Проверяем, можно ли конвертировать в числа
-                try:
-                    pd.to_numeric(df[column], errors='coerce')
-                    non_numeric_count = pd.to_numeric(df[column], errors='coerce').isna().sum()
-                    if non_numeric_count > 0 and non_numeric_count < len(df):
-                        check_data = {
-                            'dataset_name': filename,
-                            'table_name': 'uploaded_data',
-                            'column_name': str(column),
-                            'check_type': 'DATA_TYPE_CHECK',
-                            'check_status': 'WARNING',
-                            'error_count': int(non_numeric_count),
-                            'total_count': len(df),
-                            'error_percentage': float(non_numeric_count / len(df) * 100),
-                            'details': f'Mixed data types detected: {non_numeric_count} non-numeric values in potentially numeric column'
-                        }
-                        results.append(check_data)
-                except:
-                    pass
-
         return results
 
 
@@ -188,10 +234,55 @@ def validator_page() -> rx.Component:
                         ),
                         rx.cond(
                             ValidatorState.selected_file != "",
-                            rx.text(f"Выбран файл: {ValidatorState.selected_file}", color="blue"),
+                            rx.hstack(
+                                rx.text(f"Выбран файл: {ValidatorState.selected_file}", color="blue"),
+                                rx.spacer(),
+                                rx.button(
+                                    rx.cond(ValidatorState.is_ingesting, rx.spinner(size="2"), rx.icon("database", size=16)),
+                                    "Загрузить в ClickHouse",
+                                    on_click=ValidatorState.ingest_file,
+                                    is_disabled=ValidatorState.is_ingesting | ValidatorState.is_validating,
+                                    variant="soft",
+                                ),
+                                width="100%",
+                                align="center",
+                            ),
+                        ),
+                        spacing="4",
+                        width="100%",
+                    ),
+                    width="100%",
+                ),
+
+                # Проверка таблицы ClickHouse на месте
+                rx.card(
+                    rx.vstack(
+                        rx.heading("Проверка таблицы ClickHouse", size="5"),
+                        rx.text("Проверки выполняются запросом к таблице, без выгрузки данных", size="2", color="gray"),
+                        rx.hstack(
+                            rx.select(
+                                ValidatorState.tables,
+                                placeholder="Выберите таблицу",
+                                value=ValidatorState.selected_table,
+                                on_change=ValidatorState.set_selected_table,
+                                width="100%",
+                            ),
+                            rx.button(
+                                rx.icon("refresh_cw", size=16),
+                                on_click=ValidatorState.load_tables,
+                                variant="soft",
+                            ),
+                            rx.button(
+                                "Проверить таблицу",
+                                on_click=ValidatorState.validate_table,
+                                is_disabled=ValidatorState.selected_table == "",
+                                color_scheme="blue",
+                            ),
+                            width="100%",
                         ),
                         spacing="4",
                         width="100%",
+                        on_mount=ValidatorState.load_tables,
                     ),
                     width="100%",
                 ),
@@ -220,6 +311,15 @@ def validator_page() -> rx.Component:
                     rx.vstack(
                         rx.spinner(size="3"),
                         rx.text("Выполняется валидация данных..."),
+                        rx.cond(
+                            ValidatorState.upload_progress > 0,
+                            rx.vstack(
+                                rx.progress(value=ValidatorState.upload_progress, width="100%"),
+                                rx.text(f"{ValidatorState.upload_progress}%", size="2", color="gray"),
+                                align="center",
+                                width="100%",
+                            ),
+                        ),
                         align="center",
                         width="100%",
                     ),
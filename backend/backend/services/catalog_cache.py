@@ -0,0 +1,135 @@
+# backend/backend/services/catalog_cache.py
+from typing import Dict, List, Any, Optional, Callable, Tuple
+import threading
+import time
+
+# Полная перезагрузка каталога не реже, чем раз в CATALOG_TTL секунд
+CATALOG_TTL = 300
+
+# Как часто (в секундах) проверять metadata_modification_time таблиц
+CATALOG_CHECK_INTERVAL = 10
+
+SYSTEM_DATABASES = "('system', 'information_schema', 'INFORMATION_SCHEMA')"
+
+
+class CatalogCache:
+    """Кэш метаданных ClickHouse: базы, таблицы и колонки
+
+    Все таблицы и колонки загружаются двумя запросами к system.tables
+    и system.columns и хранятся в памяти. Каталог перезагружается по TTL,
+    а также если изменился отпечаток metadata_modification_time таблиц
+    (CREATE, ALTER, DROP), который проверяется легким запросом не чаще
+    CATALOG_CHECK_INTERVAL секунд. total_rows/total_bytes в каталоге могут
+    отставать от данных не больше чем на TTL.
+    """
+
+    def __init__(self, execute: Callable[[str], List[Tuple]], ttl: float = CATALOG_TTL,
+                 check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.execute = execute
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._tables: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._version: Optional[Tuple] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def _version_query(self) -> Tuple:
+        row = self.execute(f"""
+        SELECT count(), toUnixTimestamp(max(metadata_modification_time)),
+               cityHash64(arrayStringConcat(arraySort(groupArray(concat(database, '.', name))), ','))
+        FROM system.tables
+        WHERE database NOT IN {SYSTEM_DATABASES}
+        """)[0]
+        return tuple(row)
+
+    def _load(self):
+        """Загрузить таблицы и колонки всех пользовательских баз"""
+        version = self._version_query()
+        table_rows = self.execute(f"""
+        SELECT
+            database, name, engine, total_rows, total_bytes, formatReadableSize(total_bytes),
+            sampling_key, sorting_key, partition_key, toUnixTimestamp(metadata_modification_time)
+        FROM system.tables
+        WHERE database NOT IN {SYSTEM_DATABASES}
+        ORDER BY database, name
+        """)
+        column_rows = self.execute(f"""
+        SELECT database, table, name, type, default_kind, default_expression, comment
+        FROM system.columns
+        WHERE database NOT IN {SYSTEM_DATABASES}
+        ORDER BY database, table, position
+        """)
+
+        tables = {}
+        for row in table_rows:
+            tables[(row[0], row[1])] = {
+                'database': row[0],
+                'table_name': row[1],
+                'engine': row[2],
+                'total_rows': row[3] or 0,
+                'total_bytes': row[4] or 0,
+                'size_readable': row[5] or '0 B',
+                'sampling_key': row[6],
+                'sorting_key': row[7],
+                'partition_key': row[8],
+                'metadata_modified': row[9],
+                'columns': []
+            }
+        for row in column_rows:
+            table = tables.get((row[0], row[1]))
+            if table is not None:
+                table['columns'].append({
+                    'name': row[2],
+                    'type': row[3],
+                    'default_type': row[4],
+                    'default_expression': row[5],
+                    'comment': row[6]
+                })
+
+        self._tables = tables
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._loaded_at >= self.ttl:
+                self._load()
+            elif now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                if self._version_query() != self._version:
+                    self._load()
+
+    def invalidate(self):
+        """Сбросить каталог (следующее обращение перечитает метаданные)"""
+        with self._lock:
+            self._version = None
+
+    def tables(self, database: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Таблицы (всех пользовательских баз или одной базы) без списка колонок"""
+        self._ensure_fresh()
+        return [
+            {key: value for key, value in table.items() if key != 'columns'}
+            for (db, _), table in self._tables.items()
+            if database is None or db == database
+        ]
+
+    def table(self, database: str, table_name: str) -> Optional[Dict[str, Any]]:
+        """Метаданные таблицы (None, если таблицы нет)"""
+        self._ensure_fresh()
+        table = self._tables.get((database, table_name))
+        if table is None:
+            return None
+        return {**table, 'columns': [dict(column) for column in table['columns']]}
+
+    def columns(self, database: str, table_name: str) -> List[Dict[str, Any]]:
+        """Колонки таблицы в порядке объявления"""
+        table = self.table(database, table_name)
+        return table['columns'] if table else []
+
+    def column_type(self, database: str, table_name: str, column_name: str) -> Optional[str]:
+        for column in self.columns(database, table_name):
+            if column['name'] == column_name:
+                return column['type']
+        return None
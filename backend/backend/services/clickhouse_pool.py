@@ -0,0 +1,78 @@
+# backend/backend/services/clickhouse_pool.py
+from typing import Optional, Dict, Any
+from contextlib import contextmanager
+import queue
+import threading
+import clickhouse_connect
+from clickhouse_connect.driver import Client
+
+
+class ClickHousePool:
+    """Ограниченный пул HTTP клиентов ClickHouse
+
+    Клиент clickhouse_connect нельзя использовать из нескольких потоков
+    одновременно, поэтому для параллельных запросов каждый поток берет
+    отдельного клиента из пула. Клиенты создаются лениво, не больше max_size.
+    """
+
+    def __init__(self, max_size: int = 4, query_timeout: int = 60, **connect_params: Any):
+        self.max_size = max_size
+        self.query_timeout = query_timeout
+        self.connect_params: Dict[str, Any] = connect_params
+        self._idle: 'queue.LifoQueue[Client]' = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_client(self) -> Client:
+        return clickhouse_connect.get_client(
+            send_receive_timeout=self.query_timeout,
+            settings={'max_execution_time': self.query_timeout},
+            **self.connect_params
+        )
+
+    def acquire(self, timeout: Optional[float] = None) -> Client:
+        """Взять свободного клиента, создав нового при наличии места в пуле"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._create_client()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def release(self, client: Client):
+        """Вернуть клиента в пул"""
+        self._idle.put(client)
+
+    @contextmanager
+    def client(self, timeout: Optional[float] = None):
+        client = self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def close(self):
+        """Закрыть все свободные клиенты"""
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.close()
+            with self._lock:
+                self._created -= 1
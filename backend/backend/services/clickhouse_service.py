@@ -1,13 +1,105 @@
 from clickhouse_driver import Client
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import os
 from dotenv import load_dotenv
 import uuid
 from datetime import datetime
+import atexit
+import threading
+import time
+import json
+from .validation_rules import DEFAULT_RULES
+from .catalog_cache import CatalogCache
 
 load_dotenv()
 
+# Сколько секунд держать загруженные правила валидации без перечитывания
+VALIDATION_RULES_TTL = 300
+
+
+class QualityCheckWriter:
+    """Буферизованная запись результатов проверок качества.
+
+    Строки копятся в памяти и записываются одной колоночной вставкой, когда
+    буфер достигает max_rows или проходит flush_interval секунд. Поток,
+    заполнивший буфер, сам выполняет вставку и ждет ее (обратное давление).
+    Если ClickHouse недоступен, в буфере хранится не больше max_pending строк.
+    """
+
+    COLUMNS = [
+        'dataset_name', 'table_name', 'column_name', 'check_type', 'check_status',
+        'error_count', 'total_count', 'error_percentage', 'details'
+    ]
+
+    def __init__(self, service: 'ClickHouseService', max_rows: int = 1000, flush_interval: float = 5.0,
+                 max_pending: int = 100000):
+        self.service = service
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_periodically, name='quality-check-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, rows: List[Dict[str, Any]]):
+        """Добавить строки в буфер; при заполнении буфера записать их."""
+        with self._buffer_lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_rows
+
+        if full:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Записать накопленные строки одной вставкой."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return True
+
+            columns = [
+                [str(row['dataset_name']) for row in rows],
+                [str(row['table_name']) for row in rows],
+                [str(row['column_name']) for row in rows],
+                [str(row['check_type']) for row in rows],
+                [str(row['check_status']) for row in rows],
+                [int(row['error_count']) for row in rows],
+                [int(row['total_count']) for row in rows],
+                [float(row['error_percentage']) for row in rows],
+                [str(row['details']) for row in rows],
+            ]
+            try:
+                self.service.execute_insert(
+                    f"INSERT INTO datagate.data_quality_checks ({', '.join(self.COLUMNS)}) VALUES",
+                    columns,
+                    columnar=True
+                )
+                return True
+            except Exception as e:
+                print(f"Error flushing quality checks: {e}")
+                with self._buffer_lock:
+                    self._buffer = rows + self._buffer
+                    dropped = len(self._buffer) - self.max_pending
+                    if dropped > 0:
+                        print(f"Quality check buffer overflow, dropping {dropped} oldest rows")
+                        self._buffer = self._buffer[dropped:]
+                return False
+
+    def close(self):
+        """Остановить фоновую запись и сбросить буфер."""
+        self._stopped.set()
+        self.flush()
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
 
 class ClickHouseService:
     def __init__(self):
@@ -18,12 +110,19 @@ class ClickHouseService:
             password=os.getenv('CLICKHOUSE_PASSWORD', 'admin123'),
             database=os.getenv('CLICKHOUSE_DB', 'datagate'),
         )
+        # Клиент clickhouse_driver не потокобезопасен
+        self._lock = threading.RLock()
+        self._rules_cache: Optional[List[Dict[str, Any]]] = None
+        self._rules_loaded_at = 0.0
+        self.catalog = CatalogCache(self.query_rows)
         self.init_database()
+        self.quality_check_writer = QualityCheckWriter(self)
 
     def init_database(self):
         """Создать базу данных если не существует."""
         try:
-            self.client.execute(f"CREATE DATABASE IF NOT EXISTS {os.getenv('CLICKHOUSE_DB', 'datagate')}")
+            with self._lock:
+                self.client.execute(f"CREATE DATABASE IF NOT EXISTS {os.getenv('CLICKHOUSE_DB', 'datagate')}")
             self.create_tables()
         except Exception as e:
             print(f"Error initializing database: {e}")
@@ -71,12 +170,44 @@ class ClickHouseService:
                 created_at DateTime DEFAULT now()
             ) ENGINE = MergeTree()
             ORDER BY (rule_type, created_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS datagate.table_profiles (
+                database String,
+                table_name String,
+                profiled_at DateTime,
+                status LowCardinality(String),
+                duration_ms UInt32,
+                row_count UInt64,
+                profile String CODEC(ZSTD(3))
+            ) ENGINE = MergeTree()
+            ORDER BY (database, table_name, profiled_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS datagate.column_profiles (
+                database LowCardinality(String),
+                table_name LowCardinality(String),
+                column_name String,
+                profiled_at DateTime,
+                data_type LowCardinality(String),
+                row_count UInt64,
+                null_percentage Float64,
+                unique_count UInt64,
+                mean Nullable(Float64),
+                std_dev Nullable(Float64),
+                hist_edges Array(Float64) CODEC(ZSTD(3)),
+                hist_counts Array(UInt64) CODEC(ZSTD(3)),
+                top_values Array(String) CODEC(ZSTD(3)),
+                top_percentages Array(Float64) CODEC(ZSTD(3))
+            ) ENGINE = MergeTree()
+            ORDER BY (database, table_name, column_name, profiled_at)
             """
         ]
 
         for query in queries:
             try:
-                self.client.execute(query)
+                with self._lock:
+                    self.client.execute(query)
                 print(f"Table created/verified successfully")
             except Exception as e:
                 print(f"Error creating table: {e}")
@@ -84,7 +215,8 @@ class ClickHouseService:
     def execute_query(self, query: str, params: Dict = None) -> List[Dict[str, Any]]:
         """Выполнить запрос и вернуть результат."""
         try:
-            result = self.client.execute(query, params or {})
+            with self._lock:
+                result = self.client.execute(query, params or {})
             if result and isinstance(result, list):
                 return result
             return []
@@ -92,23 +224,105 @@ class ClickHouseService:
             print(f"Error executing query: {e}")
             return []
 
+    def query_rows(self, query: str, params: Dict = None) -> List[Tuple]:
+        """Выполнить запрос и вернуть строки (исключения пробрасываются)."""
+        with self._lock:
+            return self.client.execute(query, params or {})
+
+    def execute_insert(self, query: str, data: List[Any], columnar: bool = False):
+        """Выполнить вставку блока данных (исключения пробрасываются)."""
+        with self._lock:
+            self.client.execute(query, data, columnar=columnar)
+
     def insert_quality_check(self, check_data: Dict[str, Any]) -> bool:
-        """Вставить результат проверки качества."""
+        """Поставить результат проверки качества в очередь на запись."""
+        return self.insert_quality_checks([check_data])
+
+    def insert_quality_checks(self, checks: List[Dict[str, Any]]) -> bool:
+        """Поставить результаты проверок качества в очередь на запись."""
         try:
-            query = """
-                INSERT INTO datagate.data_quality_checks 
-                (dataset_name, table_name, column_name, check_type, check_status, 
-                 error_count, total_count, error_percentage, details) 
-                VALUES
-            """
-            self.client.execute(query + " (%(dataset_name)s, %(table_name)s, %(column_name)s, "
-                                        "%(check_type)s, %(check_status)s, %(error_count)s, %(total_count)s, "
-                                        "%(error_percentage)s, %(details)s)", check_data)
+            self.quality_check_writer.add(checks)
             return True
         except Exception as e:
             print(f"Error inserting quality check: {e}")
             return False
 
+    def flush_quality_checks(self) -> bool:
+        """Немедленно записать накопленные результаты проверок."""
+        return self.quality_check_writer.flush()
+
+    def record_uploaded_dataset(self, dataset_name: str, file_path: str, columns: List[str], row_count: int,
+                                file_size: int, upload_status: str = 'staged') -> bool:
+        """Записать сведения о загруженном наборе данных."""
+        try:
+            self.execute_insert(
+                "INSERT INTO datagate.uploaded_datasets "
+                "(dataset_name, file_path, columns, row_count, file_size, upload_status) VALUES",
+                [(dataset_name, file_path, [str(column) for column in columns], int(row_count),
+                  int(file_size), upload_status)]
+            )
+            return True
+        except Exception as e:
+            print(f"Error recording uploaded dataset: {e}")
+            return False
+
+    def get_validation_rules(self) -> List[Dict[str, Any]]:
+        """Активные правила валидации (кэшируются на VALIDATION_RULES_TTL секунд).
+
+        Если активных правил нет, возвращаются правила по умолчанию.
+        """
+        with self._lock:
+            if self._rules_cache is not None and time.monotonic() - self._rules_loaded_at < VALIDATION_RULES_TTL:
+                return [dict(rule) for rule in self._rules_cache]
+
+        query = """
+            SELECT rule_name, rule_type, column_pattern, validation_logic
+            FROM datagate.validation_rules
+            WHERE is_active = 1
+            ORDER BY created_at
+        """
+        try:
+            with self._lock:
+                rows = self.client.execute(query)
+            rules = [
+                {
+                    'rule_name': row[0],
+                    'rule_type': row[1],
+                    'column_pattern': row[2],
+                    'validation_logic': row[3]
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            print(f"Error loading validation rules: {e}")
+            return [dict(rule) for rule in DEFAULT_RULES]
+
+        rules = rules or [dict(rule) for rule in DEFAULT_RULES]
+        with self._lock:
+            self._rules_cache = rules
+            self._rules_loaded_at = time.monotonic()
+        return [dict(rule) for rule in rules]
+
+    def invalidate_validation_rules(self):
+        """Сбросить кэш правил валидации."""
+        with self._lock:
+            self._rules_cache = None
+
+    def add_validation_rule(self, rule_name: str, rule_type: str, column_pattern: str,
+                            validation_logic: Dict[str, Any], is_active: bool = True) -> bool:
+        """Добавить правило валидации."""
+        try:
+            self.execute_insert(
+                "INSERT INTO datagate.validation_rules "
+                "(rule_name, rule_type, column_pattern, validation_logic, is_active) VALUES",
+                [(rule_name, rule_type, column_pattern, json.dumps(validation_logic), int(is_active))]
+            )
+            self.invalidate_validation_rules()
+            return True
+        except Exception as e:
+            print(f"Error adding validation rule: {e}")
+            return False
+
     def get_recent_checks(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Получить последние проверки качества."""
         query = """
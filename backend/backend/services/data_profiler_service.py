@@ -1,12 +1,69 @@
 # backend/backend/services/data_profiler_service.py
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable, AsyncIterator
 import clickhouse_connect
 from clickhouse_connect.driver import Client
-import pandas as pd
 import numpy as np
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import datetime, timedelta
+import copy
 import re
-from collections import Counter
+import asyncio
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .profile_cache import ProfileCache
+from .incremental_profiler import IncrementalProfiler
+from .clickhouse_pool import ClickHousePool
+from .local_profiler import LocalProfiler, LOCAL_DATABASE
+from .clickhouse_service import clickhouse_service
+from .sql_utils import quote_identifier, quote_string
+from .string_patterns import STRING_PATTERNS, significant_patterns, sql_pattern_aggregates
+
+# Режимы профилирования: fast - скетчи (HLL, t-digest, approx_top_k), exact - точные агрегаты
+PROFILE_MODES = ('fast', 'exact')
+
+# Агрегатные функции для каждого режима
+MODE_FUNCTIONS = {
+    'fast': {'uniq': 'uniqCombined', 'quantiles': 'quantilesTDigest'},
+    'exact': {'uniq': 'uniqExact', 'quantiles': 'quantilesExact'},
+}
+
+# Оценки погрешности скетчей (относительная стандартная ошибка uniqCombined(17)
+# и ошибка ранга квантилей t-digest), в процентах
+UNIQ_RELATIVE_ERROR = 0.29
+QUANTILE_RANK_ERROR = 1.0
+
+# Агрегатные функции для матрицы корреляций
+CORRELATION_FUNCTIONS = {
+    'pearson': 'corr',
+    'spearman': 'rankCorr',
+}
+
+# Шкалы бинов гистограммы: равные интервалы, логарифмическая (для скошенных
+# распределений) и по квантилям (в каждом бине примерно одинаковое число значений)
+DISTRIBUTION_SCALES = ('linear', 'log', 'quantile')
+
+# Число бинов гистограмм, которые считаются вместе с профилем
+PROFILE_DISTRIBUTION_BINS = 20
+
+# Допустимый идентификатор партиции (partition_id из system.parts, например 202507)
+PARTITION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Параллельное профилирование: размер пула клиентов и таймаут одного запроса (сек)
+PROFILE_CONCURRENCY = 4
+PROFILE_QUERY_TIMEOUT = 120
+
+# Параметры подключения к ClickHouse (HTTP интерфейс)
+CONNECTION_PARAMS = {
+    'host': 'localhost',
+    'port': 8123,
+    'username': 'default',
+    'password': '',
+    'database': 'datagate'
+}
 
 
 class DataProfilerService:
@@ -14,157 +71,714 @@ class DataProfilerService:
 
     def __init__(self):
         self.client: Optional[Client] = None
+        self.cache = ProfileCache()
+        self.incremental = IncrementalProfiler(self)
+        self.local = LocalProfiler(self)
+        # Метаданные таблиц и колонок читаются из общего кэша каталога
+        self.catalog = clickhouse_service.catalog
+        self.pool = ClickHousePool(max_size=PROFILE_CONCURRENCY, query_timeout=PROFILE_QUERY_TIMEOUT,
+                                   **CONNECTION_PARAMS)
+        self._executor = ThreadPoolExecutor(max_workers=PROFILE_CONCURRENCY, thread_name_prefix='profiler')
         self._connect()
 
     def _connect(self):
         """Подключение к ClickHouse"""
         try:
             # Используем подключение без пароля для пользователя default
-            self.client = clickhouse_connect.get_client(
-                host='localhost',
-                port=8123,
-                username='default',
-                password='',
-                database='datagate'
-            )
+            self.client = clickhouse_connect.get_client(**CONNECTION_PARAMS)
         except Exception as e:
             print(f"Ошибка подключения к ClickHouse: {e}")
 
-    def get_tables_list(self) -> List[Dict[str, str]]:
-        """Получить список всех таблиц в базе"""
-        query = """
-        SELECT 
-            database,
-            name as table_name,
-            total_rows,
-            total_bytes,
-            formatReadableSize(total_bytes) as size_readable
-        FROM system.tables
-        WHERE database NOT IN ('system', 'information_schema', 'INFORMATION_SCHEMA')
-        ORDER BY database, name
+    def _query_arrow(self, query: str) -> pa.Table:
+        """Выполнить запрос и получить результат в колоночном виде (Arrow)
+
+        В отличие от result_rows, данные не превращаются в построчные кортежи Python.
+        """
+        return self.client.query_arrow(query, use_strings=True)
+
+    def _value_counts_from_arrow(self, table: pa.Table) -> Tuple[List[str], np.ndarray]:
+        """Значения (NULL как строка 'NULL') и их количества из результата GROUP BY"""
+        values = pc.fill_null(table.column('value'), 'NULL').to_pylist()
+        counts = table.column('count').to_numpy()
+        return values, counts
+
+    def _bound_to(self, client: Client) -> 'DataProfilerService':
+        """Копия сервиса, выполняющая запросы через указанного клиента"""
+        bound = copy.copy(self)
+        bound.client = client
+        return bound
+
+    def _run_pooled(self, task: Callable[['DataProfilerService'], Any], deadline: Optional[float] = None,
+                    cancelled: Optional[threading.Event] = None) -> Any:
+        """Выполнить задачу на клиенте из пула (вызывается в рабочем потоке)
+
+        deadline - момент time.monotonic(), после которого результат уже не нужен:
+        ожидание свободного клиента ограничено оставшимся временем, а каждый запрос
+        задачи - им же на сервере (max_execution_time). Отмена ожидания на стороне
+        asyncio запрос не останавливает, а так он прерывается самим ClickHouse и клиент
+        возвращается в пул. Задача, отмененная (cancelled) или просроченная до получения
+        клиента, не выполняется.
         """
+        if deadline is None:
+            with self.pool.client() as client:
+                return task(self._bound_to(client))
+
+        try:
+            client = self.pool.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError("Нет свободного клиента ClickHouse до истечения таймаута")
+        try:
+            remaining = deadline - time.monotonic()
+            if (cancelled is not None and cancelled.is_set()) or remaining <= 0:
+                raise TimeoutError("Задача отменена до начала выполнения")
+            client.set_client_setting('max_execution_time', math.ceil(remaining))
+            try:
+                return task(self._bound_to(client))
+            finally:
+                client.set_client_setting('max_execution_time', self.pool.query_timeout)
+        finally:
+            self.pool.release(client)
+
+    def get_tables_list(self) -> List[Dict[str, str]]:
+        """Получить список всех таблиц в базе и загруженных файлов (база LOCAL_DATABASE)"""
+        try:
+            local_datasets = self.local.list_datasets()
+        except Exception as e:
+            print(f"Ошибка получения списка файлов: {e}")
+            local_datasets = []
+        return self._get_clickhouse_tables() + local_datasets
+
+    def _get_clickhouse_tables(self) -> List[Dict[str, str]]:
+        """Получить список всех таблиц в ClickHouse (из кэша каталога)"""
         try:
-            result = self.client.query(query)
             return [
-                {
-                    'database': row[0],
-                    'table_name': row[1],
-                    'total_rows': row[2],
-                    'total_bytes': row[3],
-                    'size_readable': row[4]
-                }
-                for row in result.result_rows
+                {key: table[key] for key in ('database', 'table_name', 'total_rows', 'total_bytes', 'size_readable')}
+                for table in self.catalog.tables()
             ]
         except Exception as e:
             print(f"Ошибка получения списка таблиц: {e}")
             return []
 
-    def profile_table(self, database: str, table_name: str, sample_size: int = 10000) -> Dict[str, Any]:
-        """Полное профилирование таблицы"""
+    def profile_table(self, database: str, table_name: str, sample_size: int = 10000,
+                      fused: bool = True, mode: str = 'fast', use_cache: bool = True,
+                      correlation_method: str = 'pearson', partitions: Optional[List[str]] = None,
+                      time_range: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+        """Полное профилирование таблицы
+
+        При fused=True все агрегаты по колонкам считаются одним запросом
+        за один проход по таблице, иначе - отдельными запросами на колонку.
+        Статистика считается на выборке из ~sample_size строк (см. _get_sampling_plan).
+        mode='fast' использует приближенные агрегаты с оценкой погрешности,
+        mode='exact' - точные (uniqExact, quantilesExact, GROUP BY для топа значений).
+        При use_cache=True результат берется из кэша, если куски таблицы не менялись.
+        correlation_method: 'pearson' или 'spearman' для матрицы корреляций.
+        partitions (список partition_id) или time_range (начало, конец) ограничивают
+        профиль частью таблицы, см. _get_partition_filter.
+        Для database=LOCAL_DATABASE профилируется загруженный файл (см. LocalProfiler).
+        """
+        if mode not in PROFILE_MODES:
+            return {'error': f"Неизвестный режим профилирования: {mode}"}
+
+        if database == LOCAL_DATABASE:
+            try:
+                return self.local.profile(table_name, sample_size, mode, correlation_method)
+            except Exception as e:
+                print(f"Ошибка профилирования файла: {e}")
+                return {'error': str(e)}
+
+        cache_key, fingerprint = None, None
+        if use_cache:
+            cache_key, fingerprint, cached = self._cache_lookup(
+                database, table_name, sample_size=sample_size, fused=fused, mode=mode,
+                correlation_method=correlation_method, partitions=partitions, time_range=time_range)
+            if cached is not None:
+                return cached
+
         try:
             # Получаем информацию о структуре таблицы
             table_info = self._get_table_structure(database, table_name)
 
+            # Фильтр по партициям: попадает во все запросы к таблице
+            partition_filter = self._get_partition_filter(database, table_name, partitions, time_range)
+
             # Получаем общую статистику
-            general_stats = self._get_general_stats(database, table_name)
+            general_stats = self._get_general_stats(database, table_name, partition_filter)
+
+            # Выбираем способ сэмплирования
+            sampling = self._get_sampling_plan(database, table_name, general_stats['row_count'], sample_size,
+                                               partition_filter['where'] if partition_filter else None)
+            source = sampling.pop('source')
 
             # Получаем детальную статистику по колонкам
-            column_stats = self._get_column_stats(database, table_name, sample_size)
+            if fused:
+                column_stats = self._get_column_stats_fused(source, table_info['columns'], sample_size, mode)
+            else:
+                column_stats = self._get_column_stats(database, table_name, source, sample_size, mode)
+
+            if sampling['method'] != 'full':
+                sampling['sample_rows'] = self._add_confidence_intervals(source, column_stats)
+                sampling['max_null_margin'] = max(
+                    (col.get('null_percentage_margin', 0) for col in column_stats), default=0)
 
             # Определяем типы данных и паттерны
-            data_patterns = self._analyze_data_patterns(database, table_name, sample_size)
+            data_patterns = self._analyze_data_patterns(source, table_info['columns'], correlation_method)
+
+            result = {
+                'table_info': table_info,
+                'general_stats': general_stats,
+                'column_stats': column_stats,
+                'data_patterns': data_patterns,
+                'distributions': self._get_distributions(source, column_stats),
+                'sampling': sampling,
+                'mode': mode,
+                'profiled_at': datetime.now().isoformat()
+            }
+        except Exception as e:
+            print(f"Ошибка профилирования таблицы: {e}")
+            return {'error': str(e)}
 
+        if fingerprint and self._is_complete(result):
+            self.cache.put(cache_key, fingerprint, result)
+        return result
+
+    async def profile_table_stream(self, database: str, table_name: str, sample_size: int = 10000,
+                                   mode: str = 'fast', correlation_method: str = 'pearson',
+                                   partitions: Optional[List[str]] = None,
+                                   time_range: Optional[Tuple[str, str]] = None,
+                                   concurrency: int = PROFILE_CONCURRENCY,
+                                   query_timeout: float = PROFILE_QUERY_TIMEOUT) -> AsyncIterator[Dict[str, Any]]:
+        """Асинхронное профилирование с параллельными запросами по колонкам
+
+        Запросы выполняются в пуле потоков на отдельных клиентах (не больше concurrency
+        одновременно), каждый ограничен query_timeout. События отдаются по мере готовности:
+        - {'stage': 'table', 'table_info', 'general_stats', 'sampling'}
+        - {'stage': 'column', 'stats'} - для каждой колонки в порядке завершения
+        - {'stage': 'done', 'result'} - итоговый результат в формате profile_table
+        - {'stage': 'error', 'error'}
+        """
+        if mode not in PROFILE_MODES:
+            yield {'stage': 'error', 'error': f"Неизвестный режим профилирования: {mode}"}
+            return
+
+        if database == LOCAL_DATABASE:
+            # Файл профилируется целиком в памяти, промежуточных событий нет
+            result = await asyncio.to_thread(self.profile_table, database, table_name, sample_size,
+                                             mode=mode, correlation_method=correlation_method)
+            if 'error' in result:
+                yield {'stage': 'error', 'error': result['error']}
+            else:
+                yield {'stage': 'done', 'result': result}
+            return
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, self.pool.max_size)))
+
+        async def run(task: Callable[['DataProfilerService'], Any]) -> Any:
+            async with semaphore:
+                cancelled = threading.Event()
+                future = loop.run_in_executor(self._executor, self._run_pooled, task,
+                                              time.monotonic() + query_timeout, cancelled)
+                try:
+                    return await asyncio.wait_for(future, query_timeout)
+                except BaseException:
+                    # Задача, еще ждущая клиента из пула, не будет выполнена
+                    cancelled.set()
+                    raise
+
+        async def run_column(column: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return await run(lambda svc: svc._get_column_stats_fused(source, [column], sample_size, mode)[0])
+            except asyncio.TimeoutError:
+                error = f"Превышен таймаут запроса ({query_timeout} с)"
+            except Exception as e:
+                error = str(e)
             return {
+                'column_name': column['name'],
+                'data_type': column['type'],
+                'inferred_type': self._infer_data_type(column['type']),
+                'error': error
+            }
+
+        try:
+            cache_key, fingerprint, cached = await run(
+                lambda svc: svc._cache_lookup(database, table_name, sample_size=sample_size, fused=True, mode=mode,
+                                              correlation_method=correlation_method, partitions=partitions,
+                                              time_range=time_range))
+            if cached is not None:
+                yield {'stage': 'done', 'result': cached}
+                return
+
+            partition_filter = await run(
+                lambda svc: svc._get_partition_filter(database, table_name, partitions, time_range))
+            where = partition_filter['where'] if partition_filter else None
+            table_info, general_stats = await asyncio.gather(
+                run(lambda svc: svc._get_table_structure(database, table_name)),
+                run(lambda svc: svc._get_general_stats(database, table_name, partition_filter))
+            )
+            sampling = await run(
+                lambda svc: svc._get_sampling_plan(database, table_name, general_stats['row_count'], sample_size,
+                                                   where))
+            source = sampling.pop('source')
+
+            yield {'stage': 'table', 'table_info': table_info, 'general_stats': general_stats, 'sampling': sampling}
+
+            patterns_task = asyncio.ensure_future(
+                run(lambda svc: svc._analyze_data_patterns(source, table_info['columns'], correlation_method)))
+            column_stats = []
+            for next_column in asyncio.as_completed([run_column(column) for column in table_info['columns']]):
+                stats = await next_column
+                column_stats.append(stats)
+                yield {'stage': 'column', 'stats': stats}
+
+            order = {column['name']: i for i, column in enumerate(table_info['columns'])}
+            column_stats.sort(key=lambda col: order[col['column_name']])
+
+            if sampling['method'] != 'full':
+                sampling['sample_rows'] = await run(lambda svc: svc._add_confidence_intervals(source, column_stats))
+                sampling['max_null_margin'] = max(
+                    (col.get('null_percentage_margin', 0) for col in column_stats), default=0)
+
+            try:
+                data_patterns = await patterns_task
+            except Exception as e:
+                data_patterns = {'error': str(e)}
+
+            distributions = await run(lambda svc: svc._get_distributions(source, column_stats))
+
+            result = {
                 'table_info': table_info,
                 'general_stats': general_stats,
                 'column_stats': column_stats,
                 'data_patterns': data_patterns,
+                'distributions': distributions,
+                'sampling': sampling,
+                'mode': mode,
                 'profiled_at': datetime.now().isoformat()
             }
+            if fingerprint and self._is_complete(result):
+                self.cache.put(cache_key, fingerprint, result)
+
+            yield {'stage': 'done', 'result': result}
         except Exception as e:
             print(f"Ошибка профилирования таблицы: {e}")
+            yield {'stage': 'error', 'error': str(e)}
+
+    def profile_table_incremental(self, database: str, table_name: str) -> Dict[str, Any]:
+        """Профилирование append-only таблицы по кускам, добавленным с прошлого запуска
+
+        Статистика приближенная (скетчи), паттерны строк и корреляции не считаются.
+        """
+        if database == LOCAL_DATABASE:
+            return {'error': "Инкрементальное профилирование доступно только для таблиц ClickHouse"}
+        try:
+            return self.incremental.profile(database, table_name)
+        except Exception as e:
+            print(f"Ошибка инкрементального профилирования: {e}")
             return {'error': str(e)}
 
-    def _get_table_structure(self, database: str, table_name: str) -> Dict[str, Any]:
-        """Получить структуру таблицы"""
+    @staticmethod
+    def _is_complete(result: Dict[str, Any]) -> bool:
+        """Посчитаны ли все колонки (профили с ошибками по колонкам не кэшируются)"""
+        return not any('error' in stats for stats in result.get('column_stats', []))
+
+    def _cache_lookup(self, database: str, table_name: str, **params: Any) -> Tuple[
+        str, Optional[str], Optional[Dict[str, Any]]]:
+        """Ключ кэша, отпечаток кусков таблицы и закэшированный результат (если есть)"""
+        cache_key = self.cache.make_key(database, table_name, **params)
+        fingerprint = self._get_parts_fingerprint(database, table_name)
+        cached = self.cache.get(cache_key, fingerprint) if fingerprint else None
+        if cached is not None:
+            cached['from_cache'] = True
+        return cache_key, fingerprint, cached
+
+    def _get_parts_fingerprint(self, database: str, table_name: str) -> Optional[str]:
+        """Отпечаток активных кусков таблицы (имена, число строк, время изменения)
+
+        В отпечаток входит и время изменения метаданных таблицы: ALTER с добавлением,
+        удалением или сменой типа колонки не трогает куски, но меняет профиль.
+        Для таблиц без кусков (не MergeTree) возвращает None - такие результаты не кэшируются.
+        """
+        database_literal, table_literal = quote_string(database), quote_string(table_name)
         query = f"""
         SELECT 
-            name,
-            type,
-            default_type,
-            default_expression,
-            comment
-        FROM system.columns
-        WHERE database = '{database}' AND table = '{table_name}'
-        ORDER BY position
+            count() as parts_count,
+            sum(rows) as total_rows,
+            toUnixTimestamp(max(modification_time)) as last_modified,
+            cityHash64(arrayStringConcat(arraySort(groupArray(name)), ',')) as names_hash,
+            (
+                SELECT toUnixTimestamp(metadata_modification_time)
+                FROM system.tables
+                WHERE database = {database_literal} AND name = {table_literal}
+            ) as metadata_modified
+        FROM system.parts
+        WHERE database = {database_literal} AND table = {table_literal} AND active
+        """
+        try:
+            parts_count, total_rows, last_modified, names_hash, metadata_modified = \
+                self.client.query(query).result_rows[0]
+        except Exception as e:
+            print(f"Ошибка получения кусков таблицы: {e}")
+            return None
+
+        if parts_count == 0:
+            return None
+        return f"{parts_count}:{total_rows}:{last_modified}:{names_hash}:{metadata_modified}"
+
+    def _get_sampling_plan(self, database: str, table_name: str, row_count: int, sample_size: int,
+                           where: Optional[str] = None) -> Dict[str, Any]:
+        """Выбрать источник данных для статистики: вся таблица или случайная выборка
+
+        - full: таблица не больше sample_size строк, считаем по всем данным;
+        - sample_clause: у таблицы есть ключ сэмплирования, используем SAMPLE
+          (читается только доля данных);
+        - hash: детерминированная выборка по хэшу положения строки (_part, _part_offset).
+          Виртуальные колонки никогда не NULL и не читаются с диска; хэш ключа
+          сортировки дает выборку целыми группами строк с одинаковым ключом,
+          а cityHash64(*) равен NULL для строк с NULL и читает все колонки.
+        where (фильтр партиций) добавляется в запрос источника, row_count - число строк после него.
         """
-        result = self.client.query(query)
+        table = f"{database}.{table_name}"
+        filter_sql = f" WHERE {where}" if where else ""
+        if not sample_size or row_count <= sample_size:
+            source = f"(SELECT * FROM {table}{filter_sql})" if where else table
+            return {'method': 'full', 'source': source, 'fraction': 1.0, 'sample_rows': row_count}
+
+        fraction = sample_size / row_count
+        table_meta = self.catalog.table(database, table_name) or {}
+        sampling_key = table_meta.get('sampling_key', '')
+
+        if sampling_key:
+            return {
+                'method': 'sample_clause',
+                'source': f"(SELECT * FROM {table} SAMPLE {fraction:.10f}{filter_sql})",
+                'fraction': fraction,
+                'sample_rows': sample_size
+            }
 
+        threshold = max(1, int(fraction * 1000000))
         return {
-            'columns': [
-                {
-                    'name': row[0],
-                    'type': row[1],
-                    'default_type': row[2],
-                    'default_expression': row[3],
-                    'comment': row[4]
-                }
-                for row in result.result_rows
-            ]
+            'method': 'hash',
+            'source': f"(SELECT * FROM {table} WHERE cityHash64(_part, _part_offset) % 1000000 < {threshold}"
+                      f"{f' AND {where}' if where else ''})",
+            'fraction': fraction,
+            'sample_rows': sample_size
         }
 
-    def _get_general_stats(self, database: str, table_name: str) -> Dict[str, Any]:
-        """Получить общую статистику по таблице"""
-        # Количество строк
+    def _add_confidence_intervals(self, source: str, column_stats: List[Dict[str, Any]],
+                                  z: float = 1.96) -> int:
+        """Добавить 95% доверительные интервалы к статистикам, посчитанным на выборке
+
+        Возвращает фактический размер выборки.
+        """
+        sample_rows = self.client.query(f"SELECT count() FROM {source}").result_rows[0][0]
+        self._confidence_margins(column_stats, sample_rows, z)
+        return sample_rows
+
+    def _confidence_margins(self, column_stats: List[Dict[str, Any]], sample_rows: int, z: float = 1.96):
+        """Полуширина доверительных интервалов для NULL % и среднего по размеру выборки"""
+        if sample_rows == 0:
+            return
+
+        for stats in column_stats:
+            p = stats.get('null_percentage', 0) / 100
+            stats['null_percentage_margin'] = round(z * np.sqrt(p * (1 - p) / sample_rows) * 100, 2)
+
+            non_null = sample_rows - stats.get('null_count', 0)
+            if stats.get('std_dev') is not None and non_null > 0:
+                stats['mean_margin'] = round(z * stats['std_dev'] / np.sqrt(non_null), 4)
+
+    def _get_table_structure(self, database: str, table_name: str) -> Dict[str, Any]:
+        """Получить структуру таблицы"""
+        return {'columns': self.catalog.columns(database, table_name)}
+
+    def _get_general_stats(self, database: str, table_name: str,
+                           partition_filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Получить общую статистику по таблице (или по выбранным партициям)"""
+        # Количество строк (с фильтром MergeTree читает только подходящие партиции)
         count_query = f"SELECT count() FROM {database}.{table_name}"
+        if partition_filter:
+            count_query += f" WHERE {partition_filter['where']}"
         row_count = self.client.query(count_query).result_rows[0][0]
 
         # Размер таблицы
+        parts_condition = partition_filter['parts_condition'] if partition_filter else '1'
         size_query = f"""
         SELECT 
             sum(bytes_on_disk) as total_bytes,
             formatReadableSize(sum(bytes_on_disk)) as size_readable
         FROM system.parts
-        WHERE database = '{database}' AND table = '{table_name}' AND active
+        WHERE database = '{database}' AND table = '{table_name}' AND active AND {parts_condition}
         """
         size_result = self.client.query(size_query).result_rows[0]
 
         # Количество колонок
-        columns_query = f"""
-        SELECT count() 
-        FROM system.columns 
-        WHERE database = '{database}' AND table = '{table_name}'
-        """
-        column_count = self.client.query(columns_query).result_rows[0][0]
+        column_count = len(self.catalog.columns(database, table_name))
 
-        return {
+        stats = {
             'row_count': row_count,
             'column_count': column_count,
             'total_bytes': size_result[0] if size_result[0] else 0,
             'size_readable': size_result[1] if size_result[1] else '0 B'
         }
+        if partition_filter:
+            stats['partition_filter'] = partition_filter['description']
+            stats['partitions'] = self._get_partition_stats(database, table_name, parts_condition)
+        return stats
+
+    def _get_partition_filter(self, database: str, table_name: str, partitions: Optional[List[str]] = None,
+                              time_range: Optional[Tuple[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """Фильтр профилирования по партициям
+
+        partitions - список partition_id (как в system.parts, например '202507'),
+        фильтруется по виртуальной колонке _partition_id. time_range - полуинтервал
+        [начало, конец) по дате/времени из ключа партиционирования таблицы
+        (PARTITION BY toYYYYMM(event_date) -> event_date). В обоих случаях MergeTree
+        отбрасывает лишние партиции, не читая их. Возвращает where для запросов
+        к таблице, parts_condition для system.parts и описание фильтра.
+        """
+        if not partitions and not time_range:
+            return None
+
+        table_meta = self.catalog.table(database, table_name) or {}
+        partition_key = table_meta.get('partition_key', '')
+        if not partition_key:
+            raise ValueError(f"Таблица {database}.{table_name} не партиционирована")
+
+        if partitions:
+            invalid = [partition for partition in partitions if not PARTITION_ID_PATTERN.match(partition)]
+            if invalid:
+                raise ValueError(f"Неверные идентификаторы партиций: {', '.join(invalid)}")
+            id_list = ', '.join(f"'{partition}'" for partition in partitions)
+            return {
+                'where': f"_partition_id IN ({id_list})",
+                'parts_condition': f"partition_id IN ({id_list})",
+                'description': f"партиции {', '.join(partitions)}"
+            }
+
+        date_columns = [
+            column for column in table_meta.get('columns', [])
+            if self._is_date_type(column['type']) and re.search(rf"\b{re.escape(column['name'])}\b", partition_key)
+        ]
+        if not date_columns:
+            raise ValueError(f"В ключе партиционирования {partition_key} нет колонки даты/времени")
+
+        column = date_columns[0]
+        start, end = (datetime.fromisoformat(str(bound)) for bound in time_range)
+        if start >= end:
+            raise ValueError("Начало интервала должно быть раньше конца")
+        if 'DateTime' in column['type']:
+            start_sql, end_sql = f"{start:%Y-%m-%d %H:%M:%S}", f"{end:%Y-%m-%d %H:%M:%S}"
+            # min_time/max_time в system.parts заполнены для ключа DateTime
+            parts_condition = f"max_time >= toDateTime('{start_sql}') AND min_time < toDateTime('{end_sql}')"
+        else:
+            # Для Date конец интервала округляется вверх до целого дня
+            end_date = end.date() if end == datetime.combine(end.date(), datetime.min.time()) \
+                else end.date() + timedelta(days=1)
+            start_sql, end_sql = f"{start:%Y-%m-%d}", f"{end_date:%Y-%m-%d}"
+            parts_condition = f"max_date >= toDate('{start_sql}') AND min_date < toDate('{end_sql}')"
+        name = quote_identifier(column['name'])
+        return {
+            'where': f"{name} >= '{start_sql}' AND {name} < '{end_sql}'",
+            'parts_condition': parts_condition,
+            'description': f"{column['name']} с {start_sql} по {end_sql}"
+        }
 
-    def _get_column_stats(self, database: str, table_name: str, sample_size: int) -> List[Dict[str, Any]]:
+    def _get_partition_stats(self, database: str, table_name: str, parts_condition: str) -> List[Dict[str, Any]]:
+        """Число строк и размер по партициям из system.parts (без чтения данных)"""
+        query = f"""
+        SELECT 
+            partition,
+            partition_id,
+            sum(rows) as rows,
+            formatReadableSize(sum(bytes_on_disk)) as size_readable,
+            count() as parts
+        FROM system.parts
+        WHERE database = '{database}' AND table = '{table_name}' AND active AND {parts_condition}
+        GROUP BY partition, partition_id
+        ORDER BY partition_id
+        """
+        return [
+            {'partition': row[0], 'partition_id': row[1], 'rows': row[2], 'size_readable': row[3], 'parts': row[4]}
+            for row in self.client.query(query).result_rows
+        ]
+
+    def _get_column_stats(self, database: str, table_name: str, source: str, sample_size: int,
+                          mode: str = 'exact') -> List[Dict[str, Any]]:
         """Получить статистику по каждой колонке"""
-        # Получаем список колонок
-        columns_query = f"""
-        SELECT name, type 
-        FROM system.columns 
-        WHERE database = '{database}' AND table = '{table_name}'
-        ORDER BY position
+        column_stats = []
+        for column in self.catalog.columns(database, table_name):
+            stats = self._analyze_column(source, column['name'], column['type'], sample_size, mode)
+            column_stats.append(stats)
+
+        return column_stats
+
+    def _get_column_stats_fused(self, source: str, columns: List[Dict[str, Any]],
+                                sample_size: int, mode: str = 'exact') -> List[Dict[str, Any]]:
+        """Статистика по всем колонкам одним запросом (один проход по таблице)
+
+        Если совмещенный запрос падает (например, агрегат не поддерживает тип
+        одной из колонок), колонки считаются по отдельности через _analyze_column,
+        и ошибка попадает только в статистику проблемных колонок.
+        """
+        specs = [
+            (column['name'], column['type'], self._column_aggregates(column['name'], column['type'], mode))
+            for column in columns
+        ]
+        expressions = ['count()'] + [expr for _, _, aggregates in specs for _, expr in aggregates]
+        query = f"""
+        SELECT 
+            {', '.join(expressions)}
+        FROM {source}
         """
-        columns = self.client.query(columns_query).result_rows
+        try:
+            row = self.client.query(query).result_rows[0]
+        except Exception as e:
+            print(f"Ошибка совмещенного запроса, статистика считается по колонкам: {e}")
+            return [
+                self._analyze_column(source, column['name'], column['type'], sample_size, mode)
+                for column in columns
+            ]
+        total_count = row[0]
 
         column_stats = []
-        for col_name, col_type in columns:
-            stats = self._analyze_column(database, table_name, col_name, col_type, sample_size)
+        position = 1
+        for col_name, col_type, aggregates in specs:
+            values = dict(zip([key for key, _ in aggregates], row[position:position + len(aggregates)]))
+            position += len(aggregates)
+
+            stats = self._unpack_column_aggregates(col_name, col_type, values, total_count, mode)
+            try:
+                if 'top_values' not in stats:
+                    stats['top_values'] = self._get_top_values(source, col_name, 10)
+            except Exception as e:
+                stats['error'] = str(e)
             column_stats.append(stats)
 
         return column_stats
 
-    def _analyze_column(self, database: str, table_name: str, col_name: str, col_type: str, sample_size: int) -> Dict[
-        str, Any]:
+    def _column_aggregates(self, col_name: str, col_type: str, mode: str = 'exact') -> List[Tuple[str, str]]:
+        """Агрегаты колонки для совмещенного запроса: (ключ, выражение)"""
+        column = quote_identifier(col_name)
+        functions = MODE_FUNCTIONS[mode]
+        aggregates = [
+            ('null_count', f"countIf(isNull({column}))"),
+            ('non_null_count', f"count({column})"),
+            ('unique_count', f"{functions['uniq']}({column})"),
+        ]
+        if mode == 'fast':
+            # Топ значений скетчем в том же проходе вместо отдельного GROUP BY
+            aggregates.append(('top_values', f"approx_top_k(10)(toString({column}))"))
+
+        if self._is_numeric_type(col_type):
+            # quantilesTDigest и дисперсии не принимают Decimal - считаем по Float64
+            number = f"toFloat64({column})"
+            aggregates += [
+                ('min', f"min({column})"),
+                ('max', f"max({column})"),
+                ('mean', f"avg({column})"),
+                ('quartiles', f"{functions['quantiles']}(0.25, 0.5, 0.75)({number})"),
+                ('std_dev', f"stddevPop({number})"),
+                ('variance', f"varPop({number})"),
+            ]
+        elif self._is_string_type(col_type):
+            aggregates += [
+                ('min_length', f"min(length({column}))"),
+                ('max_length', f"max(length({column}))"),
+                ('avg_length', f"avg(length({column}))"),
+            ]
+            if self._has_string_patterns(col_type):
+                aggregates += [
+                    (f"pattern_{pattern['name']}", expr)
+                    for pattern, expr in zip(STRING_PATTERNS, sql_pattern_aggregates(column))
+                ]
+        elif self._is_date_type(col_type):
+            aggregates += [
+                ('min_date', f"min({column})"),
+                ('max_date', f"max({column})"),
+                ('range_days', f"dateDiff('day', min({column}), max({column}))"),
+            ]
+
+        return aggregates
+
+    def _unpack_column_aggregates(self, col_name: str, col_type: str, values: Dict[str, Any],
+                                  total_count: int, mode: str = 'exact') -> Dict[str, Any]:
+        """Разбор результата совмещенного запроса в формат column_stats"""
+        stats = {
+            'column_name': col_name,
+            'data_type': col_type,
+            'inferred_type': self._infer_data_type(col_type),
+            'null_count': values['null_count'],
+            'null_percentage': round((values['null_count'] / total_count * 100) if total_count > 0 else 0, 2),
+            'unique_count': values['unique_count'],
+            'unique_percentage': round(
+                (values['unique_count'] / values['non_null_count'] * 100) if values['non_null_count'] > 0 else 0, 2),
+        }
+
+        if self._is_numeric_type(col_type):
+            quartiles = values['quartiles'] or [None, None, None]
+            for key, value in (('min', values['min']), ('max', values['max']), ('mean', values['mean']),
+                               ('median', quartiles[1]), ('q1', quartiles[0]), ('q3', quartiles[2]),
+                               ('std_dev', values['std_dev']), ('variance', values['variance'])):
+                stats[key] = float(value) if value is not None else None
+        elif self._is_string_type(col_type):
+            stats['min_length'] = int(values['min_length']) if values['min_length'] is not None else None
+            stats['max_length'] = int(values['max_length']) if values['max_length'] is not None else None
+            stats['avg_length'] = float(values['avg_length']) if values['avg_length'] is not None else None
+            if self._has_string_patterns(col_type):
+                stats['patterns'] = significant_patterns(
+                    {pattern['name']: values[f"pattern_{pattern['name']}"] for pattern in STRING_PATTERNS},
+                    values['non_null_count']
+                )
+        elif self._is_date_type(col_type):
+            stats['min_date'] = str(values['min_date']) if values['min_date'] else None
+            stats['max_date'] = str(values['max_date']) if values['max_date'] else None
+            stats['range_days'] = int(values['range_days']) if values['range_days'] is not None else None
+
+        if mode == 'fast':
+            stats['top_values'] = self._unpack_approx_top_values(values['top_values'], total_count,
+                                                                 values['null_count'])
+            stats.update(self._approximation_error_bounds(stats))
+
+        return stats
+
+    def _unpack_approx_top_values(self, top_values: List[Tuple[Any, int, int]], total_count: int,
+                                  null_count: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """Разбор результата approx_top_k: (значение, оценка count, погрешность)
+
+        approx_top_k пропускает NULL, поэтому NULL добавляется отдельным значением
+        по точному null_count - как в точном режиме, где NULL попадает в GROUP BY.
+        """
+        entries = [(str(value) if value is not None else 'NULL', count, error)
+                   for value, count, error in top_values or []]
+        if null_count:
+            entries.append(('NULL', null_count, 0))
+            entries.sort(key=lambda entry: entry[1], reverse=True)
+        return [
+            {
+                'value': value,
+                'count': count,
+                'percentage': round(count * 100.0 / total_count, 2) if total_count > 0 else 0,
+                'error': error
+            }
+            for value, count, error in entries[:limit]
+        ]
+
+    def _approximation_error_bounds(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Погрешности приближенных статистик колонки"""
+        bounds = {
+            'unique_count': int(round(stats.get('unique_count', 0) * UNIQ_RELATIVE_ERROR / 100)),
+        }
+        if 'median' in stats:
+            bounds['quantile_rank_percent'] = QUANTILE_RANK_ERROR
+        if stats.get('top_values'):
+            bounds['top_values_count'] = max(value['error'] for value in stats['top_values'])
+
+        return {'approximate': True, 'error_bounds': bounds}
+
+    def _analyze_column(self, source: str, col_name: str, col_type: str, sample_size: int,
+                        mode: str = 'exact') -> Dict[str, Any]:
         """Анализ отдельной колонки"""
+        column = quote_identifier(col_name)
         stats = {
             'column_name': col_name,
             'data_type': col_type,
@@ -176,9 +790,9 @@ class DataProfilerService:
             # NULL значения
             null_query = f"""
             SELECT 
-                countIf(isNull({col_name})) as null_count,
+                countIf(isNull({column})) as null_count,
                 count() as total_count
-            FROM {database}.{table_name}
+            FROM {source}
             """
             null_result = self.client.query(null_query).result_rows[0]
             stats['null_count'] = null_result[0]
@@ -187,10 +801,10 @@ class DataProfilerService:
             # Уникальные значения
             unique_query = f"""
             SELECT 
-                uniqExact({col_name}) as unique_count,
+                {MODE_FUNCTIONS[mode]['uniq']}({column}) as unique_count,
                 count() as total_count
-            FROM {database}.{table_name}
-            WHERE {col_name} IS NOT NULL
+            FROM {source}
+            WHERE {column} IS NOT NULL
             """
             unique_result = self.client.query(unique_query).result_rows[0]
             stats['unique_count'] = unique_result[0]
@@ -199,23 +813,26 @@ class DataProfilerService:
 
             # Для числовых типов
             if self._is_numeric_type(col_type):
-                numeric_stats = self._get_numeric_stats(database, table_name, col_name)
+                numeric_stats = self._get_numeric_stats(source, col_name, mode)
                 stats.update(numeric_stats)
 
             # Для строковых типов
             elif self._is_string_type(col_type):
-                string_stats = self._get_string_stats(database, table_name, col_name, sample_size)
+                string_stats = self._get_string_stats(source, col_name, col_type)
                 stats.update(string_stats)
 
             # Для дат
             elif self._is_date_type(col_type):
-                date_stats = self._get_date_stats(database, table_name, col_name)
+                date_stats = self._get_date_stats(source, col_name)
                 stats.update(date_stats)
 
             # Топ значения
-            top_values = self._get_top_values(database, table_name, col_name, 10)
+            top_values = self._get_top_values(source, col_name, 10, mode)
             stats['top_values'] = top_values
 
+            if mode == 'fast':
+                stats.update(self._approximation_error_bounds(stats))
+
         except Exception as e:
             stats['error'] = str(e)
 
@@ -230,6 +847,10 @@ class DataProfilerService:
         """Проверка, является ли тип строковым"""
         return 'String' in col_type or 'FixedString' in col_type
 
+    def _has_string_patterns(self, col_type: str) -> bool:
+        """Можно ли искать паттерны в значениях колонки (строки, но не массивы строк)"""
+        return self._is_string_type(col_type) and 'Array' not in col_type
+
     def _is_date_type(self, col_type: str) -> bool:
         """Проверка, является ли тип датой"""
         return 'Date' in col_type
@@ -249,75 +870,79 @@ class DataProfilerService:
         else:
             return 'other'
 
-    def _get_numeric_stats(self, database: str, table_name: str, col_name: str) -> Dict[str, Any]:
+    def _get_numeric_stats(self, source: str, col_name: str, mode: str = 'exact') -> Dict[str, Any]:
         """Статистика для числовых колонок"""
+        column = quote_identifier(col_name)
         query = f"""
         SELECT 
-            min({col_name}) as min_val,
-            max({col_name}) as max_val,
-            avg({col_name}) as avg_val,
-            median({col_name}) as median_val,
-            quantile(0.25)({col_name}) as q1,
-            quantile(0.75)({col_name}) as q3,
-            stddevPop({col_name}) as std_dev,
-            varPop({col_name}) as variance
-        FROM {database}.{table_name}
-        WHERE {col_name} IS NOT NULL
+            min({column}) as min_val,
+            max({column}) as max_val,
+            avg({column}) as avg_val,
+            {MODE_FUNCTIONS[mode]['quantiles']}(0.25, 0.5, 0.75)(toFloat64({column})) as quartiles,
+            stddevPop(toFloat64({column})) as std_dev,
+            varPop(toFloat64({column})) as variance
+        FROM {source}
+        WHERE {column} IS NOT NULL
         """
         result = self.client.query(query).result_rows[0]
+        quartiles = result[3] or [None, None, None]
 
         return {
             'min': float(result[0]) if result[0] is not None else None,
             'max': float(result[1]) if result[1] is not None else None,
             'mean': float(result[2]) if result[2] is not None else None,
-            'median': float(result[3]) if result[3] is not None else None,
-            'q1': float(result[4]) if result[4] is not None else None,
-            'q3': float(result[5]) if result[5] is not None else None,
-            'std_dev': float(result[6]) if result[6] is not None else None,
-            'variance': float(result[7]) if result[7] is not None else None
+            'median': float(quartiles[1]) if quartiles[1] is not None else None,
+            'q1': float(quartiles[0]) if quartiles[0] is not None else None,
+            'q3': float(quartiles[2]) if quartiles[2] is not None else None,
+            'std_dev': float(result[4]) if result[4] is not None else None,
+            'variance': float(result[5]) if result[5] is not None else None
         }
 
-    def _get_string_stats(self, database: str, table_name: str, col_name: str, sample_size: int) -> Dict[str, Any]:
+    def _get_string_stats(self, source: str, col_name: str, col_type: str) -> Dict[str, Any]:
         """Статистика для строковых колонок"""
+        column = quote_identifier(col_name)
         # Длина строк
         length_query = f"""
         SELECT 
-            min(length({col_name})) as min_length,
-            max(length({col_name})) as max_length,
-            avg(length({col_name})) as avg_length
-        FROM {database}.{table_name}
-        WHERE {col_name} IS NOT NULL
+            min(length({column})) as min_length,
+            max(length({column})) as max_length,
+            avg(length({column})) as avg_length
+        FROM {source}
+        WHERE {column} IS NOT NULL
         """
         length_result = self.client.query(length_query).result_rows[0]
 
-        # Паттерны (на сэмпле)
-        sample_query = f"""
-        SELECT {col_name}
-        FROM {database}.{table_name}
-        WHERE {col_name} IS NOT NULL
-        LIMIT {sample_size}
-        """
-        samples = [row[0] for row in self.client.query(sample_query).result_rows]
-
-        # Определяем паттерны
-        patterns = self._detect_string_patterns(samples)
-
         return {
             'min_length': int(length_result[0]) if length_result[0] is not None else None,
             'max_length': int(length_result[1]) if length_result[1] is not None else None,
             'avg_length': float(length_result[2]) if length_result[2] is not None else None,
-            'patterns': patterns
+            **(self._get_string_patterns(source, col_name) if self._has_string_patterns(col_type) else {})
         }
 
-    def _get_date_stats(self, database: str, table_name: str, col_name: str) -> Dict[str, Any]:
+    def _get_string_patterns(self, source: str, col_name: str) -> Dict[str, Any]:
+        """Паттерны строковой колонки (классификация на сервере по всем значениям источника)"""
+        column = quote_identifier(col_name)
+        query = f"""
+        SELECT 
+            count({column}) as non_null_count,
+            {', '.join(sql_pattern_aggregates(column))}
+        FROM {source}
+        """
+        row = self.client.query(query).result_rows[0]
+        counts = {pattern['name']: count for pattern, count in zip(STRING_PATTERNS, row[1:])}
+
+        return {'patterns': significant_patterns(counts, row[0])}
+
+    def _get_date_stats(self, source: str, col_name: str) -> Dict[str, Any]:
         """Статистика для дат"""
+        column = quote_identifier(col_name)
         query = f"""
         SELECT 
-            min({col_name}) as min_date,
-            max({col_name}) as max_date,
-            dateDiff('day', min({col_name}), max({col_name})) as range_days
-        FROM {database}.{table_name}
-        WHERE {col_name} IS NOT NULL
+            min({column}) as min_date,
+            max({column}) as max_date,
+            dateDiff('day', min({column}), max({column})) as range_days
+        FROM {source}
+        WHERE {column} IS NOT NULL
         """
         result = self.client.query(query).result_rows[0]
 
@@ -327,226 +952,297 @@ class DataProfilerService:
             'range_days': int(result[2]) if result[2] is not None else None
         }
 
-    def _get_top_values(self, database: str, table_name: str, col_name: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def _get_top_values(self, source: str, col_name: str, limit: int = 10, mode: str = 'exact') -> List[
+        Dict[str, Any]]:
         """Получить топ значений колонки"""
+        column = quote_identifier(col_name)
+        if mode == 'fast':
+            query = f"""
+            SELECT 
+                approx_top_k({limit})(toString({column})) as top_values,
+                count() as total_count,
+                countIf(isNull({column})) as null_count
+            FROM {source}
+            """
+            try:
+                top_values, total_count, null_count = self.client.query(query).result_rows[0]
+                return self._unpack_approx_top_values(top_values, total_count, null_count, limit)
+            except:
+                return []
+
         query = f"""
         SELECT 
-            {col_name} as value,
+            toString({column}) as value,
             count() as count,
             count() * 100.0 / sum(count()) OVER () as percentage
-        FROM {database}.{table_name}
-        GROUP BY {col_name}
+        FROM {source}
+        GROUP BY {column}
         ORDER BY count DESC
         LIMIT {limit}
         """
 
         try:
-            result = self.client.query(query).result_rows
+            table = self._query_arrow(query)
+            values, counts = self._value_counts_from_arrow(table)
+            percentages = np.round(table.column('percentage').to_numpy(), 2)
             return [
-                {
-                    'value': str(row[0]) if row[0] is not None else 'NULL',
-                    'count': row[1],
-                    'percentage': round(float(row[2]), 2)
-                }
-                for row in result
+                {'value': value, 'count': count, 'percentage': percentage}
+                for value, count, percentage in zip(values, counts.tolist(), percentages.tolist())
             ]
         except:
             return []
 
-    def _detect_string_patterns(self, samples: List[str]) -> Dict[str, Any]:
-        """Определение паттернов в строковых данных"""
-        if not samples:
-            return {}
-
-        patterns = {
-            'email': 0,
-            'phone': 0,
-            'url': 0,
-            'numeric': 0,
-            'alphanumeric': 0,
-            'uuid': 0
-        }
+    def _analyze_data_patterns(self, source: str, columns: List[Dict[str, Any]],
+                               correlation_method: str = 'pearson') -> Dict[str, Any]:
+        """Анализ паттернов данных в таблице
 
-        # Регулярные выражения для паттернов
-        email_pattern = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
-        phone_pattern = re.compile(r'^[\+\d\s\-\(\)]+$')
-        url_pattern = re.compile(r'^https?://|www\.')
-        numeric_pattern = re.compile(r'^\d+$')
-        alphanumeric_pattern = re.compile(r'^[a-zA-Z0-9]+$')
-        uuid_pattern = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I)
-
-        for sample in samples[:1000]:  # Проверяем первые 1000 значений
-            if email_pattern.match(sample):
-                patterns['email'] += 1
-            elif phone_pattern.match(sample) and len(sample) >= 7:
-                patterns['phone'] += 1
-            elif url_pattern.match(sample):
-                patterns['url'] += 1
-            elif uuid_pattern.match(sample):
-                patterns['uuid'] += 1
-            elif numeric_pattern.match(sample):
-                patterns['numeric'] += 1
-            elif alphanumeric_pattern.match(sample):
-                patterns['alphanumeric'] += 1
-
-        # Конвертируем в проценты
-        total = len(samples[:1000])
-        for key in patterns:
-            patterns[key] = round((patterns[key] / total * 100), 2) if total > 0 else 0
-
-        # Оставляем только значимые паттерны (> 10%)
-        return {k: v for k, v in patterns.items() if v > 10}
-
-    def _analyze_data_patterns(self, database: str, table_name: str, sample_size: int) -> Dict[str, Any]:
-        """Анализ паттернов данных в таблице"""
-        # Получаем сэмпл данных
-        sample_query = f"""
-        SELECT *
-        FROM {database}.{table_name}
-        LIMIT {sample_size}
+        Матрица корреляций числовых колонок считается одним запросом за один проход:
+        corr (Пирсон) или rankCorr (Спирмен) для всех пар. NULL исключаются попарно.
         """
+        if correlation_method not in CORRELATION_FUNCTIONS:
+            return {'error': f"Неизвестный метод корреляции: {correlation_method}"}
 
-        try:
-            result = self.client.query(sample_query)
-            if not result.result_rows:
-                return {}
-
-            # Анализируем корреляции для числовых колонок
-            numeric_columns = [
-                col for col, dtype in zip(result.column_names, result.column_types)
-                if self._is_numeric_type(dtype)
-            ]
+        numeric_columns = [col['name'] for col in columns if self._is_numeric_type(col['type'])]
+        pairs = [
+            (i, j)
+            for i in range(len(numeric_columns))
+            for j in range(i + 1, len(numeric_columns))
+        ]
+
+        matrix = [[1.0 if i == j else None for j in range(len(numeric_columns))] for i in range(len(numeric_columns))]
+        correlations = {}
 
-            correlations = {}
-            if len(numeric_columns) > 1:
-                # Простая корреляция между парами числовых колонок
-                for i, col1 in enumerate(numeric_columns):
-                    for col2 in numeric_columns[i + 1:]:
-                        corr_query = f"""
-                        SELECT corr({col1}, {col2}) as correlation
-                        FROM {database}.{table_name}
-                        WHERE {col1} IS NOT NULL AND {col2} IS NOT NULL
-                        """
-                        try:
-                            corr_result = self.client.query(corr_query).result_rows[0][0]
-                            if corr_result is not None and abs(corr_result) > 0.5:
-                                correlations[f"{col1}_vs_{col2}"] = round(float(corr_result), 3)
-                        except:
-                            pass
+        try:
+            if pairs:
+                function = CORRELATION_FUNCTIONS[correlation_method]
+                expressions = [
+                    f"{function}(toFloat64({quote_identifier(numeric_columns[i])}), "
+                    f"toFloat64({quote_identifier(numeric_columns[j])}))"
+                    for i, j in pairs
+                ]
+                corr_query = f"""
+                SELECT {', '.join(expressions)}
+                FROM {source}
+                """
+                row = self.client.query(corr_query).result_rows[0]
+
+                for (i, j), value in zip(pairs, row):
+                    if value is None or np.isnan(value):
+                        continue
+                    value = round(float(value), 3)
+                    matrix[i][j] = matrix[j][i] = value
+                    if abs(value) > 0.5:
+                        correlations[f"{numeric_columns[i]}_vs_{numeric_columns[j]}"] = value
 
             return {
                 'high_correlations': correlations,
+                'correlation_matrix': {
+                    'method': correlation_method,
+                    'columns': numeric_columns,
+                    'values': matrix
+                },
                 'numeric_columns_count': len(numeric_columns)
             }
         except Exception as e:
             return {'error': str(e)}
 
-    def get_column_distribution(self, database: str, table_name: str, column_name: str, bins: int = 20) -> Dict[
-        str, Any]:
+    def _get_distributions(self, source: str, column_stats: List[Dict[str, Any]],
+                           bins: int = PROFILE_DISTRIBUTION_BINS) -> Dict[str, Dict[str, Any]]:
+        """Распределения всех колонок в формате get_column_distribution (шкала linear)
+
+        Гистограммы числовых колонок считаются одним запросом: min/max уже известны
+        из статистики, номер бина каждой колонки собирается через sumMap.
+        Распределения остальных колонок берутся из top_values без запросов.
+        """
+        distributions = {}
+        numeric = []
+        for stats in column_stats:
+            if self._is_numeric_type(stats['data_type']) and 'error' not in stats:
+                if stats.get('min') is None or stats.get('max') is None:
+                    distributions[stats['column_name']] = {
+                        'type': 'numeric', 'scale': 'linear', 'bins': [], 'counts': [], 'percentages': []}
+                elif stats['min'] == stats['max']:
+                    distributions[stats['column_name']] = {
+                        'type': 'numeric', 'scale': 'linear', 'bins': [str(stats['min'])],
+                        'counts': [1], 'percentages': [100.0]}
+                else:
+                    numeric.append(stats)
+            elif stats.get('top_values'):
+                distributions[stats['column_name']] = self._distribution_from_top_values(stats['top_values'])
+
+        if numeric:
+            expressions = []
+            for stats in numeric:
+                col_name, min_val, max_val = stats['column_name'], stats['min'], stats['max']
+                column = quote_identifier(col_name)
+                position = f"(toFloat64({column}) - {min_val!r}) / ({max_val!r} - {min_val!r})"
+                bin_index = f"least(toUInt32(greatest(floor({position} * {bins}), 0)), {bins - 1})"
+                expressions.append(f"sumMapIf([{bin_index}], [toUInt64(1)], isNotNull({column}))")
+
+            try:
+                row = self.client.query(f"SELECT {', '.join(expressions)} FROM {source}").result_rows[0]
+            except Exception as e:
+                # Без готовой гистограммы распределение будет запрошено при выборе колонки
+                print(f"Ошибка расчета гистограмм: {e}")
+                return distributions
+
+            for stats, (bin_indexes, bin_counts) in zip(numeric, row):
+                counts = np.zeros(bins, dtype=np.int64)
+                counts[np.asarray(bin_indexes, dtype=np.int64)] = np.asarray(bin_counts, dtype=np.int64)
+                edges = self._distribution_edges(stats['min'], stats['max'], bins, 'linear', [])
+                total = counts.sum()
+                distributions[stats['column_name']] = {
+                    'type': 'numeric',
+                    'scale': 'linear',
+                    'bins': [f"{start:.2f}-{end:.2f}" for start, end in zip(edges[:-1], edges[1:])],
+                    'edges': edges.tolist(),
+                    'counts': counts.tolist(),
+                    'percentages': (np.round(counts / total * 100, 2) if total > 0 else np.zeros(bins)).tolist()
+                }
+
+        return distributions
+
+    def _distribution_from_top_values(self, top_values: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Категориальное распределение из топа значений (проценты от показанных значений)"""
+        counts = np.array([value['count'] for value in top_values], dtype=np.int64)
+        total = counts.sum()
+        return {
+            'type': 'categorical',
+            'values': [value['value'] for value in top_values],
+            'counts': counts.tolist(),
+            'percentages': (np.round(counts / total * 100, 2) if total > 0 else np.zeros(len(counts))).tolist()
+        }
+
+    def get_column_distribution(self, database: str, table_name: str, column_name: str, bins: int = 20,
+                                sample_size: Optional[int] = None, scale: str = 'linear',
+                                partitions: Optional[List[str]] = None,
+                                time_range: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
         """Получить распределение значений для визуализации"""
+        if database == LOCAL_DATABASE:
+            return self.local.get_column_distribution(table_name, column_name, bins, sample_size, scale)
+
         # Проверяем тип колонки
-        type_query = f"""
-        SELECT type 
-        FROM system.columns 
-        WHERE database = '{database}' AND table = '{table_name}' AND name = '{column_name}'
-        """
-        col_type = self.client.query(type_query).result_rows[0][0]
+        col_type = self.catalog.column_type(database, table_name, column_name)
+        if col_type is None:
+            raise ValueError(f"Колонка {column_name} не найдена в {database}.{table_name}")
+
+        partition_filter = self._get_partition_filter(database, table_name, partitions, time_range)
+        where = partition_filter['where'] if partition_filter else None
+        source = f"(SELECT * FROM {database}.{table_name} WHERE {where})" if where else f"{database}.{table_name}"
+        if sample_size:
+            row_count = self.client.query(f"SELECT count() FROM {source}").result_rows[0][0]
+            source = self._get_sampling_plan(database, table_name, row_count, sample_size, where)['source']
 
         if self._is_numeric_type(col_type):
-            return self._get_numeric_distribution(database, table_name, column_name, bins)
+            return self._get_numeric_distribution(source, column_name, bins, scale)
         else:
-            return self._get_categorical_distribution(database, table_name, column_name, bins)
+            return self._get_categorical_distribution(source, column_name, bins)
+
+    def _get_numeric_distribution(self, source: str, column_name: str, bins: int, scale: str = 'linear') -> Dict[
+        str, Any]:
+        """Распределение для числовых данных
 
-    def _get_numeric_distribution(self, database: str, table_name: str, column_name: str, bins: int) -> Dict[str, Any]:
-        """Распределение для числовых данных"""
-        # Получаем min/max для определения интервалов
-        range_query = f"""
+        Границы и количества по бинам считаются одним запросом: min/max (и квантили
+        для scale='quantile') вычисляются в скалярном подзапросе WITH.
+        """
+        if scale not in DISTRIBUTION_SCALES:
+            raise ValueError(f"Неизвестная шкала распределения: {scale}")
+
+        column = quote_identifier(column_name)
+        values = f"(SELECT toFloat64({column}) AS x FROM {source} WHERE {column} IS NOT NULL)"
+        if scale == 'quantile':
+            levels = ', '.join(f"{i / bins:.6f}" for i in range(bins + 1))
+            edges = f"quantiles({levels})(x)"
+            bin_index = f"arrayCount(e -> e <= x, arraySlice(bounds.3, 2, {bins - 1}))"
+        else:
+            edges = "CAST([], 'Array(Float64)')"
+            if scale == 'log':
+                position = "log(x - bounds.1 + 1) / log(bounds.2 - bounds.1 + 1)"
+            else:
+                position = "(x - bounds.1) / (bounds.2 - bounds.1)"
+            bin_index = f"if(bounds.2 = bounds.1, 0, least(toUInt32(floor({position} * {bins})), {bins - 1}))"
+
+        histogram_query = f"""
+        WITH (SELECT tuple(min(x), max(x), {edges}) FROM {values}) AS bounds
         SELECT 
-            min({column_name}) as min_val,
-            max({column_name}) as max_val
-        FROM {database}.{table_name}
-        WHERE {column_name} IS NOT NULL
+            bounds.1 as min_val,
+            bounds.2 as max_val,
+            bounds.3 as edges,
+            toUInt32({bin_index}) as bin_index,
+            count() as count
+        FROM {values}
+        GROUP BY bin_index
         """
-        range_result = self.client.query(range_query).result_rows[0]
-        min_val, max_val = float(range_result[0]), float(range_result[1])
+
+        histogram = self._query_arrow(histogram_query)
+        if histogram.num_rows == 0:
+            return {'type': 'numeric', 'scale': scale, 'bins': [], 'counts': [], 'percentages': []}
+
+        min_val = histogram.column('min_val')[0].as_py()
+        max_val = histogram.column('max_val')[0].as_py()
 
         if min_val == max_val:
             return {
                 'type': 'numeric',
+                'scale': scale,
                 'bins': [str(min_val)],
                 'counts': [1],
                 'percentages': [100.0]
             }
 
-        # Создаем гистограмму
-        bin_width = (max_val - min_val) / bins
-        histogram_query = f"""
-        SELECT 
-            floor(({column_name} - {min_val}) / {bin_width}) as bin_index,
-            count() as count
-        FROM {database}.{table_name}
-        WHERE {column_name} IS NOT NULL
-        GROUP BY bin_index
-        ORDER BY bin_index
-        """
+        # Раскладываем количества по бинам одной операцией над массивами
+        counts = np.zeros(bins, dtype=np.int64)
+        counts[histogram.column('bin_index').to_numpy()] = histogram.column('count').to_numpy()
 
-        histogram_result = self.client.query(histogram_query).result_rows
+        bin_edges = self._distribution_edges(min_val, max_val, bins, scale,
+                                             histogram.column('edges')[0].as_py())
+        bin_labels = [f"{start:.2f}-{end:.2f}" for start, end in zip(bin_edges[:-1], bin_edges[1:])]
 
-        # Формируем данные для визуализации
-        bin_labels = []
-        counts = []
-
-        for i in range(bins):
-            bin_start = min_val + i * bin_width
-            bin_end = bin_start + bin_width
-            bin_labels.append(f"{bin_start:.2f}-{bin_end:.2f}")
-
-            # Находим count для этого бина
-            count = 0
-            for row in histogram_result:
-                if row[0] == i:
-                    count = row[1]
-                    break
-            counts.append(count)
-
-        total = sum(counts)
-        percentages = [round(c / total * 100, 2) if total > 0 else 0 for c in counts]
+        total = counts.sum()
+        percentages = np.round(counts / total * 100, 2) if total > 0 else np.zeros(bins)
 
         return {
             'type': 'numeric',
+            'scale': scale,
             'bins': bin_labels,
-            'counts': counts,
-            'percentages': percentages
+            'edges': bin_edges.tolist(),
+            'counts': counts.tolist(),
+            'percentages': percentages.tolist()
         }
 
-    def _get_categorical_distribution(self, database: str, table_name: str, column_name: str, limit: int) -> Dict[
+    def _distribution_edges(self, min_val: float, max_val: float, bins: int, scale: str,
+                            quantile_edges: List[float]) -> np.ndarray:
+        """Границы бинов гистограммы (bins + 1 значение)"""
+        if scale == 'quantile':
+            edges = np.array(quantile_edges, dtype=float)
+            edges[0], edges[-1] = min_val, max_val
+            return edges
+        if scale == 'log':
+            return min_val - 1 + np.exp(np.linspace(0, np.log(max_val - min_val + 1), bins + 1))
+        return np.linspace(min_val, max_val, bins + 1)
+
+    def _get_categorical_distribution(self, source: str, column_name: str, limit: int) -> Dict[
         str, Any]:
         """Распределение для категориальных данных"""
+        column = quote_identifier(column_name)
         query = f"""
         SELECT 
-            {column_name} as value,
+            toString({column}) as value,
             count() as count
-        FROM {database}.{table_name}
-        GROUP BY value
+        FROM {source}
+        GROUP BY {column}
         ORDER BY count DESC
         LIMIT {limit}
         """
 
-        result = self.client.query(query).result_rows
-
-        values = []
-        counts = []
-
-        for row in result:
-            values.append(str(row[0]) if row[0] is not None else 'NULL')
-            counts.append(row[1])
+        values, counts = self._value_counts_from_arrow(self._query_arrow(query))
 
-        total = sum(counts)
-        percentages = [round(c / total * 100, 2) if total > 0 else 0 for c in counts]
+        total = counts.sum()
+        percentages = np.round(counts / total * 100, 2) if total > 0 else np.zeros(len(counts))
 
         return {
             'type': 'categorical',
             'values': values,
-            'counts': counts,
-            'percentages': percentages
+            'counts': counts.tolist(),
+            'percentages': percentages.tolist()
         }
\ No newline at end of file
@@ -0,0 +1,212 @@
+# backend/backend/services/dataset_ingestion.py
+from typing import Dict, List, Any, Optional
+import os
+import re
+import time
+import clickhouse_connect
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .clickhouse_service import clickhouse_service
+from .sql_utils import quote_identifier
+from .parquet_staging import ParquetStager, is_staged, staged_path
+from .streaming_validator import iter_file_chunks
+
+# Строк в одном блоке вставки (колоночный блок Arrow)
+INSERT_BLOCK_ROWS = 1_000_000
+
+# Префикс таблиц с загруженными данными
+UPLOAD_TABLE_PREFIX = 'upload_'
+
+# Суффикс временной таблицы, в которую идет загрузка до подмены основной
+LOADING_TABLE_SUFFIX = '__loading'
+
+
+def table_name_for(dataset_name: str) -> str:
+    """Имя таблицы ClickHouse для загруженного файла
+
+    Расширение входит в имя, чтобы sales.csv и sales.xlsx не перезаписывали одну таблицу.
+    """
+    name = os.path.basename(dataset_name)
+    return UPLOAD_TABLE_PREFIX + (re.sub(r'\W+', '_', name).strip('_').lower() or 'dataset')
+
+
+def clickhouse_type(arrow_type: pa.DataType) -> str:
+    """Тип ClickHouse для типа Arrow (без Nullable)"""
+    if pa.types.is_boolean(arrow_type):
+        return 'Bool'
+    if pa.types.is_integer(arrow_type):
+        prefix = 'UInt' if pa.types.is_unsigned_integer(arrow_type) else 'Int'
+        return f"{prefix}{arrow_type.bit_width}"
+    if pa.types.is_floating(arrow_type):
+        return 'Float32' if arrow_type.bit_width == 32 else 'Float64'
+    if pa.types.is_decimal(arrow_type):
+        return f"Decimal({arrow_type.precision}, {arrow_type.scale})"
+    if pa.types.is_timestamp(arrow_type):
+        precision = {'s': 0, 'ms': 3, 'us': 6, 'ns': 9}[arrow_type.unit]
+        return f"DateTime64({precision})"
+    if pa.types.is_date(arrow_type):
+        return 'Date32'
+    if pa.types.is_dictionary(arrow_type):
+        return 'LowCardinality(String)'
+    return 'String'
+
+
+def _insert_type(arrow_type: pa.DataType) -> pa.DataType:
+    """Тип Arrow, в котором колонка передается при вставке"""
+    if pa.types.is_dictionary(arrow_type) or pa.types.is_null(arrow_type) or \
+            clickhouse_type(arrow_type) == 'String':
+        return pa.string()
+    return arrow_type
+
+
+class DatasetIngestor:
+    """Загрузка файла в ClickHouse колоночными блоками
+
+    Данные берутся из Parquet-копии файла (она создается, если ее нет),
+    схема таблицы выводится из типов Arrow, а Nullable ставится только колонкам,
+    у которых в статистике Parquet есть NULL. Блоки по INSERT_BLOCK_ROWS строк
+    передаются через insert_arrow по HTTP со сжатием, без построчной обработки.
+    Загрузка идет во временную таблицу, которая затем атомарно подменяет
+    основную (EXCHANGE TABLES), поэтому при ошибке прежние данные остаются.
+    """
+
+    def __init__(self, database: Optional[str] = None, block_rows: int = INSERT_BLOCK_ROWS):
+        self.database = database or os.getenv('CLICKHOUSE_DB', 'datagate')
+        self.block_rows = block_rows
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = clickhouse_connect.get_client(
+                host=os.getenv('CLICKHOUSE_HOST', 'localhost'),
+                port=int(os.getenv('CLICKHOUSE_HTTP_PORT', 8123)),
+                username=os.getenv('CLICKHOUSE_USER', 'admin'),
+                password=os.getenv('CLICKHOUSE_PASSWORD', 'admin123'),
+                database=self.database,
+                compress='lz4'
+            )
+        return self._client
+
+    def _ensure_staged(self, file_path: str) -> str:
+        """Путь к Parquet-копии файла, при необходимости создав ее"""
+        if file_path.endswith('.parquet'):
+            return file_path
+        if not is_staged(file_path):
+            stager = ParquetStager(staged_path(file_path))
+            try:
+                for chunk in iter_file_chunks(file_path):
+                    stager.write(chunk)
+            except Exception:
+                stager.abort()
+                raise
+            stager.close()
+        return staged_path(file_path)
+
+    def _nullable_columns(self, parquet_file: pq.ParquetFile) -> set:
+        """Колонки, в которых по статистике Parquet есть NULL (или статистики нет)"""
+        metadata = parquet_file.metadata
+        nullable = set()
+        for row_group in range(metadata.num_row_groups):
+            group = metadata.row_group(row_group)
+            for i in range(group.num_columns):
+                column = group.column(i)
+                statistics = column.statistics
+                if statistics is None or not statistics.has_null_count or statistics.null_count > 0:
+                    nullable.add(column.path_in_schema)
+        return nullable
+
+    def infer_schema(self, parquet_file: pq.ParquetFile) -> List[Dict[str, str]]:
+        """Колонки будущей таблицы: имя и тип ClickHouse"""
+        nullable = self._nullable_columns(parquet_file)
+        columns = []
+        for field in parquet_file.schema_arrow:
+            col_type = clickhouse_type(field.type)
+            if field.name in nullable or pa.types.is_null(field.type):
+                col_type = ("LowCardinality(Nullable(String))" if col_type == 'LowCardinality(String)'
+                            else f"Nullable({col_type})")
+            columns.append({'name': field.name, 'type': col_type})
+        return columns
+
+    def ingest(self, file_path: str, table_name: Optional[str] = None, replace: bool = True) -> Dict[str, Any]:
+        """Загрузить файл в таблицу ClickHouse и записать сведения в uploaded_datasets
+
+        replace=True заменяет данные таблицы, replace=False дописывает их.
+        При ошибке в uploaded_datasets пишется статус failed, а исключение пробрасывается.
+        """
+        started = time.monotonic()
+        dataset_name = os.path.basename(file_path)
+        table_name = table_name or table_name_for(dataset_name)
+        full_name = f"{self.database}.{table_name}"
+        loading_name = f"{full_name}{LOADING_TABLE_SUFFIX}"
+        parquet_path, columns, row_count = file_path, [], 0
+
+        try:
+            parquet_path = self._ensure_staged(file_path)
+            parquet_file = pq.ParquetFile(parquet_path, memory_map=True)
+            columns = self.infer_schema(parquet_file)
+            insert_schema = pa.schema([
+                pa.field(field.name, _insert_type(field.type)) for field in parquet_file.schema_arrow
+            ])
+
+            self.client.command(f"DROP TABLE IF EXISTS {loading_name}")
+            column_definitions = ',\n            '.join(
+                f"{quote_identifier(col['name'])} {col['type']}" for col in columns)
+            self.client.command(f"""
+            CREATE TABLE {loading_name} (
+                {column_definitions}
+            ) ENGINE = MergeTree()
+            ORDER BY tuple()
+            """)
+
+            for batch in parquet_file.iter_batches(batch_size=self.block_rows):
+                block = pa.Table.from_batches([batch]).cast(insert_schema)
+                self.client.insert_arrow(loading_name, block)
+                row_count += block.num_rows
+
+            self._publish(loading_name, full_name, replace)
+        except Exception:
+            try:
+                self.client.command(f"DROP TABLE IF EXISTS {loading_name}")
+            except Exception as e:
+                print(f"Ошибка удаления временной таблицы: {e}")
+            clickhouse_service.record_uploaded_dataset(
+                dataset_name, parquet_path, [col['name'] for col in columns], row_count,
+                os.path.getsize(parquet_path) if os.path.exists(parquet_path) else 0,
+                upload_status='failed'
+            )
+            raise
+        finally:
+            clickhouse_service.catalog.invalidate()
+
+        file_size = os.path.getsize(parquet_path)
+        clickhouse_service.record_uploaded_dataset(
+            dataset_name, parquet_path, [col['name'] for col in columns], row_count, file_size,
+            upload_status='loaded'
+        )
+
+        seconds = time.monotonic() - started
+        return {
+            'table': full_name,
+            'row_count': row_count,
+            'columns': columns,
+            'file_size': file_size,
+            'seconds': round(seconds, 2),
+            'mb_per_second': round(file_size / 1024 / 1024 / seconds, 1) if seconds > 0 else None
+        }
+
+    def _publish(self, loading_name: str, full_name: str, replace: bool):
+        """Перенести загруженные данные из временной таблицы в основную"""
+        exists = int(self.client.command(f"EXISTS TABLE {full_name}"))
+        if not exists:
+            self.client.command(f"RENAME TABLE {loading_name} TO {full_name}")
+        elif replace:
+            # Атомарная подмена: прежняя версия оказывается во временной таблице
+            self.client.command(f"EXCHANGE TABLES {loading_name} AND {full_name}")
+            self.client.command(f"DROP TABLE {loading_name}")
+        else:
+            self.client.command(f"INSERT INTO {full_name} SELECT * FROM {loading_name}")
+            self.client.command(f"DROP TABLE {loading_name}")
+
+
+dataset_ingestor = DatasetIngestor()
@@ -0,0 +1,195 @@
+# backend/backend/services/drift_detector.py
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime
+import numpy as np
+from .clickhouse_service import clickhouse_service, ClickHouseService
+
+# Компактные снимки колонок: одна строка на таблицу/колонку/запуск
+COLUMN_PROFILES_TABLE = 'datagate.column_profiles'
+
+COLUMN_PROFILE_COLUMNS = [
+    'database', 'table_name', 'column_name', 'profiled_at', 'data_type', 'row_count',
+    'null_percentage', 'unique_count', 'mean', 'std_dev',
+    'hist_edges', 'hist_counts', 'top_values', 'top_percentages'
+]
+
+# Пороги дрейфа: PSI > 0.2 - существенный сдвиг, KS - максимум разницы CDF
+PSI_THRESHOLD = 0.2
+KS_THRESHOLD = 0.1
+# Изменение доли NULL в процентных пунктах
+NULL_DRIFT_POINTS = 5.0
+
+# Число бинов общей сетки при сравнении гистограмм
+DRIFT_BINS = 20
+
+# Нижняя граница доли в бине, чтобы PSI не уходил в бесконечность
+PSI_EPSILON = 1e-4
+
+BASELINES = ('previous', 'first')
+
+
+def save_column_profiles(database: str, table_name: str, result: Dict[str, Any], profiled_at: datetime,
+                         service: ClickHouseService = clickhouse_service):
+    """Записать снимки колонок профиля одной колоночной вставкой"""
+    distributions = result.get('distributions', {})
+    row_count = int(result.get('general_stats', {}).get('row_count', 0) or 0)
+    rows = []
+    for stats in result.get('column_stats', []):
+        if 'error' in stats:
+            continue
+        distribution = distributions.get(stats['column_name'], {})
+        numeric = distribution.get('type') == 'numeric' and distribution.get('edges')
+        top_values = stats.get('top_values') or []
+        rows.append([
+            database, table_name, stats['column_name'], profiled_at, stats.get('data_type', ''), row_count,
+            float(stats.get('null_percentage', 0)), int(stats.get('unique_count', 0) or 0),
+            stats.get('mean'), stats.get('std_dev'),
+            [float(edge) for edge in distribution['edges']] if numeric else [],
+            [int(count) for count in distribution['counts']] if numeric else [],
+            [str(value['value']) for value in top_values],
+            [float(value['percentage']) for value in top_values],
+        ])
+    if not rows:
+        return
+
+    service.execute_insert(
+        f"INSERT INTO {COLUMN_PROFILES_TABLE} ({', '.join(COLUMN_PROFILE_COLUMNS)}) VALUES",
+        [list(column) for column in zip(*rows)],
+        columnar=True
+    )
+
+
+def rebin(edges: np.ndarray, counts: np.ndarray, target_edges: np.ndarray) -> np.ndarray:
+    """Перераспределить гистограмму на другую сетку (значения равномерны внутри бина)"""
+    cdf = np.concatenate(([0.0], np.cumsum(counts, dtype=float)))
+    return np.diff(np.interp(target_edges, edges, cdf))
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> float:
+    """PSI между двумя распределениями долей"""
+    expected = np.clip(expected, PSI_EPSILON, None)
+    actual = np.clip(actual, PSI_EPSILON, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _shares(counts: np.ndarray) -> np.ndarray:
+    total = counts.sum()
+    return counts / total if total > 0 else counts
+
+
+class DriftDetector:
+    """Поиск дрейфа колонок по сохраненным снимкам
+
+    Читаются только строки COLUMN_PROFILES_TABLE (гистограммы и топы значений),
+    исходные таблицы не сканируются. Текущий снимок каждой колонки сравнивается
+    с базовым (предыдущим или первым): для числовых колонок гистограммы
+    переводятся на общую сетку и считаются PSI и KS, для категориальных - PSI
+    по топу значений с корзиной «остальное».
+    """
+
+    def __init__(self, service: ClickHouseService = clickhouse_service):
+        self.service = service
+
+    def _load_pairs(self, database: Optional[str], table_name: Optional[str],
+                    baseline: str) -> List[Tuple[Tuple, Tuple]]:
+        """Пары (базовый, текущий) снимок по каждой колонке"""
+        conditions = ['1']
+        params = {}
+        if database:
+            conditions.append('database = %(database)s')
+            params['database'] = database
+        if table_name:
+            conditions.append('table_name = %(table)s')
+            params['table'] = table_name
+
+        select = f"""
+            SELECT database, table_name, column_name, profiled_at, data_type, null_percentage,
+                   hist_edges, hist_counts, top_values, top_percentages
+            FROM {COLUMN_PROFILES_TABLE}
+            WHERE {' AND '.join(conditions)}
+        """
+        latest = self.service.query_rows(
+            f"{select} ORDER BY profiled_at DESC LIMIT {2 if baseline == 'previous' else 1} "
+            f"BY database, table_name, column_name",
+            params
+        )
+        if baseline == 'first':
+            first = self.service.query_rows(
+                f"{select} ORDER BY profiled_at ASC LIMIT 1 BY database, table_name, column_name", params)
+        else:
+            first = []
+
+        snapshots: Dict[Tuple[str, str, str], List[Tuple]] = {}
+        for row in sorted(latest, key=lambda row: row[3], reverse=True):
+            snapshots.setdefault(row[:3], []).append(row)
+        for row in first:
+            snapshots.setdefault(row[:3], []).append(row)
+
+        pairs = []
+        for rows in snapshots.values():
+            current, base = rows[0], rows[-1]
+            if base[3] < current[3]:
+                pairs.append((base, current))
+        return pairs
+
+    def detect(self, database: Optional[str] = None, table_name: Optional[str] = None,
+               baseline: str = 'previous') -> List[Dict[str, Any]]:
+        """Результаты сравнения снимков по колонкам, колонки с дрейфом первыми"""
+        if baseline not in BASELINES:
+            raise ValueError(f"Неизвестный базовый снимок: {baseline}")
+
+        results = []
+        for base, current in self._load_pairs(database, table_name, baseline):
+            psi, ks = self._compare(base, current)
+            null_delta = round(current[5] - base[5], 2)
+            drifted = (
+                (psi is not None and psi > PSI_THRESHOLD)
+                or (ks is not None and ks > KS_THRESHOLD)
+                or abs(null_delta) > NULL_DRIFT_POINTS
+            )
+            results.append({
+                'database': current[0],
+                'table_name': current[1],
+                'column_name': current[2],
+                'data_type': current[4],
+                'psi': round(psi, 4) if psi is not None else None,
+                'ks': round(ks, 4) if ks is not None else None,
+                'null_delta': null_delta,
+                'drifted': drifted,
+                'baseline_at': str(base[3]),
+                'current_at': str(current[3])
+            })
+
+        results.sort(key=lambda result: (not result['drifted'], -(result['psi'] or 0)))
+        return results
+
+    def _compare(self, base: Tuple, current: Tuple) -> Tuple[Optional[float], Optional[float]]:
+        """PSI и KS (KS только для числовых колонок)"""
+        base_edges, base_counts = np.asarray(base[6], dtype=float), np.asarray(base[7], dtype=float)
+        edges, counts = np.asarray(current[6], dtype=float), np.asarray(current[7], dtype=float)
+
+        if len(base_edges) > 1 and len(edges) > 1:
+            grid = np.linspace(min(base_edges[0], edges[0]), max(base_edges[-1], edges[-1]), DRIFT_BINS + 1)
+            expected = _shares(rebin(base_edges, base_counts, grid))
+            actual = _shares(rebin(edges, counts, grid))
+            ks = float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+            return population_stability_index(expected, actual), ks
+
+        if base[8] or current[8]:
+            categories = sorted(set(base[8]) | set(current[8]))
+            expected = self._category_shares(base[8], base[9], categories)
+            actual = self._category_shares(current[8], current[9], categories)
+            return population_stability_index(expected, actual), None
+
+        return None, None
+
+    @staticmethod
+    def _category_shares(values: List[str], percentages: List[float], categories: List[str]) -> np.ndarray:
+        """Доли значений топа по общему списку категорий плюс доля остальных"""
+        by_value = dict(zip(values, percentages))
+        shares = np.array([by_value.get(category, 0.0) for category in categories] + [0.0]) / 100
+        shares[-1] = max(0.0, 1 - shares[:-1].sum())
+        return shares
+
+
+drift_detector = DriftDetector()
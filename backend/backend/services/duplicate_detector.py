@@ -0,0 +1,180 @@
+import pandas as pd
+import numpy as np
+from typing import List, Optional
+import os
+import shutil
+import tempfile
+
+# Сколько байт хэшей строк держать в памяти до сброса на диск (8 байт на строку)
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Число дисковых разделов; раздел выбирается по старшим битам хэша
+SPILL_PARTITIONS = 16
+
+
+def _numeric_key(values: pd.Series) -> List[np.ndarray]:
+    """Каноническое представление чисел: (вид, 64 бита значения)
+
+    Целые значения кодируются как int64 при любом dtype колонки (int64, float64
+    с NaN, nullable Int64), поэтому совпадают между порциями и не теряют точность
+    выше 2**53. Дробные числа кодируются битами float64, пропуски - отдельным видом.
+    """
+    if pd.api.types.is_float_dtype(values):
+        numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(numbers)
+        with np.errstate(invalid='ignore'):
+            integral = ~missing & (numbers == np.trunc(numbers)) & (np.abs(numbers) < 2.0 ** 63)
+        bits = numbers.view(np.uint64).copy()
+        bits[integral] = numbers[integral].astype(np.int64).view(np.uint64)
+        bits[missing] = 0
+        kind = np.where(integral, 0, np.where(missing, 2, 1))
+    else:
+        missing = values.isna().to_numpy()
+        bits = values.to_numpy(dtype='int64', na_value=0).view(np.uint64)
+        kind = np.where(missing, 2, 0)
+    return [kind.astype(np.uint64), bits]
+
+
+def hash_rows(chunk: pd.DataFrame) -> np.ndarray:
+    """64-битные хэши строк DataFrame (векторно, через pd.util.hash_pandas_object).
+
+    Числа хэшируются в каноническом виде (см. _numeric_key), чтобы одно и то же
+    значение в порциях с разными dtype (int64 и float64 с NaN) давало одинаковый хэш.
+    """
+    parts = {}
+    for position in range(chunk.shape[1]):
+        values = chunk.iloc[:, position]
+        if pd.api.types.is_numeric_dtype(values):
+            kind, bits = _numeric_key(values)
+            parts[f"{position}_kind"], parts[f"{position}_bits"] = kind, bits
+        else:
+            parts[str(position)] = values
+    normalized = pd.DataFrame(parts, index=chunk.index)
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy(dtype=np.uint64)
+
+
+class DuplicateDetector:
+    """Подсчет повторяющихся строк по 64-битным хэшам, порция за порцией.
+
+    Точный режим хранит хэши в памяти, пока они укладываются в memory_budget,
+    затем раскладывает их по дисковым разделам; каждый раздел в конце
+    сортируется отдельно, так что в памяти одновременно находится один раздел.
+    Приближенный режим (approximate=True) использует фильтр Блума фиксированного
+    размера: память не зависит от числа строк, возможны ложные срабатывания
+    с вероятностью около false_positive_rate.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, approximate: bool = False,
+                 expected_rows: int = 10_000_000, false_positive_rate: float = 0.001,
+                 spill_dir: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self.approximate = approximate
+        self.row_count = 0
+        self._spill_dir_parent = spill_dir
+        self._spill_dir: Optional[str] = None
+        self._pending: List[np.ndarray] = []
+        self._pending_bytes = 0
+
+        if approximate:
+            # Оптимальные размер фильтра и число хэш-функций для заданной ошибки
+            bits = int(-expected_rows * np.log(false_positive_rate) / np.log(2) ** 2)
+            self._bloom_bits = max(bits, 64)
+            self._bloom_hashes = max(1, int(round(self._bloom_bits / expected_rows * np.log(2))))
+            self._bloom = np.zeros((self._bloom_bits + 7) // 8, dtype=np.uint8)
+            self._approximate_duplicates = 0
+
+    def update(self, chunk: pd.DataFrame):
+        """Учесть очередную порцию строк."""
+        self.add_hashes(hash_rows(chunk))
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Учесть хэши строк очередной порции."""
+        self.row_count += len(hashes)
+        if self.approximate:
+            self._add_to_bloom(hashes)
+            return
+
+        self._pending.append(hashes)
+        self._pending_bytes += hashes.nbytes
+        if self._pending_bytes > self.memory_budget:
+            self._spill()
+
+    @property
+    def duplicate_count(self) -> int:
+        """Число строк, повторяющих одну из предыдущих."""
+        if self.approximate:
+            return self._approximate_duplicates
+
+        if self._spill_dir is None:
+            hashes = np.concatenate(self._pending) if self._pending else np.empty(0, dtype=np.uint64)
+            return int(len(hashes) - len(np.unique(hashes)))
+
+        self._spill()
+        duplicates = 0
+        for partition in range(SPILL_PARTITIONS):
+            path = self._partition_path(partition)
+            if os.path.exists(path):
+                hashes = np.fromfile(path, dtype=np.uint64)
+                duplicates += len(hashes) - len(np.unique(hashes))
+        return int(duplicates)
+
+    def close(self):
+        """Удалить временные файлы разделов."""
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._pending = []
+        self._pending_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self._spill_dir, f"part_{partition:02d}.bin")
+
+    def _spill(self):
+        """Дописать накопленные хэши в дисковые разделы."""
+        if not self._pending:
+            return
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='duplicates_', dir=self._spill_dir_parent)
+
+        hashes = np.concatenate(self._pending)
+        partitions = (hashes >> np.uint64(60)).astype(np.intp)
+        order = np.argsort(partitions, kind='stable')
+        hashes, partitions = hashes[order], partitions[order]
+        bounds = np.searchsorted(partitions, np.arange(SPILL_PARTITIONS + 1))
+
+        for partition in range(SPILL_PARTITIONS):
+            start, end = bounds[partition], bounds[partition + 1]
+            if start < end:
+                with open(self._partition_path(partition), 'ab') as f:
+                    hashes[start:end].tofile(f)
+
+        self._pending = []
+        self._pending_bytes = 0
+
+    def _add_to_bloom(self, hashes: np.ndarray):
+        """Проверить и добавить хэши в фильтр Блума."""
+        # Повторы внутри порции считаются точно
+        unique, first_index = np.unique(hashes, return_index=True)
+        self._approximate_duplicates += len(hashes) - len(unique)
+        # Сохраняем порядок появления, чтобы не зависеть от сортировки
+        unique = hashes[np.sort(first_index)]
+
+        # Двойное хэширование: позиции h1 + i * h2 из половин 64-битного хэша
+        h1 = unique & np.uint64(0xFFFFFFFF)
+        h2 = (unique >> np.uint64(32)) | np.uint64(1)
+        positions = np.stack([
+            (h1 + np.uint64(i) * h2) % np.uint64(self._bloom_bits)
+            for i in range(self._bloom_hashes)
+        ])
+        byte_index = (positions >> np.uint64(3)).astype(np.intp)
+        bit_mask = (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+
+        seen = np.all(self._bloom[byte_index] & bit_mask, axis=0)
+        self._approximate_duplicates += int(seen.sum())
+        np.bitwise_or.at(self._bloom, byte_index.ravel(), bit_mask.ravel())
@@ -0,0 +1,369 @@
+# backend/backend/services/incremental_profiler.py
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, date
+import time
+from .sql_utils import quote_identifier, quote_string
+
+# Таблица с промежуточными состояниями агрегатов по колонкам.
+# Состояния хранятся на стороне ClickHouse и сливаются AggregatingMergeTree,
+# поэтому в Python передаются только итоговые значения.
+STATES_TABLE = 'datagate.profile_column_states_v2'
+
+# Прежняя таблица состояний (с суммой квадратов вместо состояния дисперсии)
+LEGACY_STATES_TABLE = 'datagate.profile_column_states'
+
+# Обработанные блоки вставки по партициям таблицы
+WATERMARKS_TABLE = 'datagate.profile_watermarks'
+
+STATE_COLUMNS = [
+    'database', 'table_name', 'version', 'column_name',
+    'total_count', 'null_count', 'value_sum', 'var_state', 'value_min', 'value_max',
+    'text_min', 'text_max', 'uniq_state', 'quantiles_state', 'top_state'
+]
+
+
+class IncrementalProfiler:
+    """Инкрементальное профилирование append-only MergeTree таблиц
+
+    Для каждой колонки хранятся сливаемые состояния агрегатов (-State комбинаторы).
+    При повторном профилировании состояния считаются только по кускам, добавленным
+    после прошлого запуска (по номерам блоков вставки), и сливаются с сохраненными.
+    Если куски старых данных изменились (слияние со свежими блоками, мутация,
+    удаление партиции), состояния пересчитываются с нуля под новой версией.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._tables_ready = False
+
+    @property
+    def client(self):
+        return self.profiler.client
+
+    def _ensure_tables(self):
+        """Создать служебные таблицы, если их еще нет"""
+        if self._tables_ready:
+            return
+
+        self.client.command(f"""
+        CREATE TABLE IF NOT EXISTS {STATES_TABLE} (
+            database String,
+            table_name String,
+            version UInt64,
+            column_name String,
+            total_count SimpleAggregateFunction(sum, UInt64),
+            null_count SimpleAggregateFunction(sum, UInt64),
+            value_sum SimpleAggregateFunction(sum, Float64),
+            var_state AggregateFunction(varPopStable, Float64),
+            value_min SimpleAggregateFunction(min, Nullable(Float64)),
+            value_max SimpleAggregateFunction(max, Nullable(Float64)),
+            text_min SimpleAggregateFunction(min, Nullable(String)),
+            text_max SimpleAggregateFunction(max, Nullable(String)),
+            uniq_state AggregateFunction(uniqCombined, UInt64),
+            quantiles_state AggregateFunction(quantilesTDigest(0.25, 0.5, 0.75), Float64),
+            top_state AggregateFunction(approx_top_k(10), String)
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY (database, table_name, version, column_name)
+        """)
+        # Состояния из старой таблицы не переносятся: водяные знаки есть, а состояний
+        # в новой таблице нет, поэтому профиль сам пересчитается с нуля
+        self.client.command(f"DROP TABLE IF EXISTS {LEGACY_STATES_TABLE}")
+        self.client.command(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+            database String,
+            table_name String,
+            version UInt64,
+            partition_id String,
+            max_block UInt64,
+            rows UInt64,
+            updated_at DateTime64(3) DEFAULT now64(3)
+        ) ENGINE = ReplacingMergeTree(updated_at)
+        ORDER BY (database, table_name, version, partition_id)
+        """)
+        self._tables_ready = True
+
+    def profile(self, database: str, table_name: str, force_rebuild: bool = False) -> Dict[str, Any]:
+        """Обновить состояния по новым кускам и вернуть профиль таблицы"""
+        self._ensure_tables()
+
+        table_info = self.profiler._get_table_structure(database, table_name)
+        columns = [(col['name'], col['type']) for col in table_info['columns']]
+
+        version, watermarks = self._load_watermarks(database, table_name)
+        parts = self._get_active_parts(database, table_name)
+        new_parts, rebuild = self._plan_update(parts, watermarks)
+
+        rebuild = rebuild or force_rebuild or version is None
+        if rebuild:
+            version = time.time_ns()
+            new_parts = parts
+
+        self._append_states(database, table_name, version, columns, new_parts)
+        processed_rows = self._save_watermarks(database, table_name, version, parts, watermarks, rebuild)
+
+        column_stats, merged_rows = self._merge_states(database, table_name, version, columns)
+        if columns and merged_rows != processed_rows and not rebuild:
+            # Часть кусков успела слиться до вставки состояний - пересчитываем с нуля
+            return self.profile(database, table_name, force_rebuild=True)
+
+        if rebuild:
+            self._drop_old_versions(database, table_name, version)
+
+        return {
+            'table_info': table_info,
+            'general_stats': self.profiler._get_general_stats(database, table_name),
+            'column_stats': column_stats,
+            'data_patterns': {},
+            'incremental': {
+                'version': version,
+                'rebuilt': rebuild,
+                'new_parts': len(new_parts),
+                'new_rows': sum(part['rows'] for part in new_parts),
+            },
+            'mode': 'fast',
+            'profiled_at': datetime.now().isoformat()
+        }
+
+    def _drop_old_versions(self, database: str, table_name: str, version: int):
+        """Удалить состояния и водяные знаки предыдущих версий (выполняется асинхронно)"""
+        for table in (STATES_TABLE, WATERMARKS_TABLE):
+            self.client.command(
+                f"ALTER TABLE {table} DELETE "
+                f"WHERE database = '{database}' AND table_name = '{table_name}' AND version < {version}"
+            )
+
+    def _load_watermarks(self, database: str, table_name: str) -> Tuple[Optional[int], Dict[str, Dict[str, int]]]:
+        """Последняя версия состояний и обработанные блоки по партициям"""
+        query = f"""
+        SELECT version, partition_id, max_block, rows
+        FROM {WATERMARKS_TABLE} FINAL
+        WHERE database = '{database}' AND table_name = '{table_name}'
+          AND version = (
+              SELECT max(version) FROM {WATERMARKS_TABLE}
+              WHERE database = '{database}' AND table_name = '{table_name}'
+          )
+        """
+        rows = self.client.query(query).result_rows
+        if not rows:
+            return None, {}
+
+        return rows[0][0], {
+            partition_id: {'max_block': max_block, 'rows': part_rows}
+            for _, partition_id, max_block, part_rows in rows
+        }
+
+    def _get_active_parts(self, database: str, table_name: str) -> List[Dict[str, Any]]:
+        query = f"""
+        SELECT name, partition_id, min_block_number, max_block_number, rows
+        FROM system.parts
+        WHERE database = '{database}' AND table = '{table_name}' AND active
+        """
+        return [
+            {'name': row[0], 'partition_id': row[1], 'min_block': row[2], 'max_block': row[3], 'rows': row[4]}
+            for row in self.client.query(query).result_rows
+        ]
+
+    def _plan_update(self, parts: List[Dict[str, Any]], watermarks: Dict[str, Dict[str, int]]) -> Tuple[
+        List[Dict[str, Any]], bool]:
+        """Найти новые куски; вернуть признак полного пересчета, если старые данные изменились"""
+        new_parts = []
+        old_rows: Dict[str, int] = {}
+
+        for part in parts:
+            mark = watermarks.get(part['partition_id'])
+            if mark is None or part['min_block'] > mark['max_block']:
+                new_parts.append(part)
+            elif part['max_block'] <= mark['max_block']:
+                old_rows[part['partition_id']] = old_rows.get(part['partition_id'], 0) + part['rows']
+            else:
+                # Кусок содержит и обработанные, и новые блоки
+                return new_parts, True
+
+        for partition_id, mark in watermarks.items():
+            if old_rows.get(partition_id, 0) != mark['rows']:
+                return new_parts, True
+
+        return new_parts, False
+
+    def _state_tuple(self, col_name: str, col_type: str) -> str:
+        """Состояния агрегатов одной колонки в виде кортежа (для общего запроса по всем колонкам)"""
+        profiler = self.profiler
+        column = quote_identifier(col_name)
+        value = f"assumeNotNull({column})"
+        condition = f"isNotNull({column})"
+
+        if profiler._is_numeric_type(col_type):
+            number = f"toFloat64({value})"
+        elif profiler._is_string_type(col_type):
+            number = f"toFloat64(length({value}))"
+        else:
+            number = None
+
+        # Дисперсия - состоянием varPopStable: сумма квадратов теряет точность
+        # на больших значениях с малым разбросом (время, денежные идентификаторы)
+        if number is not None:
+            numeric_aggregates = f"""
+                sumIf({number}, {condition}),
+                varPopStableStateIf({number}, {condition}),
+                if(countIf({condition}) > 0, minIf({number}, {condition}), NULL),
+                if(countIf({condition}) > 0, maxIf({number}, {condition}), NULL),"""
+            quantiles_state = f"quantilesTDigestStateIf(0.25, 0.5, 0.75)({number}, {condition})"
+        else:
+            numeric_aggregates = """
+                toFloat64(0),
+                varPopStableStateIf(toFloat64(0), 0),
+                CAST(NULL, 'Nullable(Float64)'), CAST(NULL, 'Nullable(Float64)'),"""
+            quantiles_state = "quantilesTDigestStateIf(0.25, 0.5, 0.75)(toFloat64(0), 0)"
+
+        if profiler._is_date_type(col_type):
+            text_aggregates = f"""
+                if(countIf({condition}) > 0, minIf(toString({value}), {condition}), NULL),
+                if(countIf({condition}) > 0, maxIf(toString({value}), {condition}), NULL),"""
+        else:
+            text_aggregates = """
+                CAST(NULL, 'Nullable(String)'), CAST(NULL, 'Nullable(String)'),"""
+
+        return f"""tuple(
+                {quote_string(col_name)},
+                count(),
+                countIf(isNull({column})),{numeric_aggregates}{text_aggregates}
+                uniqCombinedStateIf(cityHash64({value}), {condition}),
+                {quantiles_state},
+                approx_top_kStateIf(10)(toString({value}), {condition})
+            )"""
+
+    def _append_states(self, database: str, table_name: str, version: int, columns: List[Tuple[str, str]],
+                       parts: List[Dict[str, Any]]):
+        """Посчитать состояния по новым кускам и дописать их в таблицу состояний
+
+        Состояния всех колонок считаются одним проходом по новым кускам
+        и разворачиваются в строки по колонкам через ARRAY JOIN.
+        """
+        if not parts or not columns:
+            return
+
+        part_names = ', '.join(f"'{part['name']}'" for part in parts)
+        states = ',\n            '.join(self._state_tuple(col_name, col_type) for col_name, col_type in columns)
+        fields = ', '.join(f"state.{i}" for i in range(1, len(STATE_COLUMNS) - 2))
+        self.client.command(f"""
+        INSERT INTO {STATES_TABLE} ({', '.join(STATE_COLUMNS)})
+        SELECT '{database}', '{table_name}', toUInt64({version}), {fields}
+        FROM (
+            SELECT [
+                {states}
+            ] AS states
+            FROM {database}.{table_name}
+            WHERE _part IN ({part_names})
+        )
+        ARRAY JOIN states AS state
+        """)
+
+    def _save_watermarks(self, database: str, table_name: str, version: int, parts: List[Dict[str, Any]],
+                         watermarks: Dict[str, Dict[str, int]], rebuild: bool) -> int:
+        """Обновить обработанные блоки по партициям; вернуть число учтенных строк"""
+        marks = {} if rebuild else {key: dict(value) for key, value in watermarks.items()}
+        for part in parts:
+            mark = marks.setdefault(part['partition_id'], {'max_block': 0, 'rows': 0})
+            if rebuild or part['partition_id'] not in watermarks or part['min_block'] > watermarks[
+                    part['partition_id']]['max_block']:
+                mark['rows'] += part['rows']
+            mark['max_block'] = max(mark['max_block'], part['max_block'])
+
+        if marks:
+            self.client.insert(
+                WATERMARKS_TABLE,
+                [
+                    [database, table_name, version, partition_id, mark['max_block'], mark['rows']]
+                    for partition_id, mark in marks.items()
+                ],
+                column_names=['database', 'table_name', 'version', 'partition_id', 'max_block', 'rows']
+            )
+
+        return sum(mark['rows'] for mark in marks.values())
+
+    def _merge_states(self, database: str, table_name: str, version: int, columns: List[Tuple[str, str]]) -> Tuple[
+        List[Dict[str, Any]], int]:
+        """Слить сохраненные состояния в статистику по колонкам"""
+        query = f"""
+        SELECT
+            column_name,
+            sum(total_count),
+            sum(null_count),
+            sum(value_sum),
+            varPopStableMerge(var_state),
+            min(value_min),
+            max(value_max),
+            min(text_min),
+            max(text_max),
+            uniqCombinedMerge(uniq_state),
+            quantilesTDigestMerge(0.25, 0.5, 0.75)(quantiles_state),
+            approx_top_kMerge(10)(top_state)
+        FROM {STATES_TABLE}
+        WHERE database = '{database}' AND table_name = '{table_name}' AND version = {version}
+        GROUP BY column_name
+        """
+        merged = {row[0]: row[1:] for row in self.client.query(query).result_rows}
+
+        column_stats = []
+        total_rows = 0
+        for col_name, col_type in columns:
+            if col_name not in merged:
+                continue
+            stats = self._unpack_merged(col_name, col_type, merged[col_name])
+            total_rows = max(total_rows, merged[col_name][0])
+            column_stats.append(stats)
+
+        return column_stats, total_rows
+
+    def _unpack_merged(self, col_name: str, col_type: str, values: Tuple[Any, ...]) -> Dict[str, Any]:
+        """Итоговая статистика колонки в формате column_stats"""
+        profiler = self.profiler
+        (total, nulls, value_sum, variance, value_min, value_max,
+         text_min, text_max, unique_count, quartiles, top_values) = values
+        non_null = total - nulls
+
+        stats = {
+            'column_name': col_name,
+            'data_type': col_type,
+            'inferred_type': profiler._infer_data_type(col_type),
+            'null_count': nulls,
+            'null_percentage': round((nulls / total * 100) if total > 0 else 0, 2),
+            'unique_count': unique_count,
+            'unique_percentage': round((unique_count / non_null * 100) if non_null > 0 else 0, 2),
+        }
+
+        mean = value_sum / non_null if non_null > 0 else None
+        if mean is None or variance != variance:
+            variance = None
+
+        if profiler._is_numeric_type(col_type):
+            quartiles = quartiles or [None, None, None]
+            stats.update({
+                'min': value_min,
+                'max': value_max,
+                'mean': mean,
+                'median': quartiles[1],
+                'q1': quartiles[0],
+                'q3': quartiles[2],
+                'std_dev': variance ** 0.5 if variance is not None else None,
+                'variance': variance
+            })
+        elif profiler._is_string_type(col_type):
+            stats.update({
+                'min_length': int(value_min) if value_min is not None else None,
+                'max_length': int(value_max) if value_max is not None else None,
+                'avg_length': mean
+            })
+        elif profiler._is_date_type(col_type):
+            stats.update({
+                'min_date': text_min,
+                'max_date': text_max,
+                'range_days': (
+                    (date.fromisoformat(text_max[:10]) - date.fromisoformat(text_min[:10])).days
+                    if text_min and text_max else None
+                )
+            })
+
+        stats['top_values'] = profiler._unpack_approx_top_values(top_values, total, nulls)
+        stats.update(profiler._approximation_error_bounds(stats))
+        return stats
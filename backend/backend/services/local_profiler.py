@@ -0,0 +1,321 @@
+# backend/backend/services/local_profiler.py
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .string_patterns import count_patterns, significant_patterns
+from .parquet_staging import is_staged, staged_path
+from .streaming_validator import iter_file_chunks
+
+# Псевдо-база данных, под которой в списке таблиц показываются загруженные файлы
+LOCAL_DATABASE = 'local'
+
+# Папка с загруженными файлами
+UPLOADS_DIR = 'data/uploads'
+
+LOCAL_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.parquet')
+
+# Больше строк в память не читается, даже если выборка не задана
+LOCAL_MAX_ROWS = 1_000_000
+
+
+def _readable_size(size: int) -> str:
+    """Размер в байтах в читаемом виде (как formatReadableSize в ClickHouse)"""
+    value = float(size)
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f"{value:.2f} {unit}"
+        value /= 1024
+    return f"{value:.2f} TiB"
+
+
+class LocalProfiler:
+    """Профилирование загруженных файлов без загрузки в ClickHouse
+
+    Статистика считается векторно в pandas/NumPy на выборке из ~sample_size строк
+    и возвращается в том же формате, что и DataProfilerService.profile_table.
+    Если у файла есть Parquet-копия, читается она (через отображение в память).
+    Типы колонок называются как в ClickHouse, чтобы работали общие проверки типов.
+    """
+
+    def __init__(self, profiler, uploads_dir: str = UPLOADS_DIR):
+        self.profiler = profiler
+        self.uploads_dir = uploads_dir
+
+    def _path(self, dataset_name: str) -> str:
+        path = os.path.join(self.uploads_dir, os.path.basename(dataset_name))
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл {dataset_name} не найден")
+        return path
+
+    def list_datasets(self) -> List[Dict[str, Any]]:
+        """Загруженные файлы в формате get_tables_list (Parquet-копии не показываются)"""
+        if not os.path.isdir(self.uploads_dir):
+            return []
+
+        names = sorted(name for name in os.listdir(self.uploads_dir) if name.endswith(LOCAL_EXTENSIONS))
+        staged = {
+            os.path.basename(staged_path(os.path.join(self.uploads_dir, name)))
+            for name in names if not name.endswith('.parquet')
+        }
+
+        datasets = []
+        for name in names:
+            if name in staged:
+                continue
+            path = os.path.join(self.uploads_dir, name)
+            total_rows = 0
+            if name.endswith('.parquet') or is_staged(path):
+                total_rows = pq.ParquetFile(staged_path(path)).metadata.num_rows
+            total_bytes = os.path.getsize(path)
+            datasets.append({
+                'database': LOCAL_DATABASE,
+                'table_name': name,
+                'total_rows': total_rows,
+                'total_bytes': total_bytes,
+                'size_readable': _readable_size(total_bytes)
+            })
+        return datasets
+
+    def _load(self, dataset_name: str, sample_size: Optional[int],
+              columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, int]:
+        """Данные файла (выборка, если строк больше sample_size) и полное число строк
+
+        Файл целиком в память не читается: из Parquet берутся случайные группы
+        строк (пока их не хватит на выборку), остальные форматы читаются порциями
+        с отбором строк с наименьшими случайными ключами (bottom-k). Размер выборки
+        ограничен LOCAL_MAX_ROWS.
+        """
+        path = self._path(dataset_name)
+        sample_size = min(sample_size or LOCAL_MAX_ROWS, LOCAL_MAX_ROWS)
+        rng = np.random.default_rng(0)
+
+        if path.endswith('.parquet') or is_staged(path):
+            parquet_file = pq.ParquetFile(staged_path(path), memory_map=True)
+            row_count = parquet_file.metadata.num_rows
+            if row_count <= sample_size:
+                return parquet_file.read(columns=columns).to_pandas(), row_count
+
+            # Выборка кластерная по группам строк, зато читается только ее объем
+            groups, group_rows = [], 0
+            for group in rng.permutation(parquet_file.num_row_groups):
+                groups.append(int(group))
+                group_rows += parquet_file.metadata.row_group(int(group)).num_rows
+                if group_rows >= sample_size:
+                    break
+            table = parquet_file.read_row_groups(sorted(groups), columns=columns)
+            indices = np.sort(rng.choice(table.num_rows, size=sample_size, replace=False))
+            return table.take(pa.array(indices)).to_pandas(), row_count
+
+        sample, row_count = None, 0
+        for chunk in iter_file_chunks(path):
+            chunk.columns = [str(column) for column in chunk.columns]
+            if columns is not None:
+                chunk = chunk[columns]
+            chunk.index = pd.RangeIndex(row_count, row_count + len(chunk))
+            row_count += len(chunk)
+            keys = pd.Series(rng.random(len(chunk)), index=chunk.index)
+            candidates = chunk if sample is None else pd.concat([sample[0], chunk])
+            candidate_keys = keys if sample is None else pd.concat([sample[1], keys])
+            kept = candidate_keys.nsmallest(sample_size).index
+            sample = (candidates.loc[kept], candidate_keys.loc[kept])
+
+        if sample is None:
+            return pd.DataFrame(columns=columns or []), 0
+        return sample[0].sort_index(), row_count
+
+    def _column_type(self, values: pd.Series) -> str:
+        """Тип колонки в терминах ClickHouse"""
+        if pd.api.types.is_bool_dtype(values):
+            col_type = 'Bool'
+        elif pd.api.types.is_integer_dtype(values):
+            col_type = 'Int64'
+        elif pd.api.types.is_float_dtype(values):
+            col_type = 'Float64'
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            col_type = 'DateTime'
+        else:
+            col_type = 'String'
+        return f"Nullable({col_type})" if values.isna().any() else col_type
+
+    def profile(self, dataset_name: str, sample_size: int = 10000, mode: str = 'exact',
+                correlation_method: str = 'pearson', bins: int = 20) -> Dict[str, Any]:
+        """Профилирование файла в формате profile_table"""
+        path = self._path(dataset_name)
+        df, row_count = self._load(dataset_name, sample_size)
+        columns = [{'name': str(column), 'type': self._column_type(df[column]), 'default_type': '',
+                    'default_expression': '', 'comment': ''} for column in df.columns]
+
+        total_bytes = os.path.getsize(path)
+        general_stats = {
+            'row_count': row_count,
+            'column_count': len(columns),
+            'total_bytes': total_bytes,
+            'size_readable': _readable_size(total_bytes)
+        }
+
+        column_stats = [self._column_stats(df[column['name']], column['type']) for column in columns]
+
+        sampled = len(df) < row_count
+        sampling = {
+            'method': 'sample' if sampled else 'full',
+            'fraction': len(df) / row_count if row_count else 1.0,
+            'sample_rows': len(df)
+        }
+        if sampled:
+            self.profiler._confidence_margins(column_stats, len(df))
+            sampling['max_null_margin'] = max(
+                (col.get('null_percentage_margin', 0) for col in column_stats), default=0)
+
+        return {
+            'table_info': {'columns': columns},
+            'general_stats': general_stats,
+            'column_stats': column_stats,
+            'data_patterns': self._data_patterns(df, columns, correlation_method),
+            'distributions': self._distributions(df, column_stats, bins),
+            'sampling': sampling,
+            'mode': mode,
+            'profiled_at': datetime.now().isoformat()
+        }
+
+    def _distributions(self, df: pd.DataFrame, column_stats: List[Dict[str, Any]],
+                       bins: int) -> Dict[str, Dict[str, Any]]:
+        """Распределения всех колонок (шкала linear); категориальные - из top_values"""
+        distributions = {}
+        for stats in column_stats:
+            if 'error' in stats:
+                continue
+            if self.profiler._is_numeric_type(stats['data_type']):
+                distributions[stats['column_name']] = self._distribution(df[stats['column_name']], bins, 'linear')
+            elif stats.get('top_values'):
+                distributions[stats['column_name']] = self.profiler._distribution_from_top_values(stats['top_values'])
+        return distributions
+
+    def _column_stats(self, values: pd.Series, col_type: str) -> Dict[str, Any]:
+        """Статистика колонки в формате column_stats"""
+        profiler = self.profiler
+        total_count = len(values)
+        non_null = values.dropna()
+        null_count = total_count - len(non_null)
+        unique_count = int(non_null.nunique())
+
+        stats = {
+            'column_name': str(values.name),
+            'data_type': col_type,
+            'inferred_type': profiler._infer_data_type(col_type),
+            'null_count': int(null_count),
+            'null_percentage': round((null_count / total_count * 100) if total_count > 0 else 0, 2),
+            'unique_count': unique_count,
+            'unique_percentage': round((unique_count / len(non_null) * 100) if len(non_null) > 0 else 0, 2),
+        }
+
+        try:
+            if profiler._is_numeric_type(col_type):
+                numbers = non_null.astype('float64')
+                q1, median, q3 = (numbers.quantile([0.25, 0.5, 0.75]).tolist()
+                                  if len(numbers) else (None, None, None))
+                for key, value in (('min', numbers.min()), ('max', numbers.max()), ('mean', numbers.mean()),
+                                   ('median', median), ('q1', q1), ('q3', q3),
+                                   ('std_dev', numbers.std(ddof=0)), ('variance', numbers.var(ddof=0))):
+                    stats[key] = float(value) if value is not None and not pd.isna(value) else None
+            elif profiler._is_string_type(col_type):
+                lengths = non_null.astype(str).str.len()
+                stats['min_length'] = int(lengths.min()) if len(lengths) else None
+                stats['max_length'] = int(lengths.max()) if len(lengths) else None
+                stats['avg_length'] = float(lengths.mean()) if len(lengths) else None
+                stats['patterns'] = significant_patterns(count_patterns(non_null), len(non_null))
+            elif profiler._is_date_type(col_type):
+                stats['min_date'] = str(non_null.min()) if len(non_null) else None
+                stats['max_date'] = str(non_null.max()) if len(non_null) else None
+                stats['range_days'] = int((non_null.max() - non_null.min()).days) if len(non_null) else None
+
+            stats['top_values'] = self._top_values(values, 10)
+        except Exception as e:
+            stats['error'] = str(e)
+
+        return stats
+
+    def _top_values(self, values: pd.Series, limit: int) -> List[Dict[str, Any]]:
+        """Топ значений (NULL как строка 'NULL')"""
+        counts = values.astype(object).where(values.notna(), 'NULL').astype(str).value_counts().head(limit)
+        total = len(values)
+        return [
+            {'value': value, 'count': int(count), 'percentage': round(count * 100.0 / total, 2) if total else 0}
+            for value, count in counts.items()
+        ]
+
+    def _data_patterns(self, df: pd.DataFrame, columns: List[Dict[str, Any]],
+                       correlation_method: str) -> Dict[str, Any]:
+        """Матрица корреляций числовых колонок (NULL исключаются попарно)"""
+        numeric_columns = [col['name'] for col in columns if self.profiler._is_numeric_type(col['type'])]
+        try:
+            matrix_df = df[numeric_columns].astype('float64').corr(method=correlation_method)
+        except Exception as e:
+            return {'error': str(e)}
+
+        matrix = [
+            [None if pd.isna(value) else round(float(value), 3) for value in row]
+            for row in matrix_df.to_numpy().tolist()
+        ]
+        correlations = {
+            f"{numeric_columns[i]}_vs_{numeric_columns[j]}": matrix[i][j]
+            for i in range(len(numeric_columns))
+            for j in range(i + 1, len(numeric_columns))
+            if matrix[i][j] is not None and abs(matrix[i][j]) > 0.5
+        }
+        return {
+            'high_correlations': correlations,
+            'correlation_matrix': {
+                'method': correlation_method,
+                'columns': numeric_columns,
+                'values': matrix
+            },
+            'numeric_columns_count': len(numeric_columns)
+        }
+
+    def get_column_distribution(self, dataset_name: str, column_name: str, bins: int = 20,
+                                sample_size: Optional[int] = None, scale: str = 'linear') -> Dict[str, Any]:
+        """Распределение колонки файла в формате get_column_distribution"""
+        df, _ = self._load(dataset_name, sample_size, columns=[column_name])
+        return self._distribution(df[column_name], bins, scale)
+
+    def _distribution(self, values: pd.Series, bins: int, scale: str) -> Dict[str, Any]:
+        """Гистограмма числовой колонки или частоты значений остальных"""
+        if not self.profiler._is_numeric_type(self._column_type(values)):
+            counts = values.astype(object).where(values.notna(), 'NULL').astype(str).value_counts().head(bins)
+            total = counts.sum()
+            return {
+                'type': 'categorical',
+                'values': counts.index.tolist(),
+                'counts': counts.tolist(),
+                'percentages': (np.round(counts.to_numpy() / total * 100, 2) if total > 0
+                                else np.zeros(len(counts))).tolist()
+            }
+
+        numbers = values.dropna().astype('float64').to_numpy()
+        if len(numbers) == 0:
+            return {'type': 'numeric', 'scale': scale, 'bins': [], 'counts': [], 'percentages': []}
+        min_val, max_val = float(numbers.min()), float(numbers.max())
+        if min_val == max_val:
+            return {'type': 'numeric', 'scale': scale, 'bins': [str(min_val)], 'counts': [1], 'percentages': [100.0]}
+
+        quantile_edges = np.quantile(numbers, np.linspace(0, 1, bins + 1)).tolist() if scale == 'quantile' else []
+        edges = self.profiler._distribution_edges(min_val, max_val, bins, scale, quantile_edges)
+        if scale == 'quantile':
+            # Как на сервере: номер бина - число внутренних границ не больше значения
+            counts = np.bincount(np.searchsorted(edges[1:-1], numbers, side='right'), minlength=bins)
+        else:
+            counts, _ = np.histogram(numbers, bins=edges)
+
+        total = counts.sum()
+        return {
+            'type': 'numeric',
+            'scale': scale,
+            'bins': [f"{start:.2f}-{end:.2f}" for start, end in zip(edges[:-1], edges[1:])],
+            'edges': edges.tolist(),
+            'counts': counts.tolist(),
+            'percentages': (np.round(counts / total * 100, 2) if total > 0 else np.zeros(bins)).tolist()
+        }
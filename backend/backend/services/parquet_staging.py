@@ -0,0 +1,162 @@
+# backend/backend/services/parquet_staging.py
+from typing import Iterator, Optional, List
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Сжатие колоночной копии загруженного файла
+PARQUET_COMPRESSION = 'zstd'
+
+
+def staged_path(file_path: str) -> str:
+    """Путь к колоночной копии рядом с исходным файлом
+
+    Расширение исходного файла сохраняется (sales.csv -> sales.csv.parquet),
+    чтобы копии sales.csv и sales.xlsx не перезаписывали друг друга.
+    Для файла Parquet копией служит он сам.
+    """
+    if file_path.endswith('.parquet'):
+        return file_path
+    return file_path + '.parquet'
+
+
+def is_staged(file_path: str) -> bool:
+    """Есть ли колоночная копия не старее исходного файла"""
+    path = staged_path(file_path)
+    return (
+        path != file_path
+        and os.path.exists(path)
+        and os.path.getmtime(path) >= os.path.getmtime(file_path)
+    )
+
+
+def iter_parquet_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Прочитать Parquet порциями через отображение файла в память"""
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def _promote_type(left: pa.DataType, right: pa.DataType) -> pa.DataType:
+    """Общий тип для двух порций: null -> любой, целые -> float64, иначе строка"""
+    if left == right:
+        return left
+    if pa.types.is_null(left):
+        return right
+    if pa.types.is_null(right):
+        return left
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(left) for check in numeric) and any(check(right) for check in numeric):
+        if pa.types.is_integer(left) and pa.types.is_integer(right):
+            return pa.int64()
+        return pa.float64()
+    return pa.string()
+
+
+def _promote_schema(left: pa.Schema, right: pa.Schema) -> pa.Schema:
+    return pa.schema([
+        pa.field(field.name, _promote_type(field.type, right.field(field.name).type))
+        for field in left
+    ])
+
+
+def _to_arrow(chunk: pd.DataFrame) -> pa.Table:
+    """Порция в Arrow; object-колонки со значениями разных типов приводятся к строке"""
+    try:
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        chunk = chunk.copy()
+        for column in chunk.columns:
+            if chunk[column].dtype == 'object':
+                chunk[column] = chunk[column].where(chunk[column].isna(), chunk[column].astype(str))
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+
+
+class ParquetStager:
+    """Запись загруженного файла в Parquet по мере чтения порций.
+
+    Схема берется из первой порции. Если очередная порция с ней несовместима
+    (например, в целой колонке появились пропуски или текст), схема
+    расширяется и следующие порции пишутся в новый сегмент. Уже записанное
+    не переписывается: при close() сегменты сливаются в один файл
+    по батчам с приведением к итоговой схеме, без чтения файла целиком.
+    """
+
+    def __init__(self, path: str, compression: str = PARQUET_COMPRESSION):
+        self.path = path
+        self.compression = compression
+        self.row_count = 0
+        self.columns: List[str] = []
+        self._tmp_path = path + '.tmp'
+        self._segments: List[str] = []
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def _open_segment(self, schema: pa.Schema):
+        """Начать новый сегмент с заданной схемой"""
+        if self._writer is not None:
+            self._writer.close()
+        segment = f"{self._tmp_path}.{len(self._segments)}"
+        self._segments.append(segment)
+        self._writer = pq.ParquetWriter(segment, schema, compression=self.compression)
+
+    def write(self, chunk: pd.DataFrame):
+        """Дописать порцию"""
+        chunk.columns = [str(column) for column in chunk.columns]
+        table = _to_arrow(chunk)
+        if self._writer is None:
+            self.columns = list(chunk.columns)
+            self._open_segment(table.schema)
+        elif not table.schema.equals(self._writer.schema):
+            table = self._conform(table)
+        self._writer.write_table(table)
+        self.row_count += table.num_rows
+
+    def _conform(self, table: pa.Table) -> pa.Table:
+        """Привести порцию к схеме файла, при необходимости открыв сегмент с расширенной схемой"""
+        table = table.select(self._writer.schema.names)
+        try:
+            return table.cast(self._writer.schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+
+        schema = _promote_schema(self._writer.schema, table.schema)
+        self._open_segment(schema)
+        return table.cast(schema)
+
+    def _merge_segments(self, schema: pa.Schema):
+        """Слить сегменты в один файл, приводя батчи к итоговой схеме"""
+        with pq.ParquetWriter(self._tmp_path, schema, compression=self.compression) as writer:
+            for segment in self._segments:
+                for batch in pq.ParquetFile(segment, memory_map=True).iter_batches():
+                    writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        self._remove_segments()
+
+    def _remove_segments(self):
+        for segment in self._segments:
+            if os.path.exists(segment):
+                os.remove(segment)
+        self._segments = []
+
+    def close(self) -> str:
+        """Завершить запись и атомарно заменить копию; возвращает путь к файлу"""
+        if self._writer is not None:
+            # Схема последнего сегмента - расширение схем всех предыдущих
+            schema = self._writer.schema
+            self._writer.close()
+            self._writer = None
+            if len(self._segments) == 1:
+                os.replace(self._segments.pop(), self.path)
+            else:
+                self._merge_segments(schema)
+                os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        """Прервать запись и удалить временные файлы"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._remove_segments()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
@@ -0,0 +1,122 @@
+# backend/backend/services/profile_cache.py
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+
+class ProfileCache:
+    """LRU-кэш результатов профилирования с ограничением по размеру
+
+    Записи хранятся в памяти и дублируются на диск (по файлу на запись),
+    поэтому кэш переживает перезапуск приложения. Каждая запись привязана
+    к отпечатку активных кусков таблицы: если куски изменились, запись
+    считается устаревшей и удаляется при чтении.
+    """
+
+    def __init__(self, cache_dir: str = 'data/profile_cache', max_entries: int = 200,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(database: str, table_name: str, **params: Any) -> str:
+        """Ключ записи: таблица + параметры профилирования"""
+        raw = json.dumps([database, table_name, sorted(params.items())], default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Получить результат, если он посчитан для тех же кусков таблицы"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['fingerprint'] != fingerprint:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            try:
+                os.utime(self._file_path(key))
+            except OSError:
+                pass
+            return json.loads(entry['payload'])
+
+    def put(self, key: str, fingerprint: str, result: Dict[str, Any]):
+        """Сохранить результат профилирования"""
+        payload = json.dumps(result, default=str)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {'fingerprint': fingerprint, 'payload': payload, 'size': size}
+            self._total_bytes += size
+            self._write_file(key, fingerprint, payload)
+            self._evict()
+
+    def invalidate(self, key: Optional[str] = None):
+        """Удалить запись или очистить кэш целиком"""
+        with self._lock:
+            keys = [key] if key else list(self._entries)
+            for k in keys:
+                if k in self._entries:
+                    self._remove(k)
+
+    def _evict(self):
+        """Вытеснить давно неиспользуемые записи сверх лимитов"""
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry['size']
+        try:
+            os.remove(self._file_path(key))
+        except OSError:
+            pass
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _write_file(self, key: str, fingerprint: str, payload: str):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._file_path(key), 'w', encoding='utf-8') as f:
+                f.write(fingerprint + '\n' + payload)
+        except OSError as e:
+            print(f"Ошибка записи кэша профилирования: {e}")
+
+    def _load(self):
+        """Загрузить записи с диска, от давно использованных к недавним"""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        files = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith('.json')
+        ]
+        for path in sorted(files, key=os.path.getmtime):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    fingerprint, payload = f.read().split('\n', 1)
+            except (OSError, ValueError):
+                continue
+
+            key = os.path.basename(path)[:-len('.json')]
+            self._entries[key] = {'fingerprint': fingerprint, 'payload': payload, 'size': len(payload)}
+            self._total_bytes += len(payload)
+
+        self._evict()
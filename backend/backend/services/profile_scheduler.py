@@ -0,0 +1,294 @@
+# backend/backend/services/profile_scheduler.py
+from typing import Dict, List, Any, Optional, Set, Tuple
+from datetime import datetime
+import fcntl
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from .clickhouse_service import clickhouse_service, ClickHouseService
+from .drift_detector import save_column_profiles
+
+# Таблица с историей профилей (один снимок на запуск)
+PROFILES_TABLE = 'datagate.table_profiles'
+
+# Приоритеты задач: меньше - раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# Расписание по умолчанию: каждую ночь в 03:00, вне рабочей нагрузки
+DEFAULT_PROFILE_SCHEDULE = '0 3 * * *'
+
+# Служебные таблицы, которые не профилируются по расписанию базы
+SERVICE_TABLES = {
+    'data_quality_checks', 'uploaded_datasets', 'validation_rules', 'table_profiles',
+    'column_profiles', 'profile_column_states', 'profile_column_states_v2', 'profile_watermarks'
+}
+
+# Как часто (в секундах) проверять расписания
+SCHEDULER_TICK = 20
+
+# Файловая блокировка: расписания проверяет только один процесс бэкенда
+SCHEDULER_LOCK_PATH = 'data/profile_scheduler.lock'
+
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+
+def profile_status(result: Dict[str, Any]) -> str:
+    """Статус снимка: error - профиль не построен, partial - есть колонки с ошибками"""
+    if 'error' in result:
+        return 'error'
+    if any('error' in stats for stats in result.get('column_stats', [])):
+        return 'partial'
+    return 'ok'
+
+
+class CronSchedule:
+    """Расписание в формате cron из пяти полей: минута час день месяц день_недели
+
+    Поддерживаются *, списки (1,15), диапазоны (1-5) и шаги (*/15, 0-30/10).
+    День недели: 0 или 7 - воскресенье.
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError(f"Ожидается 5 полей cron, получено {len(parts)}: {expression}")
+        self.expression = expression
+        self.fields: Dict[str, Set[int]] = {
+            name: self._parse_field(part, name, low, high)
+            for part, (name, low, high) in zip(parts, CRON_FIELDS)
+        }
+
+    @staticmethod
+    def _parse_field(field: str, name: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in field.split(','):
+            range_part, _, step_part = item.partition('/')
+            step = int(step_part) if step_part else 1
+            if range_part == '*':
+                start, end = low, high
+            elif '-' in range_part:
+                start, end = (int(value) for value in range_part.split('-', 1))
+            else:
+                start = end = int(range_part)
+                if step_part:
+                    end = high
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Неверное значение поля {name}: {item}")
+            values.update(range(start, end + 1, step))
+        if name == 'weekday' and 7 in values:
+            values.discard(7)
+            values.add(0)
+        return values
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.fields['minute']
+            and moment.hour in self.fields['hour']
+            and moment.day in self.fields['day']
+            and moment.month in self.fields['month']
+            and (moment.isoweekday() % 7) in self.fields['weekday']
+        )
+
+
+class ProfileScheduler:
+    """Фоновое профилирование таблиц по очереди с приоритетами
+
+    Задачи выполняются пулом рабочих потоков, каждый на своем клиенте
+    из пула профайлера. Таблица, которая уже стоит в очереди или
+    профилируется, повторно не добавляется. Расписания задаются в формате
+    cron для таблицы или для всех таблиц базы (table_name=None). Результаты
+    сохраняются в PROFILES_TABLE, откуда интерфейс берет последний снимок,
+    а статистика колонок - в COLUMN_PROFILES_TABLE для поиска дрейфа.
+
+    Очередь и дедупликация работают внутри процесса. Чтобы при нескольких
+    процессах бэкенда таблицы не профилировались по расписанию в каждом,
+    расписания проверяет только процесс, захвативший блокировку lock_path;
+    остальные выполняют лишь задачи, поставленные вручную через submit.
+    """
+
+    def __init__(self, profiler, service: ClickHouseService = clickhouse_service, workers: int = 2,
+                 lock_path: str = SCHEDULER_LOCK_PATH):
+        self.profiler = profiler
+        self.service = service
+        self.workers = workers
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._queue: 'queue.PriorityQueue[Tuple[int, int, Dict[str, Any]]]' = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending: Set[Tuple[str, str]] = set()
+        self._pending_lock = threading.Lock()
+        self._schedules: List[Dict[str, Any]] = []
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Запустить рабочие потоки и (в процессе с блокировкой) проверку расписаний"""
+        if self._threads and not self._stopped.is_set():
+            return
+        # Потоки прошлого запуска должны выйти до сброса флага, иначе они продолжат работу
+        self._join()
+        self._stopped.clear()
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f'profile-worker-{i}', daemon=True))
+        if self._acquire_lock():
+            self._threads.append(threading.Thread(target=self._tick, name='profile-scheduler', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, wait: bool = True):
+        """Остановить потоки; с wait=True дождаться, пока текущие задачи доработают"""
+        self._stopped.set()
+        self._release_lock()
+        if wait:
+            self._join()
+
+    def _join(self):
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _acquire_lock(self) -> bool:
+        """Захватить блокировку расписаний (False, если ее держит другой процесс)"""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def submit(self, database: str, table_name: str, priority: int = PRIORITY_NORMAL, **params: Any) -> bool:
+        """Поставить профилирование таблицы в очередь; False, если оно уже запланировано"""
+        key = (database, table_name)
+        with self._pending_lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        job = {'database': database, 'table_name': table_name, 'params': params}
+        self._queue.put((priority, next(self._sequence), job))
+        return True
+
+    def schedule(self, database: str, table_name: Optional[str] = None, cron: str = DEFAULT_PROFILE_SCHEDULE,
+                 priority: int = PRIORITY_LOW, **params: Any):
+        """Профилировать таблицу (или все таблицы базы) по расписанию cron"""
+        self._schedules.append({
+            'database': database,
+            'table_name': table_name,
+            'cron': CronSchedule(cron),
+            'priority': priority,
+            'params': params,
+            'last_run': None
+        })
+
+    def pending(self) -> List[Tuple[str, str]]:
+        """Таблицы в очереди или в работе"""
+        with self._pending_lock:
+            return sorted(self._pending)
+
+    def _tick(self):
+        while not self._stopped.wait(SCHEDULER_TICK):
+            now = datetime.now().replace(second=0, microsecond=0)
+            for schedule in self._schedules:
+                if schedule['last_run'] == now or not schedule['cron'].matches(now):
+                    continue
+                schedule['last_run'] = now
+                try:
+                    tables = ([schedule['table_name']] if schedule['table_name'] else [
+                        table['table_name'] for table in self.service.catalog.tables(schedule['database'])
+                        if table['table_name'] not in SERVICE_TABLES
+                    ])
+                except Exception as e:
+                    print(f"Ошибка получения таблиц для расписания: {e}")
+                    continue
+                for table_name in tables:
+                    self.submit(schedule['database'], table_name, schedule['priority'], **schedule['params'])
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                _, _, job = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard((job['database'], job['table_name']))
+                self._queue.task_done()
+
+    def _run(self, job: Dict[str, Any]):
+        database, table_name, params = job['database'], job['table_name'], job['params']
+        started = time.monotonic()
+        try:
+            result = self.profiler._run_pooled(lambda svc: svc.profile_table(database, table_name, **params))
+        except Exception as e:
+            result = {'error': str(e)}
+        self.save_snapshot(database, table_name, result, int((time.monotonic() - started) * 1000))
+
+    def save_snapshot(self, database: str, table_name: str, result: Dict[str, Any], duration_ms: int = 0) -> bool:
+        """Сохранить результат профилирования в историю (и снимки колонок для поиска дрейфа)"""
+        profiled_at = datetime.now()
+        try:
+            self.service.execute_insert(
+                f"INSERT INTO {PROFILES_TABLE} "
+                "(database, table_name, profiled_at, status, duration_ms, row_count, profile) VALUES",
+                [(
+                    database,
+                    table_name,
+                    profiled_at,
+                    profile_status(result),
+                    duration_ms,
+                    int(result.get('general_stats', {}).get('row_count', 0) or 0),
+                    json.dumps(result, default=str, ensure_ascii=False)
+                )]
+            )
+            # Для дрейфа сравниваются только профили всей таблицы, не отдельных партиций
+            if 'error' not in result and 'partition_filter' not in result.get('general_stats', {}):
+                save_column_profiles(database, table_name, result, profiled_at, self.service)
+            return True
+        except Exception as e:
+            print(f"Ошибка сохранения профиля: {e}")
+            return False
+
+    def latest_profile(self, database: str, table_name: str) -> Optional[Dict[str, Any]]:
+        """Последний снимок профиля таблицы (ok или partial, без неудачных запусков)"""
+        rows = self.service.execute_query(
+            f"""
+            SELECT profile, toString(profiled_at)
+            FROM {PROFILES_TABLE}
+            WHERE database = %(database)s AND table_name = %(table)s AND status IN ('ok', 'partial')
+            ORDER BY profiled_at DESC
+            LIMIT 1
+            """,
+            {'database': database, 'table': table_name}
+        )
+        if not rows:
+            return None
+        try:
+            profile = json.loads(rows[0][0])
+        except ValueError as e:
+            print(f"Ошибка чтения профиля: {e}")
+            return None
+        profile['snapshot_at'] = rows[0][1]
+        return profile
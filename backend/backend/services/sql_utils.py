@@ -0,0 +1,13 @@
+# backend/backend/services/sql_utils.py
+# Экранирование имен и литералов в генерируемом SQL ClickHouse.
+# Модуль без зависимостей: его импортируют и сервисы ClickHouse, и валидация.
+
+
+def quote_identifier(name: str) -> str:
+    """Имя колонки в обратных кавычках с экранированием"""
+    return '`' + name.replace('\\', '\\\\').replace('`', '\\`') + '`'
+
+
+def quote_string(value) -> str:
+    """Строковый литерал ClickHouse"""
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
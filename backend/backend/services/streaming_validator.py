@@ -0,0 +1,83 @@
+import pandas as pd
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from .duplicate_detector import DuplicateDetector
+from .validation_rules import RuleEngine, MetricKey
+from .type_inference import TypeInference
+from .parquet_staging import is_staged, staged_path, iter_parquet_chunks
+
+# Размер порции (в строках) при потоковом чтении CSV
+CSV_CHUNK_ROWS = 100_000
+
+
+def iter_file_chunks(file_path: str, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Прочитать файл порциями; Excel читается целиком (потоковое чтение не поддерживается).
+
+    Если рядом есть актуальная Parquet-копия, читается она.
+    """
+    if file_path.endswith('.parquet') or is_staged(file_path):
+        yield from iter_parquet_chunks(staged_path(file_path), chunksize)
+    elif file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif file_path.endswith(('.xlsx', '.xls')):
+        yield pd.read_excel(file_path)
+    else:
+        raise ValueError("Поддерживаются только CSV и Excel файлы")
+
+
+class StreamingValidator:
+    """Валидация данных по порциям с накопительными счетчиками.
+
+    Хранит только агрегаты (число строк, счетчики ошибок по метрикам правил,
+    хэши строк для поиска дубликатов), поэтому файл не нужно держать в памяти
+    целиком. Результаты совпадают с проверкой всего DataFrame сразу.
+    Правила передаются обычными словарями (см. validation_rules), по умолчанию
+    используются DEFAULT_RULES. С approximate_duplicates=True дубликаты
+    ищутся фильтром Блума. Типы колонок выводятся по выборке первой порции
+    и доступны в inferred_types.
+    """
+
+    def __init__(self, dataset_name: str, table_name: str = 'uploaded_data',
+                 rules: Optional[List[Dict[str, Any]]] = None, approximate_duplicates: bool = False):
+        self.dataset_name = dataset_name
+        self.table_name = table_name
+        self.engine = RuleEngine(rules)
+        self.row_count = 0
+        self.columns: List[str] = []
+        self.error_counts: Dict[Tuple[str, MetricKey], int] = {}
+        self.object_columns: set = set()
+        self.types = TypeInference()
+        self.duplicates = DuplicateDetector(approximate=approximate_duplicates)
+
+    def update(self, chunk: pd.DataFrame):
+        """Учесть очередную порцию данных."""
+        if not self.columns:
+            self.columns = [str(column) for column in chunk.columns]
+        chunk.columns = [str(column) for column in chunk.columns]
+        chunk = chunk[self.columns]
+
+        self.row_count += len(chunk)
+        self.object_columns.update(column for column in self.columns if chunk[column].dtype == 'object')
+        for column in self.columns:
+            self.types.infer(column, chunk[column])
+        self.engine.count_chunk(chunk, self.error_counts, self.types)
+
+        if self.engine.checks_duplicates:
+            self.duplicates.update(chunk)
+
+    @property
+    def inferred_types(self) -> Dict[str, str]:
+        """Выведенные типы колонок."""
+        return dict(self.types.types)
+
+    @property
+    def duplicate_count(self) -> int:
+        return self.duplicates.duplicate_count if self.engine.checks_duplicates else 0
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Результаты проверок по всем учтенным порциям."""
+        duplicate_count = self.duplicate_count
+        self.duplicates.close()
+        return self.engine.results(
+            self.columns, self.error_counts, self.row_count, duplicate_count,
+            self.object_columns, self.dataset_name, self.table_name
+        )
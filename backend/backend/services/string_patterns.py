@@ -0,0 +1,90 @@
+# backend/backend/services/string_patterns.py
+from typing import Dict, List, Any
+import re
+import pandas as pd
+
+# Паттерны проверяются по порядку, значение относится к первому совпавшему.
+# Регулярные выражения совместимы и с Python re, и с RE2 (функция match в ClickHouse).
+STRING_PATTERNS: List[Dict[str, Any]] = []
+
+# Порог (в процентах), ниже которого паттерн не считается значимым
+SIGNIFICANT_PATTERN_PERCENTAGE = 10
+
+
+def register_string_pattern(name: str, regex: str, min_length: int = 0):
+    """Добавить паттерн в реестр (или заменить существующий с тем же именем)"""
+    pattern = {
+        'name': name,
+        'regex': regex,
+        'min_length': min_length,
+        'compiled': re.compile(regex)
+    }
+    for i, existing in enumerate(STRING_PATTERNS):
+        if existing['name'] == name:
+            STRING_PATTERNS[i] = pattern
+            return
+    STRING_PATTERNS.append(pattern)
+
+
+register_string_pattern('email', r'^[\w\.-]+@[\w\.-]+\.\w+$')
+register_string_pattern('phone', r'^[\+\d\s\-\(\)]+$', min_length=7)
+register_string_pattern('url', r'^(?:https?://|www\.)')
+register_string_pattern('uuid', r'(?i)^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+register_string_pattern('numeric', r'^\d+$')
+register_string_pattern('alphanumeric', r'^[a-zA-Z0-9]+$')
+
+
+def count_patterns(values: pd.Series) -> Dict[str, int]:
+    """Количество значений по паттернам (векторно, без цикла по значениям)
+
+    Каждый следующий паттерн проверяется только на значениях, не совпавших с предыдущими.
+    """
+    remaining = values.dropna().astype(str)
+    counts = {}
+
+    for pattern in STRING_PATTERNS:
+        matched = remaining.str.contains(pattern['compiled'], regex=True)
+        if pattern['min_length']:
+            matched &= remaining.str.len() >= pattern['min_length']
+        counts[pattern['name']] = int(matched.sum())
+        remaining = remaining[~matched]
+
+    return counts
+
+
+def significant_patterns(counts: Dict[str, int], total: int) -> Dict[str, float]:
+    """Проценты по паттернам, только значимые (> SIGNIFICANT_PATTERN_PERCENTAGE)"""
+    if total <= 0:
+        return {}
+    percentages = {name: round(count / total * 100, 2) for name, count in counts.items()}
+    return {name: value for name, value in percentages.items() if value > SIGNIFICANT_PATTERN_PERCENTAGE}
+
+
+def detect_patterns(values: pd.Series) -> Dict[str, float]:
+    """Определение паттернов в строковых данных"""
+    values = values.dropna()
+    return significant_patterns(count_patterns(values), len(values))
+
+
+def sql_pattern_class(column: str) -> str:
+    """Выражение ClickHouse с номером первого совпавшего паттерна (0 - ни один)
+
+    column - SQL-выражение колонки (имя уже в обратных кавычках, см. quote_identifier).
+    """
+    branches = []
+    for i, pattern in enumerate(STRING_PATTERNS, start=1):
+        regex = pattern['regex'].replace('\\', '\\\\').replace("'", "\\'")
+        condition = f"match({column}, '{regex}')"
+        if pattern['min_length']:
+            condition += f" AND length({column}) >= {pattern['min_length']}"
+        branches.append(f"{condition}, {i}")
+    return f"multiIf({', '.join(branches)}, 0)"
+
+
+def sql_pattern_aggregates(column: str) -> List[str]:
+    """Агрегаты countIf по каждому паттерну реестра (в порядке STRING_PATTERNS)"""
+    pattern_class = sql_pattern_class(f"assumeNotNull({column})")
+    return [
+        f"countIf(isNotNull({column}) AND {pattern_class} = {i})"
+        for i in range(1, len(STRING_PATTERNS) + 1)
+    ]
@@ -0,0 +1,66 @@
+# backend/backend/services/table_validator.py
+from typing import List, Dict, Any, Optional
+from .clickhouse_service import clickhouse_service, ClickHouseService
+from .validation_rules import RuleEngine
+from .sql_utils import quote_identifier
+
+# Выше этого числа строк дубликаты по умолчанию оцениваются скетчем uniqCombined64
+EXACT_DUPLICATES_MAX_ROWS = 100_000_000
+
+
+class TableValidator:
+    """Проверка таблицы ClickHouse на месте, без выгрузки данных.
+
+    Все проверки правил сводятся в один агрегирующий запрос: countIf по каждой
+    различной метрике колонок и count() - uniq(tuple(*)) для дубликатов.
+    """
+
+    def __init__(self, service: ClickHouseService = clickhouse_service):
+        self.service = service
+
+    def get_tables(self, database: str = 'datagate') -> List[str]:
+        """Список таблиц базы данных"""
+        return [table['table_name'] for table in self.service.catalog.tables(database)]
+
+    def validate(self, database: str, table_name: str, rules: Optional[List[Dict[str, Any]]] = None,
+                 approximate_duplicates: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Выполнить проверки по таблице и вернуть результаты в формате валидатора"""
+        engine = RuleEngine(rules if rules is not None else self.service.get_validation_rules())
+
+        table = self.service.catalog.table(database, table_name)
+        if not table or not table['columns']:
+            raise ValueError(f"Таблица {database}.{table_name} не найдена")
+
+        columns = [column['name'] for column in table['columns']]
+        # Аналог object-колонок pandas: строковые колонки (в том числе Nullable и LowCardinality)
+        string_columns = {
+            column['name'] for column in table['columns']
+            if 'String' in column['type'] and not column['type'].startswith(('Array', 'Map', 'Tuple'))
+        }
+
+        if approximate_duplicates is None:
+            approximate_duplicates = table['total_rows'] > EXACT_DUPLICATES_MAX_ROWS
+
+        aggregates = engine.sql_aggregates(columns, string_columns)
+        select_list = ['count()']
+        if engine.checks_duplicates:
+            uniq_function = 'uniqCombined64' if approximate_duplicates else 'uniqExact'
+            select_list.append(f"count() - {uniq_function}(tuple(*))")
+        select_list.extend(expression for _, expression in aggregates)
+
+        # query_rows пробрасывает ошибку сервера: пустой результат не выдается за проверку без ошибок
+        query = f"SELECT {', '.join(select_list)} FROM {quote_identifier(database)}.{quote_identifier(table_name)}"
+        row = self.service.query_rows(query)[0]
+
+        total_count = int(row[0])
+        duplicate_count = max(0, int(row[1])) if engine.checks_duplicates else 0
+        values = row[2:] if engine.checks_duplicates else row[1:]
+        counts = {key: int(value) for (key, _), value in zip(aggregates, values)}
+
+        return engine.results(
+            columns, counts, total_count, duplicate_count, string_columns,
+            dataset_name=database, table_name=table_name
+        )
+
+
+table_validator = TableValidator()
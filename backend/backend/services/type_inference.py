@@ -0,0 +1,84 @@
+# backend/backend/services/type_inference.py
+from typing import Dict, Optional
+import warnings
+import pandas as pd
+
+# Число непустых значений в выборке для определения типа
+TYPE_SAMPLE_SIZE = 1000
+
+# Доля уникальных значений, ниже которой строковая колонка считается категориальной
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.05
+
+# Доля значений выборки, при которой колонка считается датой/логической
+TYPE_MATCH_RATIO = 0.95
+
+BOOLEAN_VALUES = {'true', 'false', 'yes', 'no', 't', 'f', 'y', 'n', 'да', 'нет'}
+
+# Типы, при которых колонка не приводится к числу: все значения считаются нечисловыми
+NON_NUMERIC_TYPES = {'boolean', 'datetime', 'categorical', 'string', 'empty'}
+
+
+def infer_series_type(values: pd.Series, sample_size: int = TYPE_SAMPLE_SIZE) -> str:
+    """Тип колонки по выборке непустых значений.
+
+    Возвращает numeric, boolean, datetime, categorical, string, empty или mixed
+    (в выборке есть и числа, и не числа - нужен полный проход по колонке).
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return 'boolean'
+    if pd.api.types.is_numeric_dtype(values):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime'
+
+    non_null = values.dropna()
+    if non_null.empty:
+        return 'empty'
+    sample = non_null.sample(n=sample_size, random_state=0) if len(non_null) > sample_size else non_null
+    strings = sample.astype(str).str.strip()
+
+    numeric_share = pd.to_numeric(strings, errors='coerce').notna().mean()
+    if numeric_share == 1:
+        return 'numeric'
+    if numeric_share > 0:
+        return 'mixed'
+
+    if strings.str.lower().isin(BOOLEAN_VALUES).mean() >= TYPE_MATCH_RATIO:
+        return 'boolean'
+
+    with warnings.catch_warnings():
+        # Без явного формата pandas предупреждает о разборе по одному значению
+        warnings.simplefilter('ignore')
+        parsed = pd.to_datetime(strings, errors='coerce', format='mixed')
+    if parsed.notna().mean() >= TYPE_MATCH_RATIO:
+        return 'datetime'
+
+    if strings.nunique() <= max(1, len(strings) * CATEGORICAL_MAX_UNIQUE_RATIO):
+        return 'categorical'
+    return 'string'
+
+
+class TypeInference:
+    """Кэш выведенных типов колонок.
+
+    Тип определяется один раз по первой порции с непустыми значениями
+    и затем используется всеми проверками этой колонки.
+    """
+
+    def __init__(self, sample_size: int = TYPE_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.types: Dict[str, str] = {}
+
+    def infer(self, column: str, values: pd.Series) -> str:
+        inferred = self.types.get(column)
+        if inferred is None or inferred == 'empty':
+            inferred = infer_series_type(values, self.sample_size)
+            self.types[column] = inferred
+        return inferred
+
+    def is_numeric_candidate(self, column: str, values: pd.Series) -> bool:
+        """Нужно ли приводить колонку к числу целиком"""
+        return self.infer(column, values) not in NON_NUMERIC_TYPES
+
+    def get(self, column: str) -> Optional[str]:
+        return self.types.get(column)
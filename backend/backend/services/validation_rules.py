@@ -0,0 +1,303 @@
+# backend/backend/services/validation_rules.py
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from fnmatch import fnmatchcase
+import json
+import numpy as np
+import pandas as pd
+from .type_inference import TypeInference
+from .sql_utils import quote_identifier, quote_string
+
+# Модуль используется в процессах валидации, поэтому не импортирует clickhouse_service.
+# Правило - обычный словарь (как строка datagate.validation_rules):
+#   rule_name, rule_type, column_pattern, validation_logic (JSON)
+# column_pattern - шаблон имени колонки в стиле fnmatch ('*' - все колонки).
+
+# Правила по умолчанию, если в datagate.validation_rules нет активных
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        'rule_name': 'null_values',
+        'rule_type': 'NULL_CHECK',
+        'column_pattern': '*',
+        'validation_logic': '{"max_error_percentage": 10}',
+    },
+    {
+        'rule_name': 'duplicate_rows',
+        'rule_type': 'DUPLICATE_CHECK',
+        'column_pattern': '*',
+        'validation_logic': '{"max_error_percentage": 5}',
+    },
+    {
+        'rule_name': 'mixed_types',
+        'rule_type': 'DATA_TYPE_CHECK',
+        'column_pattern': '*',
+        'validation_logic': '{"object_columns_only": true, "mixed_only": true, "severity": "WARNING"}',
+    },
+]
+
+
+class ColumnContext:
+    """Промежуточные результаты по колонке порции, общие для всех правил.
+
+    Каждое преобразование (маска NULL, приведение к числу, строковое
+    представление) вычисляется один раз, сколько бы правил его ни использовали.
+    Если по выведенному типу колонка заведомо не числовая, приведение к числу
+    не выполняется.
+    """
+
+    def __init__(self, values: pd.Series, column: Optional[str] = None,
+                 types: Optional[TypeInference] = None):
+        self.values = values
+        self.column = column
+        self.types = types
+        self._cache: Dict[str, Any] = {}
+
+    def _get(self, key: str, compute: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def null_mask(self) -> pd.Series:
+        return self._get('null_mask', self.values.isnull)
+
+    @property
+    def numeric(self) -> pd.Series:
+        return self._get('numeric', self._to_numeric)
+
+    def _to_numeric(self) -> pd.Series:
+        if (self.types is not None and self.values.dtype == 'object'
+                and not self.types.is_numeric_candidate(self.column, self.values)):
+            return pd.Series(np.nan, index=self.values.index)
+        return pd.to_numeric(self.values, errors='coerce')
+
+    @property
+    def strings(self) -> pd.Series:
+        return self._get('strings', lambda: self.values[~self.null_mask].astype(str))
+
+
+# Метрики: число ошибочных значений колонки в порции (pandas) и то же в SQL (countIf).
+# Параметры метрики берутся из validation_logic правила.
+METRICS: Dict[str, Dict[str, Any]] = {
+    'null': {
+        'params': (),
+        'count': lambda ctx, p: ctx.null_mask.sum(),
+        'sql': lambda col, p: f"isNull({col})",
+    },
+    'non_numeric': {
+        # Как и раньше, NULL тоже считаются нечисловыми
+        'params': (),
+        'count': lambda ctx, p: ctx.numeric.isna().sum(),
+        'sql': lambda col, p: f"toFloat64OrNull(toString({col})) IS NULL",
+    },
+    'out_of_range': {
+        'params': ('min', 'max'),
+        'count': lambda ctx, p: (
+            ctx.numeric.notna()
+            & ~ctx.numeric.between(
+                p['min'] if p['min'] is not None else float('-inf'),
+                p['max'] if p['max'] is not None else float('inf')
+            )
+        ).sum(),
+        'sql': lambda col, p: (
+            f"NOT (toFloat64OrNull(toString({col})) BETWEEN "
+            f"{p['min'] if p['min'] is not None else '-inf'} AND {p['max'] if p['max'] is not None else 'inf'})"
+        ),
+    },
+    'pattern_mismatch': {
+        'params': ('regex',),
+        'count': lambda ctx, p: (~ctx.strings.str.contains(p['regex'], regex=True)).sum(),
+        'sql': lambda col, p: f"isNotNull({col}) AND NOT match(toString({col}), {quote_string(p['regex'])})",
+    },
+    'not_allowed': {
+        'params': ('values',),
+        'count': lambda ctx, p: (~ctx.strings.isin([str(v) for v in p['values']])).sum(),
+        'sql': lambda col, p: (
+            f"isNotNull({col}) AND toString({col}) NOT IN "
+            f"({', '.join(quote_string(v) for v in p['values'])})"
+        ),
+    },
+}
+
+# Типы правил: метрика и текст результата; DUPLICATE_CHECK считается по строкам целиком
+RULE_TYPES: Dict[str, Dict[str, Any]] = {
+    'NULL_CHECK': {
+        'metric': 'null',
+        'details': lambda n, pct, p: f'{n} null values found ({pct:.2f}%)',
+    },
+    'DUPLICATE_CHECK': {
+        'metric': None,
+        'details': lambda n, pct, p: f'{n} duplicate rows found ({pct:.2f}%)',
+    },
+    'DATA_TYPE_CHECK': {
+        'metric': 'non_numeric',
+        'details': lambda n, pct, p: (
+            f'Mixed data types detected: {n} non-numeric values in potentially numeric column'
+        ),
+    },
+    'RANGE_CHECK': {
+        'metric': 'out_of_range',
+        'details': lambda n, pct, p: f"{n} values outside [{p['min']}, {p['max']}] ({pct:.2f}%)",
+    },
+    'PATTERN_CHECK': {
+        'metric': 'pattern_mismatch',
+        'details': lambda n, pct, p: f"{n} values not matching {p['regex']} ({pct:.2f}%)",
+    },
+    'ALLOWED_VALUES_CHECK': {
+        'metric': 'not_allowed',
+        'details': lambda n, pct, p: f'{n} values outside allowed set ({pct:.2f}%)',
+    },
+}
+
+MetricKey = Tuple[str, str]
+
+
+class CompiledRule:
+    """Правило с разобранной логикой и ключом метрики"""
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.name = rule.get('rule_name', '')
+        self.rule_type = rule['rule_type']
+        self.column_pattern = rule.get('column_pattern') or '*'
+        logic = rule.get('validation_logic') or {}
+        self.logic: Dict[str, Any] = json.loads(logic) if isinstance(logic, str) else dict(logic)
+
+        spec = RULE_TYPES[self.rule_type]
+        self.details = spec['details']
+        self.metric: Optional[str] = spec['metric']
+        self.params: Dict[str, Any] = {}
+        self.metric_key: Optional[MetricKey] = None
+        if self.metric is not None:
+            self.params = {name: self.logic.get(name) for name in METRICS[self.metric]['params']}
+            # Одинаковые метрики с одинаковыми параметрами считаются один раз
+            self.metric_key = (self.metric, json.dumps(self.params, sort_keys=True, default=str))
+
+        self.max_error_percentage = float(self.logic.get('max_error_percentage', 0))
+        self.severity = self.logic.get('severity', 'FAILED')
+        self.mixed_only = bool(self.logic.get('mixed_only', False))
+        self.object_columns_only = bool(self.logic.get('object_columns_only', False))
+
+    @property
+    def is_table_rule(self) -> bool:
+        return self.metric is None
+
+    def matches(self, column: str) -> bool:
+        return fnmatchcase(column, self.column_pattern)
+
+    def status(self, error_count: int, total_count: int) -> Optional[str]:
+        """Статус проверки; None - результат не выводится"""
+        if self.mixed_only:
+            return self.severity if 0 < error_count < total_count else None
+        percentage = (error_count / total_count * 100) if total_count > 0 else 0
+        if self.max_error_percentage and percentage < self.max_error_percentage:
+            return 'PASSED'
+        if not self.max_error_percentage and error_count == 0:
+            return 'PASSED'
+        return self.severity
+
+
+class RuleEngine:
+    """Набор скомпилированных правил.
+
+    Соответствие правил колонкам вычисляется один раз на набор колонок,
+    а по каждой колонке порции считается только множество различных метрик,
+    поэтому время проверки растет с числом метрик, а не с числом правил.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules: List[CompiledRule] = []
+        for rule in rules if rules is not None else DEFAULT_RULES:
+            try:
+                self.rules.append(CompiledRule(rule))
+            except Exception as e:
+                print(f"Ошибка разбора правила {rule.get('rule_name', '')}: {e}")
+        self._plans: Dict[Tuple[str, ...], Dict[str, List[MetricKey]]] = {}
+
+    @property
+    def checks_duplicates(self) -> bool:
+        return any(rule.is_table_rule for rule in self.rules)
+
+    def column_rules(self, column: str) -> List[CompiledRule]:
+        return [rule for rule in self.rules if not rule.is_table_rule and rule.matches(column)]
+
+    def plan(self, columns: List[str]) -> Dict[str, List[MetricKey]]:
+        """Различные метрики по каждой колонке"""
+        key = tuple(columns)
+        if key not in self._plans:
+            plan = {}
+            for column in columns:
+                metrics = []
+                for rule in self.column_rules(column):
+                    if rule.metric_key not in metrics:
+                        metrics.append(rule.metric_key)
+                plan[column] = metrics
+            self._plans[key] = plan
+        return self._plans[key]
+
+    def count_chunk(self, chunk: pd.DataFrame, counts: Dict[Tuple[str, MetricKey], int],
+                    types: Optional[TypeInference] = None):
+        """Добавить к counts число ошибок по каждой метрике каждой колонки порции"""
+        for column, metrics in self.plan(list(chunk.columns)).items():
+            if not metrics:
+                continue
+            context = ColumnContext(chunk[column], column, types)
+            for metric_key in metrics:
+                metric, params = metric_key[0], json.loads(metric_key[1])
+                error_count = int(METRICS[metric]['count'](context, params))
+                counts[(column, metric_key)] = counts.get((column, metric_key), 0) + error_count
+
+    def sql_aggregates(self, columns: List[str],
+                       object_columns: Optional[set] = None) -> List[Tuple[Tuple[str, MetricKey], str]]:
+        """Агрегаты countIf по различным метрикам колонок (для проверки на стороне ClickHouse).
+
+        object_columns - строковые колонки; метрики правил object_columns_only
+        для остальных колонок не считаются.
+        """
+        aggregates = []
+        for column in columns:
+            metrics = []
+            for rule in self.column_rules(column):
+                if rule.object_columns_only and object_columns is not None and column not in object_columns:
+                    continue
+                if rule.metric_key not in metrics:
+                    metrics.append(rule.metric_key)
+            for metric_key in metrics:
+                metric, params = metric_key[0], json.loads(metric_key[1])
+                predicate = METRICS[metric]['sql'](quote_identifier(column), params)
+                aggregates.append(((column, metric_key), f"countIf({predicate})"))
+        return aggregates
+
+    def results(self, columns: List[str], counts: Dict[Tuple[str, MetricKey], int], total_count: int,
+                duplicate_count: int, object_columns: set, dataset_name: str,
+                table_name: str) -> List[Dict[str, Any]]:
+        """Результаты проверок в порядке правил"""
+        results = []
+
+        def check(column_name, rule, error_count):
+            status = rule.status(error_count, total_count)
+            if status is None:
+                return
+            percentage = float(error_count / total_count * 100) if total_count > 0 else 0.0
+            results.append({
+                'dataset_name': dataset_name,
+                'table_name': table_name,
+                'column_name': column_name,
+                'check_type': rule.rule_type,
+                'check_status': status,
+                'error_count': int(error_count),
+                'total_count': total_count,
+                'error_percentage': percentage,
+                'details': rule.details(error_count, percentage, rule.params)
+            })
+
+        for rule in self.rules:
+            if rule.is_table_rule:
+                check('ALL_COLUMNS', rule, duplicate_count)
+                continue
+            for column in columns:
+                if not rule.matches(column):
+                    continue
+                if rule.object_columns_only and column not in object_columns:
+                    continue
+                check(column, rule, counts.get((column, rule.metric_key), 0))
+
+        return results
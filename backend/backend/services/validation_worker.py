@@ -0,0 +1,106 @@
+# backend/backend/services/validation_worker.py
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+import pandas as pd
+import pyarrow.parquet as pq
+from .streaming_validator import StreamingValidator, CSV_CHUNK_ROWS
+from .parquet_staging import ParquetStager, is_staged, staged_path, iter_parquet_chunks
+
+# Модуль выполняется в дочерних процессах, поэтому не должен импортировать
+# clickhouse_service: иначе каждый процесс открыл бы свое соединение.
+
+# Число процессов для разбора и проверки файлов
+VALIDATION_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_manager = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Общий пул процессов валидации (создается при первом обращении)"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=VALIDATION_WORKERS)
+        return _executor
+
+
+def create_progress_queue():
+    """Очередь прогресса, доступная из дочерних процессов"""
+    global _manager
+    with _lock:
+        if _manager is None:
+            _manager = multiprocessing.Manager()
+        return _manager.Queue()
+
+
+def _report(progress_queue, percent: int):
+    if progress_queue is not None:
+        progress_queue.put(min(100, max(0, int(percent))))
+
+
+def _iter_chunks_with_progress(file_path: str, chunksize: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """Порции файла и доля прочитанного (0-100)"""
+    if is_staged(file_path):
+        path = staged_path(file_path)
+        total_rows = pq.ParquetFile(path).metadata.num_rows or 1
+        read_rows = 0
+        for chunk in iter_parquet_chunks(path, chunksize):
+            read_rows += len(chunk)
+            yield chunk, read_rows / total_rows * 100
+    elif file_path.endswith('.csv'):
+        file_size = os.path.getsize(file_path) or 1
+        with open(file_path, 'rb') as f:
+            for chunk in pd.read_csv(f, chunksize=chunksize):
+                yield chunk, f.tell() / file_size * 100
+    elif file_path.endswith(('.xlsx', '.xls')):
+        yield pd.read_excel(file_path), 100
+    else:
+        raise ValueError("Поддерживаются только CSV и Excel файлы")
+
+
+def validate_file(file_path: str, dataset_name: str, progress_queue=None,
+                  rules: Optional[List[Dict[str, Any]]] = None,
+                  chunksize: int = CSV_CHUNK_ROWS) -> Dict[str, Any]:
+    """Проверить файл порциями; прогресс (0-100) считается по позиции в файле.
+
+    rules - правила валидации обычными словарями (передаются в процесс pickle).
+    При первом чтении файла рядом записывается Parquet-копия, повторные
+    проверки читают ее. Возвращает результаты проверок и сведения о копии.
+    """
+    validator = StreamingValidator(dataset_name, rules=rules)
+    stager = None if is_staged(file_path) else ParquetStager(staged_path(file_path))
+
+    try:
+        for chunk, percent in _iter_chunks_with_progress(file_path, chunksize):
+            validator.update(chunk)
+            if stager is not None:
+                try:
+                    stager.write(chunk)
+                except Exception as e:
+                    # Без копии проверка все равно завершается, файл будет прочитан заново в следующий раз
+                    print(f"Ошибка записи Parquet: {e}")
+                    stager.abort()
+                    stager = None
+            _report(progress_queue, percent)
+    except Exception:
+        if stager is not None:
+            stager.abort()
+        raise
+
+    if stager is not None:
+        stager.close()
+    _report(progress_queue, 100)
+
+    path = staged_path(file_path) if is_staged(file_path) else ''
+    return {
+        'results': validator.results(),
+        'staged_path': path,
+        'columns': validator.columns,
+        'row_count': validator.row_count,
+        'file_size': os.path.getsize(path) if path else 0
+    }
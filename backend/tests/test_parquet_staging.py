@@ -0,0 +1,25 @@
+# tests/test_parquet_staging.py
+import os
+from backend.services.parquet_staging import staged_path, is_staged
+
+
+def test_staged_copies_of_same_stem_do_not_collide():
+    assert staged_path('uploads/sales.csv') == 'uploads/sales.csv.parquet'
+    assert staged_path('uploads/sales.xlsx') == 'uploads/sales.xlsx.parquet'
+    assert staged_path('uploads/sales.csv') != staged_path('uploads/sales.xlsx')
+
+
+def test_parquet_file_is_its_own_copy():
+    assert staged_path('uploads/sales.parquet') == 'uploads/sales.parquet'
+
+
+def test_copy_of_other_file_is_not_reused(tmp_path):
+    """Копия sales.csv не считается копией sales.xlsx"""
+    csv_path, xlsx_path = tmp_path / 'sales.csv', tmp_path / 'sales.xlsx'
+    csv_path.write_text('a\n1\n')
+    xlsx_path.write_bytes(b'')
+    (tmp_path / 'sales.csv.parquet').write_bytes(b'')
+
+    assert is_staged(str(csv_path))
+    assert not is_staged(str(xlsx_path))
+    assert not os.path.exists(staged_path(str(xlsx_path)))
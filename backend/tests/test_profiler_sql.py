@@ -0,0 +1,63 @@
+# tests/test_profiler_sql.py
+from backend.services.data_profiler_service import DataProfilerService
+from backend.services.sql_utils import quote_identifier
+
+
+def make_profiler():
+    return DataProfilerService.__new__(DataProfilerService)
+
+
+def test_quote_identifier_escapes_backticks():
+    assert quote_identifier('order date') == '`order date`'
+    assert quote_identifier('a`b') == '`a\\`b`'
+
+
+def test_column_aggregates_quote_column_names():
+    """Имена с пробелами и ключевыми словами попадают в SQL только в кавычках"""
+    profiler = make_profiler()
+
+    for col_name, col_type in [('order date', 'Date'), ('select', 'Nullable(Int64)'), ('e-mail', 'String')]:
+        expressions = [expr for _, expr in profiler._column_aggregates(col_name, col_type)]
+        quoted = quote_identifier(col_name)
+        assert all(quoted in expr for expr in expressions)
+        assert not any(f"({col_name})" in expr for expr in expressions)
+
+
+def test_fast_mode_quantiles_accept_decimal():
+    """account_balance Decimal(10,2): TDigest и дисперсии получают Float64"""
+    profiler = make_profiler()
+
+    aggregates = dict(profiler._column_aggregates('account_balance', 'Decimal(10, 2)', mode='fast'))
+
+    assert aggregates['quartiles'] == "quantilesTDigest(0.25, 0.5, 0.75)(toFloat64(`account_balance`))"
+    assert aggregates['std_dev'] == "stddevPop(toFloat64(`account_balance`))"
+    assert aggregates['variance'] == "varPop(toFloat64(`account_balance`))"
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.result_rows = rows
+
+
+class FakeClient:
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    def query(self, query):
+        self.queries.append(query)
+        return FakeResult([self.row])
+
+
+def test_parts_fingerprint_changes_after_alter():
+    """ALTER TABLE меняет только метаданные: куски те же, отпечаток другой"""
+    profiler = make_profiler()
+    parts = (3, 1000, 1760000000, 123456789)
+
+    profiler.client = FakeClient(parts + (1760000000,))
+    before = profiler._get_parts_fingerprint('datagate', 'users')
+    profiler.client = FakeClient(parts + (1760000500,))
+    after = profiler._get_parts_fingerprint('datagate', 'users')
+
+    assert before != after
+    assert 'metadata_modification_time' in profiler.client.queries[0]
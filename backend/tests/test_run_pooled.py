@@ -0,0 +1,73 @@
+# tests/test_run_pooled.py
+import queue
+import threading
+import time
+import pytest
+from backend.services.data_profiler_service import DataProfilerService
+
+
+class FakeClient:
+    def __init__(self):
+        self.settings = []
+
+    def set_client_setting(self, key, value):
+        self.settings.append((key, value))
+
+
+class FakePool:
+    query_timeout = 60
+
+    def __init__(self, client=None):
+        self._client = client
+
+    def acquire(self, timeout=None):
+        if self._client is None:
+            time.sleep(timeout)
+            raise queue.Empty
+        return self._client
+
+    def release(self, client):
+        pass
+
+
+def make_profiler(pool):
+    profiler = DataProfilerService.__new__(DataProfilerService)
+    profiler.pool = pool
+    profiler._bound_to = lambda client: profiler
+    return profiler
+
+
+def test_busy_pool_waits_only_until_deadline():
+    profiler = make_profiler(FakePool())
+    calls = []
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        profiler._run_pooled(calls.append, deadline=time.monotonic() + 0.1)
+
+    assert time.monotonic() - started < 1
+    assert calls == []
+
+
+def test_cancelled_task_is_skipped():
+    client = FakeClient()
+    profiler = make_profiler(FakePool(client))
+    cancelled = threading.Event()
+    cancelled.set()
+    calls = []
+
+    with pytest.raises(TimeoutError):
+        profiler._run_pooled(calls.append, deadline=time.monotonic() + 10, cancelled=cancelled)
+
+    assert calls == []
+
+
+def test_query_limit_is_remaining_time():
+    client = FakeClient()
+    profiler = make_profiler(FakePool(client))
+
+    profiler._run_pooled(lambda svc: None, deadline=time.monotonic() + 5)
+
+    assert client.settings[0][0] == 'max_execution_time'
+    assert client.settings[0][1] <= 5
+    assert client.settings[-1] == ('max_execution_time', FakePool.query_timeout)
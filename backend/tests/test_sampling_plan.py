@@ -0,0 +1,43 @@
+# tests/test_sampling_plan.py
+from backend.services.data_profiler_service import DataProfilerService
+
+
+class FakeCatalog:
+    def __init__(self, table):
+        self._table = table
+
+    def table(self, database, table_name):
+        return self._table
+
+
+def make_profiler(table):
+    profiler = DataProfilerService.__new__(DataProfilerService)
+    profiler.catalog = FakeCatalog(table)
+    return profiler
+
+
+def test_hash_sample_keeps_rows_with_nulls():
+    """Таблица без SAMPLE BY с Nullable колонками: хэш не зависит от значений строки"""
+    profiler = make_profiler({
+        'sampling_key': '',
+        'sorting_key': 'registration_date',
+        'columns': [
+            {'name': 'email', 'type': 'Nullable(String)'},
+            {'name': 'user_score', 'type': 'Nullable(Float32)'},
+        ]
+    })
+
+    plan = profiler._get_sampling_plan('datagate', 'users', row_count=200_000, sample_size=100_000)
+
+    assert plan['method'] == 'hash'
+    assert 'cityHash64(_part, _part_offset)' in plan['source']
+    assert 'cityHash64(*)' not in plan['source']
+    assert 'registration_date' not in plan['source']
+
+
+def test_hash_sample_keeps_partition_filter():
+    profiler = make_profiler({'sampling_key': '', 'sorting_key': '', 'columns': []})
+
+    plan = profiler._get_sampling_plan('datagate', 'events', 1_000_000, 10_000, "_partition_id IN ('202507')")
+
+    assert plan['source'].endswith("AND _partition_id IN ('202507'))")
@@ -0,0 +1,37 @@
+# tests/test_table_validator.py
+import pytest
+from backend.services.table_validator import TableValidator
+from backend.services.validation_rules import RuleEngine
+
+NULL_RULE = {'rule_name': 'nulls', 'rule_type': 'NULL_CHECK', 'column_pattern': '*'}
+
+
+class FakeCatalog:
+    def table(self, database, table_name):
+        return {'total_rows': 10, 'columns': [{'name': 'id', 'type': 'UInt64'}]}
+
+
+class FailingService:
+    catalog = FakeCatalog()
+
+    def query_rows(self, query, params=None):
+        raise RuntimeError("Code: 241. Memory limit exceeded")
+
+    def execute_query(self, query, params=None):
+        return []
+
+
+def test_validate_reports_server_error():
+    """Ошибка ClickHouse доходит до вызывающего, а не превращается в пустой результат"""
+    validator = TableValidator(FailingService())
+
+    with pytest.raises(RuntimeError, match='Memory limit exceeded'):
+        validator.validate('datagate', 'users', rules=[NULL_RULE])
+
+
+def test_sql_aggregates_escape_backticks_in_column_names():
+    engine = RuleEngine([NULL_RULE])
+
+    aggregates = engine.sql_aggregates(['we`ird'])
+
+    assert aggregates[0][1] == "countIf(isNull(`we\\`ird`))"